@@ -5,11 +5,40 @@ CLI script to generate model input for YOLO custom dataset training.
 import argparse
 import logging
 import os
-import random
 import shutil
+from itertools import chain
 from pathlib import Path
+from typing import Iterable, Iterator
 
+import numpy as np
+
+from pyro_train.data.dedup import (
+    find_near_duplicate_pairs,
+    hash_images,
+    save_duplicates_report,
+    select_duplicates_to_drop,
+)
+from pyro_train.data.file_copy import (
+    DEFAULT_WORKERS,
+    MaterializeMode,
+    list_copy_instructions,
+    run_file_copy,
+)
+from pyro_train.data.image_headers import (
+    find_odd_images,
+    save_image_report,
+    scan_image_headers,
+)
+from pyro_train.data.manifest import sync_dataset
+from pyro_train.data.sampling import draw_nested_samples
+from pyro_train.data.scan import DatasetEntry, scan_split
+from pyro_train.data.shards import write_dataset_shards
 from pyro_train.data.utils import yaml_write
+from pyro_train.model.yolo.label_cache import build_label_caches
+
+CLASS_NAMES = ["smoke"]
+
+DEDUP_POLICIES = ["none", "leaks", "all"]
 
 
 def make_cli_parser() -> argparse.ArgumentParser:
@@ -35,12 +64,124 @@ def make_cli_parser() -> argparse.ArgumentParser:
         default=0.05,
         type=float,
     )
+    parser.add_argument(
+        "--subset-ratios",
+        help=(
+            "sampling ratios of additional subsets of the dataset, drawn from the same "
+            "scan as the small version and nested with it. Example --subset-ratios "
+            "0.01 0.2"
+        ),
+        default=[],
+        nargs="*",
+        type=float,
+    )
+    parser.add_argument(
+        "--stratify",
+        help=(
+            "stratify the sampled datasets by background images and number of boxes "
+            "per image"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "--random-seed",
         help="Random seed to sample the dataset fo r the small version",
         default=0,
         type=int,
     )
+    parser.add_argument(
+        "--workers",
+        help="number of threads used to copy the files concurrently",
+        default=DEFAULT_WORKERS,
+        type=int,
+    )
+    parser.add_argument(
+        "--materialize",
+        help=(
+            "how files are materialized in the model input datasets. Links save disk "
+            "space but share the content with the raw dataset, falling back to a copy "
+            "when a link cannot be made"
+        ),
+        choices=[mode.value for mode in MaterializeMode],
+        default=MaterializeMode.copy.value,
+        type=str,
+    )
+    parser.add_argument(
+        "--incremental",
+        help=(
+            "only add, replace or delete the files that changed since the previous "
+            "build instead of rebuilding the datasets from scratch"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--label-cache",
+        help=(
+            "verify the images and labels of each dataset and pre-build the "
+            "ultralytics labels.cache files"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--validate-images",
+        help=(
+            "scan the headers of the raw images and report the corrupt, truncated or "
+            "odd-sized ones"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--image-headers-cache",
+        help=(
+            "path to the cache of the image header scans, keyed by file size and mtime"
+        ),
+        default="./data/02_feature/wildfire/image_headers.csv",
+        type=Path,
+    )
+    parser.add_argument(
+        "--dedup",
+        help=(
+            "drop near-duplicate train images from the datasets: none keeps them all, "
+            "leaks drops the train images that are near duplicates of val images, all "
+            "also drops the train images that are near duplicates of an earlier kept "
+            "train image"
+        ),
+        choices=DEDUP_POLICIES,
+        default="none",
+        type=str,
+    )
+    parser.add_argument(
+        "--dedup-max-distance",
+        help=(
+            "maximum Hamming distance between the 64-bit perceptual hashes of two "
+            "near-duplicate images"
+        ),
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--image-hashes-cache",
+        help=(
+            "path to the cache of the image perceptual hashes, keyed by file size and "
+            "mtime"
+        ),
+        default="./data/02_feature/wildfire/image_hashes.npz",
+        type=Path,
+    )
+    parser.add_argument(
+        "--shards",
+        help=(
+            "also pack each dataset into a few large shard files with their index, in "
+            "a shards folder next to its datasets folder"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--shard-size-mb",
+        help="size in MB after which a new shard file is started",
+        default=1024,
+        type=int,
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -55,6 +196,20 @@ def validate_parsed_args(args: dict) -> bool:
     if not args["input_dir"].exists():
         logging.error("Invalid --input-dir directory, it does not exist")
         return False
+    elif not all(
+        0 <= ratio <= 1.0 for ratio in [args["sampling_ratio"], *args["subset_ratios"]]
+    ):
+        logging.error("Invalid sampling ratios, they should be between 0 and 1")
+        return False
+    elif args["workers"] < 1:
+        logging.error("Invalid --workers, it should be at least 1")
+        return False
+    elif args["shard_size_mb"] < 1:
+        logging.error("Invalid --shard-size-mb, it should be at least 1")
+        return False
+    elif not 0 <= args["dedup_max_distance"] <= 64:
+        logging.error("Invalid --dedup-max-distance, it should be between 0 and 64")
+        return False
     else:
         return True
 
@@ -64,12 +219,36 @@ def write_data_yaml(yaml_filepath: Path) -> None:
         "train": "./train/images",
         "val": "./val/images",
         "test": ".test/images",
-        "nc": 1,
-        "names": ["smoke"],
+        "nc": len(CLASS_NAMES),
+        "names": CLASS_NAMES,
+    }
+    yaml_write(to=yaml_filepath, data=content)
+
+
+def write_shards_data_yaml(yaml_filepath: Path) -> None:
+    content = {
+        "train": "./train",
+        "val": "./val",
+        "shards": True,
+        "nc": len(CLASS_NAMES),
+        "names": CLASS_NAMES,
     }
     yaml_write(to=yaml_filepath, data=content)
 
 
+def make_shards(dir_dataset: Path, shard_size: int) -> None:
+    """
+    Pack the dataset located at `dir_dataset` into shards, saved in the
+    `shards` folder next to its `datasets` folder.
+    """
+    write_dataset_shards(
+        dir_dataset / "datasets",
+        shards_dir=dir_dataset / "shards",
+        shard_size=shard_size,
+    )
+    write_shards_data_yaml(dir_dataset / "shards" / "data.yaml")
+
+
 def make_yolov8_folder_structure(dir: Path) -> None:
     """Creates the YOLOv8 data folder structure expected to train it on a
     custom dataset.
@@ -93,88 +272,237 @@ def make_yolov8_folder_structure(dir: Path) -> None:
         os.makedirs(dir / "datasets" / split / "labels", exist_ok=True)
 
 
-def copy_data(input_dir: Path, output_dir: Path) -> None:
+def copy_data(
+    input_dir: Path,
+    output_dir: Path,
+    excluded_train_stems: set[str] = set(),
+) -> Iterator[dict]:
     """
-    Copy over all data from `input_dir` to `output_dir` using the YOLOv8
-    folder structure conventions.
+    Yield the copy instructions to copy over all data from `input_dir` to
+    `output_dir` using the YOLOv8 folder structure conventions, leaving out
+    the train images and labels whose stem is in `excluded_train_stems`.
     """
-    for split in ["train", "val"]:
-        shutil.copytree(
-            src=input_dir / "images" / split,
-            dst=output_dir / split / "images",
-            dirs_exist_ok=True,
-        )
-        shutil.copytree(
-            src=input_dir / "labels" / split,
-            dst=output_dir / split / "labels",
-            dirs_exist_ok=True,
-        )
+    return chain(
+        (
+            instruction
+            for kind in ["images", "labels"]
+            for instruction in list_copy_instructions(
+                src_dir=input_dir / kind / "train",
+                dst_dir=output_dir / "train" / kind,
+            )
+            if instruction["from"].stem not in excluded_train_stems
+        ),
+        chain.from_iterable(
+            list_copy_instructions(
+                src_dir=input_dir / kind / "val",
+                dst_dir=output_dir / "val" / kind,
+            )
+            for kind in ["images", "labels"]
+        ),
+    )
 
 
-def sample_dataset(
-    input_dir: Path,
+def to_copy_instructions(
+    entries: Iterable[DatasetEntry],
     output_dir: Path,
-    sampling_ratio: float = 0.1,
+) -> Iterator[dict]:
+    """
+    Yield the copy instructions of the images and labels of `entries` to
+    the `images` and `labels` folders of `output_dir`.
+
+    Each yielded element has the following keys:
+    - type: str - image or label
+    - from: Path - where the image/label comes from
+    - to: Path - where the image/label should be copied over
+    """
+    for entry in entries:
+        image_filepath = Path(entry.image_path)
+        yield {
+            "type": "image",
+            "from": image_filepath,
+            "to": output_dir / "images" / image_filepath.name,
+        }
+        if entry.label_path is not None:
+            label_filepath = Path(entry.label_path)
+            yield {
+                "type": "label",
+                "from": label_filepath,
+                "to": output_dir / "labels" / label_filepath.name,
+            }
+
+
+def sample_datasets(
+    input_dir: Path,
+    output_dirs: dict[float, Path],
     random_seed: int = 0,
-) -> list[dict]:
+    stratify: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    excluded_train_stems: set[str] = set(),
+) -> dict[float, Iterator[dict]]:
     """
-    Return a downsampled list of images and labels for the given
-    `sampling_ratio` and `random_seed`.
+    Return the copy instructions of the downsampled datasets for each
+    sampling ratio of `output_dirs` and the given `random_seed`.
 
-    Each element in the returned list has the following keys:
-    - to: Path - where the image/label comes from
-    - from: Path - where the image/label should be copied over - using the provided `output_dir`
+    The train split is scanned once to draw all the datasets, which are
+    nested: a dataset with a smaller sampling ratio is a subset of the
+    ones with larger ratios. When `stratify` is set, each dataset keeps the
+    proportions of background images and of images per number of boxes.
+    The val split is not subsampled as we want to eval on the same data as
+    in the full dataset. Train images whose stem is in
+    `excluded_train_stems` are left out before sampling.
     """
-    assert 0 <= sampling_ratio <= 1.0, f"sampling ratio should be between 0 and 1"
+    sampling_ratios = list(output_dirs.keys())
+    assert all(
+        0 <= ratio <= 1.0 for ratio in sampling_ratios
+    ), "sampling ratios should be between 0 and 1"
 
-    result = []
-    for split in ["train", "val"]:
-        labels_split_dir = input_dir / "labels" / split
-        images_split_dir = input_dir / "images" / split
-        images_filepaths = list(images_split_dir.glob("*.jpg"))
-        n_images = len(images_filepaths)
-        k = int(n_images * sampling_ratio)
-        # For the val split we do not subsample as we want to eval on the same data as in the full
-        downsampled_image_filepaths = images_filepaths
-        if split == "train":
-            downsampled_image_filepaths = random.Random(random_seed).sample(
-                images_filepaths,
-                k=k,
+    samples_train = draw_nested_samples(
+        (
+            entry
+            for entry in scan_split(
+                images_dir=input_dir / "images" / "train",
+                labels_dir=input_dir / "labels" / "train",
             )
-        downsampled_label_filepaths = [
-            labels_split_dir / f"{fp.stem}.txt"
-            for fp in downsampled_image_filepaths
-            if (labels_split_dir / f"{fp.stem}.txt").exists()
-        ]
-        copy_data_images = [
-            {"type": "image", "from": fp, "to": output_dir / split / "images" / fp.name}
-            for fp in downsampled_image_filepaths
-        ]
-        copy_data_labels = [
-            {"type": "label", "from": fp, "to": output_dir / split / "labels" / fp.name}
-            for fp in downsampled_label_filepaths
-        ]
-        result.extend(copy_data_images)
-        result.extend(copy_data_labels)
-
-    return result
-
-
-def run_file_copy(copy_data: list[dict]) -> None:
-    """
-    Run the file copy instructions for each element of copy_data.
-
-    Each element should contain a from and to key. If not present, a
-    warning is printed and the element is skipped.
-    """
-    for e in copy_data:
-        if not "from" in e or not "to" in e:
-            logging.warning(
-                f"Skipping file copy - Missing `from` key or `to` key from element: {e}"
+            if entry.stem not in excluded_train_stems
+        ),
+        sampling_ratios=sampling_ratios,
+        random_seed=random_seed,
+        stratify=stratify,
+        workers=workers,
+    )
+    entries_val = list(
+        scan_split(
+            images_dir=input_dir / "images" / "val",
+            labels_dir=input_dir / "labels" / "val",
+        )
+    )
+    for ratio, entries in samples_train.items():
+        logging.info(f"Sampled {len(entries)} train images with ratio {ratio}")
+    return {
+        ratio: chain(
+            to_copy_instructions(samples_train[ratio], output_dir / "train"),
+            to_copy_instructions(entries_val, output_dir / "val"),
+        )
+        for ratio, output_dir in output_dirs.items()
+    }
+
+
+def materialize_dataset(
+    copy_data: Iterable[dict],
+    dir_dataset: Path,
+    incremental: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    mode: MaterializeMode = MaterializeMode.copy,
+) -> None:
+    """
+    Materialize the files from the `copy_data` instructions in the
+    `datasets` folder of `dir_dataset`.
+
+    When `incremental` is set, only the files that changed since the
+    previous build are materialized, using the build manifest stored
+    next to the dataset.
+    """
+    if incremental:
+        sync_dataset(
+            copy_data,
+            dataset_dir=dir_dataset / "datasets",
+            manifest_filepath=dir_dataset / "manifest.json",
+            workers=workers,
+            mode=mode,
+        )
+    else:
+        run_file_copy(copy_data, workers=workers, mode=mode)
+
+
+def validate_images(
+    input_dir: Path,
+    cache_filepath: Path,
+    report_filepath: Path,
+) -> None:
+    """
+    Scan the headers of the raw images of `input_dir` and save a report of
+    the corrupt, truncated or odd-sized images at `report_filepath`.
+    """
+    filepaths = []
+    for split in ["train", "val"]:
+        entries = scan_split(
+            images_dir=input_dir / "images" / split,
+            labels_dir=input_dir / "labels" / split,
+        )
+        filepaths.extend(sorted(entry.image_path for entry in entries))
+    headers = scan_image_headers(filepaths, cache_filepath=cache_filepath)
+    odd_images = find_odd_images(headers)
+    n_invalid = sum(1 for header, _ in odd_images if not header.is_valid)
+    if n_invalid:
+        logging.error(f"Found {n_invalid} corrupt or truncated images")
+    logging.info(
+        f"Saving the report of {len(odd_images)} bad or odd-sized images in "
+        f"{report_filepath}"
+    )
+    save_image_report(report_filepath, odd_images)
+
+
+def find_train_duplicates(
+    input_dir: Path,
+    cache_filepath: Path,
+    report_filepath: Path,
+    max_distance: int = 4,
+    drop_train_duplicates: bool = False,
+    workers: int = DEFAULT_WORKERS,
+) -> set[str]:
+    """
+    Find the near-duplicate raw images of `input_dir` with perceptual
+    hashes and save the near-duplicate pairs at `report_filepath`.
+
+    Returns:
+        excluded_train_stems (set[str]): stems of the train images to drop,
+        the ones leaking into val and, when `drop_train_duplicates` is set,
+        the later near duplicates of the train images kept.
+    """
+    entries = {
+        split: sorted(
+            scan_split(
+                images_dir=input_dir / "images" / split,
+                labels_dir=input_dir / "labels" / split,
             )
-        else:
-            os.makedirs(e["to"].parent, exist_ok=True)
-            shutil.copy(src=e["from"], dst=e["to"])
+        )
+        for split in ["train", "val"]
+    }
+    filepaths = [entry.image_path for split in entries for entry in entries[split]]
+    is_train = np.zeros(len(filepaths), dtype=bool)
+    is_train[: len(entries["train"])] = True
+    hashes = hash_images(filepaths, cache_filepath=cache_filepath, workers=workers)
+    pairs, distances = find_near_duplicate_pairs(hashes, max_distance=max_distance)
+    logging.info(f"Found {len(pairs)} pairs of near-duplicate images")
+    save_duplicates_report(report_filepath, filepaths, pairs, distances)
+    drop = select_duplicates_to_drop(
+        pairs,
+        is_train=is_train,
+        drop_train_duplicates=drop_train_duplicates,
+    )
+    return {entries["train"][i].stem for i in np.nonzero(drop)[0]}
+
+
+def make_label_caches(dir_dataset: Path) -> None:
+    """
+    Pre-build the ultralytics label caches of the dataset located at
+    `dir_dataset` and save a report of the verification next to it.
+    """
+    reports = build_label_caches(dir_dataset / "datasets", names=CLASS_NAMES)
+    yaml_write(
+        to=dir_dataset / "label_cache_report.yaml",
+        data={
+            split: {
+                "n_images": report.n_images,
+                "n_found": report.n_found,
+                "n_missing": report.n_missing,
+                "n_empty": report.n_empty,
+                "n_corrupt": report.n_corrupt,
+                "messages": report.messages,
+            }
+            for split, report in reports.items()
+        },
+    )
 
 
 if __name__ == "__main__":
@@ -190,27 +518,91 @@ if __name__ == "__main__":
         output_dir = args["output_dir"]
         sampling_ratio = args["sampling_ratio"]
         random_seed = args["random_seed"]
+        workers = args["workers"]
+        materialize_mode = MaterializeMode(args["materialize"])
+        incremental = args["incremental"]
 
         logging.info(f"Creating dirs at {output_dir}")
-        shutil.rmtree(output_dir, ignore_errors=True)
+        if not incremental:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+        if args["validate_images"]:
+            os.makedirs(output_dir, exist_ok=True)
+            validate_images(
+                input_dir=input_dir,
+                cache_filepath=args["image_headers_cache"],
+                report_filepath=output_dir / "image_report.csv",
+            )
+
+        excluded_train_stems = set()
+        if args["dedup"] != "none":
+            os.makedirs(output_dir, exist_ok=True)
+            excluded_train_stems = find_train_duplicates(
+                input_dir=input_dir,
+                cache_filepath=args["image_hashes_cache"],
+                report_filepath=output_dir / "duplicates.csv",
+                max_distance=args["dedup_max_distance"],
+                drop_train_duplicates=args["dedup"] == "all",
+                workers=workers,
+            )
 
         dir_full = output_dir / "full"
         logging.info(f"creating the full dataset located at {dir_full}")
         make_yolov8_folder_structure(dir_full)
-        copy_data(input_dir=input_dir, output_dir=dir_full / "datasets")
+        materialize_dataset(
+            copy_data(
+                input_dir=input_dir,
+                output_dir=dir_full / "datasets",
+                excluded_train_stems=excluded_train_stems,
+            ),
+            dir_dataset=dir_full,
+            incremental=incremental,
+            workers=workers,
+            mode=materialize_mode,
+        )
         write_data_yaml(dir_full / "datasets" / "data.yaml")
+        if args["label_cache"]:
+            make_label_caches(dir_full)
+        if args["shards"]:
+            make_shards(dir_full, shard_size=args["shard_size_mb"] << 20)
 
         dir_small = output_dir / "small"
-        logging.info(f"creating the small dataset located at {dir_small}")
-        make_yolov8_folder_structure(dir_small)
-        run_file_copy(
-            sample_dataset(
-                input_dir=input_dir,
-                output_dir=dir_small / "datasets",
-                sampling_ratio=sampling_ratio,
-                random_seed=random_seed,
-            )
+        dirs_sampled = {
+            sampling_ratio: dir_small,
+            **{
+                ratio: output_dir / "subsets" / f"ratio_{ratio:g}"
+                for ratio in args["subset_ratios"]
+                if ratio != sampling_ratio
+            },
+        }
+        copy_data_sampled = sample_datasets(
+            input_dir=input_dir,
+            output_dirs={
+                ratio: dir_sampled / "datasets"
+                for ratio, dir_sampled in dirs_sampled.items()
+            },
+            random_seed=random_seed,
+            stratify=args["stratify"],
+            workers=workers,
+            excluded_train_stems=excluded_train_stems,
         )
-        write_data_yaml(dir_small / "datasets" / "data.yaml")
+        for ratio, dir_sampled in dirs_sampled.items():
+            logging.info(
+                f"creating the dataset sampled with ratio {ratio} located at "
+                f"{dir_sampled}"
+            )
+            make_yolov8_folder_structure(dir_sampled)
+            materialize_dataset(
+                copy_data_sampled[ratio],
+                dir_dataset=dir_sampled,
+                incremental=incremental,
+                workers=workers,
+                mode=materialize_mode,
+            )
+            write_data_yaml(dir_sampled / "datasets" / "data.yaml")
+            if args["label_cache"]:
+                make_label_caches(dir_sampled)
+            if args["shards"]:
+                make_shards(dir_sampled, shard_size=args["shard_size_mb"] << 20)
 
         exit(0)
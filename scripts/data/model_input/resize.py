@@ -0,0 +1,105 @@
+"""
+CLI script to generate downscaled copies of the model input datasets at
+the training image size.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+from pathlib import Path
+
+from pyro_train.data.resize import resize_dataset
+
+
+def make_cli_parser() -> argparse.ArgumentParser:
+    """
+    Make the CLI parser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input-dir",
+        help=(
+            "path pointing to the model input, containing the datasets to resize (eg. "
+            "full, small)"
+        ),
+        default="./data/03_model_input/wildfire",
+        type=Path,
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="path to save the resized model input",
+        default="./data/03_model_input/wildfire_1024",
+        type=Path,
+    )
+    parser.add_argument(
+        "--long-side",
+        help=(
+            "size in pixels of the long side of the resized images, usually the imgsz "
+            "used for training"
+        ),
+        default=1024,
+        type=int,
+    )
+    parser.add_argument(
+        "--quality",
+        help="JPEG quality of the resized images",
+        default=95,
+        type=int,
+    )
+    parser.add_argument(
+        "--workers",
+        help="number of processes used to resize the images",
+        default=os.cpu_count() or 1,
+        type=int,
+    )
+    parser.add_argument(
+        "-log",
+        "--loglevel",
+        default="warning",
+        help="Provide logging level. Example --loglevel debug, default=warning",
+    )
+    return parser
+
+
+def validate_parsed_args(args: dict) -> bool:
+    """
+    Return whether the parsed args are valid.
+    """
+    if not args["input_dir"].exists():
+        logging.error("Invalid --input-dir directory, it does not exist")
+        return False
+    elif args["long_side"] < 32:
+        logging.error("Invalid --long-side, it should be at least 32 pixels")
+        return False
+    elif not 1 <= args["quality"] <= 100:
+        logging.error("Invalid --quality, it should be between 1 and 100")
+        return False
+    else:
+        return True
+
+
+if __name__ == "__main__":
+    cli_parser = make_cli_parser()
+    args = vars(cli_parser.parse_args())
+    logging.basicConfig(level=args["loglevel"].upper())
+    if not validate_parsed_args(args):
+        logging.error(f"Could not validate the parsed args: {args}")
+        exit(1)
+    else:
+        logging.info(args)
+        input_dir = args["input_dir"]
+        output_dir = args["output_dir"]
+        for filepath_data_yaml in sorted(input_dir.glob("**/datasets/data.yaml")):
+            dataset_dir = filepath_data_yaml.parent
+            dataset_output_dir = output_dir / dataset_dir.relative_to(input_dir)
+            logging.info(f"Resizing the dataset {dataset_dir} to {dataset_output_dir}")
+            resize_dataset(
+                input_dir=dataset_dir,
+                output_dir=dataset_output_dir,
+                long_side=args["long_side"],
+                quality=args["quality"],
+                workers=args["workers"],
+            )
+            shutil.copy(filepath_data_yaml, dataset_output_dir / "data.yaml")
+        exit(0)
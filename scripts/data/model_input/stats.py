@@ -0,0 +1,168 @@
+"""
+CLI script to compute the label statistics of a YOLO dataset.
+"""
+
+import argparse
+import logging
+import os
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from pyro_train.data.image_headers import scan_image_headers
+from pyro_train.data.label_index import SPLITS, LabelIndex, load_or_build_label_index
+from pyro_train.data.utils import yaml_write
+
+# Outside of the DVC outputs of the model input, which the index would modify
+DEFAULT_INDEX_ROOT = Path("./data/02_feature/wildfire/label_index")
+
+
+def make_cli_parser() -> argparse.ArgumentParser:
+    """
+    Make the CLI parser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dataset-dir",
+        help="path pointing to the YOLO dataset, containing the split folders",
+        default="./data/03_model_input/wildfire/full/datasets",
+        type=Path,
+    )
+    parser.add_argument(
+        "--index-dir",
+        help=(
+            "path to cache the label index and the image headers, defaults to a folder "
+            "named after the dataset in ./data/02_feature/wildfire/label_index/"
+        ),
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="path to save the label statistics",
+        default="./data/06_reporting/wildfire/full/",
+        type=Path,
+    )
+    parser.add_argument(
+        "--bins",
+        help="number of bins of the box size histogram",
+        default=20,
+        type=int,
+    )
+    parser.add_argument(
+        "--with-image-sizes",
+        help=(
+            "scan the image headers to add the image dimensions and the box sizes in "
+            "pixels to the statistics"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help="number of processes used to parse the label files",
+        default=os.cpu_count() or 1,
+        type=int,
+    )
+    parser.add_argument(
+        "-log",
+        "--loglevel",
+        default="warning",
+        help="Provide logging level. Example --loglevel debug, default=warning",
+    )
+    return parser
+
+
+def validate_parsed_args(args: dict) -> bool:
+    """
+    Return whether the parsed args are valid.
+    """
+    if not args["dataset_dir"].exists():
+        logging.error("Invalid --dataset-dir directory, it does not exist")
+        return False
+    else:
+        return True
+
+
+def make_image_size_stats(
+    index: LabelIndex,
+    dataset_dir: Path,
+    cache_filepath: Path,
+    workers: int,
+) -> dict[str, dict]:
+    """
+    Return the image dimensions and box sizes in pixels of each split,
+    reading the dimensions from the image headers.
+    """
+    filepaths = [
+        str(dataset_dir / SPLITS[split] / "images" / f"{image_id}.jpg")
+        for image_id, split in zip(index.image_ids, index.splits)
+    ]
+    headers = scan_image_headers(
+        filepaths,
+        cache_filepath=cache_filepath,
+        workers=workers,
+    )
+    shapes = np.array([h.oriented_shape for h in headers], dtype=np.float32)
+    shapes_boxes = np.repeat(shapes, index.boxes_per_image(), axis=0)
+    box_sizes = np.sqrt(
+        index.boxes[:, 3] * shapes_boxes[:, 0] * index.boxes[:, 4] * shapes_boxes[:, 1]
+    )
+    stats = {}
+    for split in index.split_stats():
+        image_mask = index.image_mask(split)
+        box_sizes_split = box_sizes[index.box_mask(split)]
+        shape_counts = Counter(
+            f"{int(w)}x{int(h)}" for w, h in shapes[image_mask].tolist()
+        )
+        stats[split] = {
+            "image_shapes": dict(shape_counts.most_common()),
+            "mean_box_size_pixels": (
+                float(box_sizes_split.mean()) if len(box_sizes_split) else 0.0
+            ),
+        }
+    return stats
+
+
+if __name__ == "__main__":
+    cli_parser = make_cli_parser()
+    args = vars(cli_parser.parse_args())
+    logging.basicConfig(level=args["loglevel"].upper())
+    if not validate_parsed_args(args):
+        logging.error(f"Could not validate the parsed args: {args}")
+        exit(1)
+    else:
+        logging.info(args)
+        dataset_dir = args["dataset_dir"]
+        index_dir = args["index_dir"] or DEFAULT_INDEX_ROOT / dataset_dir.parent.name
+        output_dir = args["output_dir"]
+        index = load_or_build_label_index(
+            dataset_dir=dataset_dir,
+            index_dir=index_dir,
+            workers=args["workers"],
+        )
+        stats = {}
+        for split, split_stats in index.split_stats().items():
+            hist, bin_edges = index.box_size_histogram(bins=args["bins"], split=split)
+            stats[split] = {
+                **split_stats,
+                "box_size_histogram": {
+                    "counts": hist.tolist(),
+                    "bin_edges": [round(e, 4) for e in bin_edges.tolist()],
+                },
+            }
+        if args["with_image_sizes"]:
+            image_size_stats = make_image_size_stats(
+                index,
+                dataset_dir=dataset_dir,
+                cache_filepath=index_dir / "image_headers.csv",
+                workers=args["workers"],
+            )
+            for split, split_stats in image_size_stats.items():
+                stats[split].update(split_stats)
+        logging.info(f"Label statistics: {stats}")
+        os.makedirs(output_dir, exist_ok=True)
+        filepath_stats = output_dir / "label_stats.yaml"
+        logging.info(f"Saving label statistics in {filepath_stats}")
+        yaml_write(to=filepath_stats, data=stats)
+        exit(0)
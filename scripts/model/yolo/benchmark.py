@@ -1,5 +1,10 @@
 """
 CLI script to aggregate all the results from the YOLO train runs.
+
+Parsed runs are cached so that only the new or changed runs are read on
+the next aggregation. The benchmark is saved as a typed SQLite store, with
+a runs and an epochs table, queried with benchmark_query.py, and as the
+benchmark.csv file.
 """
 
 import argparse
@@ -9,7 +14,8 @@ from pathlib import Path
 
 import pandas as pd
 
-from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.benchmark import concat_runs, load_runs
+from pyro_train.model.yolo.benchmark_store import write_benchmark_store
 
 
 def make_cli_parser() -> argparse.ArgumentParser:
@@ -29,6 +35,31 @@ def make_cli_parser() -> argparse.ArgumentParser:
         default="./data/06_reporting/yolo/",
         type=Path,
     )
+    parser.add_argument(
+        "--filepath-cache",
+        help=(
+            "filepath of the cache of the parsed runs, defaults to benchmark_cache.pkl "
+            "in the output dir"
+        ),
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="read all the runs again, without using nor updating the cache",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no-csv",
+        help="only save the SQLite store, not the benchmark.csv file",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help="number of threads reading the runs",
+        default=8,
+        type=int,
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -45,47 +76,13 @@ def validate_parsed_args(args: dict) -> bool:
     if not args["input_dir"].exists():
         logging.error("Invalid --input-dir directory does not exist")
         return False
+    elif args["workers"] < 1:
+        logging.error("Invalid --workers, it should be at least 1")
+        return False
     else:
         return True
 
 
-def add_args_columns(df_results: pd.DataFrame, args: dict):
-    """
-    Return a dataframe that has the same columns as df_results and also the
-    keys of args with the same value for each row (args[key]).
-    """
-    df = df_results.copy()
-    args_str = {k: str(v) for k, v in args.items()}
-    df_args = pd.DataFrame([args_str] * len(df))
-    return pd.concat([df, df_args], axis=1)
-
-
-def make_benchmark(input_dir: Path) -> pd.DataFrame:
-    """
-    Return the df_benchmark dataframe containing the concatenated results
-    of each train runs and their associated model parameters.
-    """
-    train_dirs = [
-        input_dir / f for f in os.listdir(input_dir) if (input_dir / f).is_dir()
-    ]
-    dfs = []
-    for train_dir in train_dirs:
-        args_filepath = train_dir / "args.yaml"
-        results_filepath = train_dir / "results.csv"
-        if not args_filepath.exists() or not results_filepath.exists():
-            logging.warning(f"Skipping {train_dir} - missing artifact")
-        else:
-            logging.info(f"Loading files {args_filepath} and {results_filepath}")
-            cli_args = yaml_read(args_filepath)
-            df_results = pd.read_csv(results_filepath)
-            df_results_with_args_columns = add_args_columns(
-                df_results=df_results, args=cli_args
-            )
-            dfs.append(df_results_with_args_columns)
-    df_benchmark = pd.concat(dfs, ignore_index=True)
-    return df_benchmark
-
-
 if __name__ == "__main__":
     cli_parser = make_cli_parser()
     cli_args = vars(cli_parser.parse_args())
@@ -97,9 +94,23 @@ if __name__ == "__main__":
         logging.info(cli_args)
         input_dir = cli_args["input_dir"]
         output_dir = cli_args["output_dir"]
-        df_benchmark = make_benchmark(input_dir)
-        output_filepath = output_dir / "benchmark.csv"
-        logging.info(f"Saving results in {output_filepath}")
+        filepath_cache = None
+        if not cli_args["no_cache"]:
+            filepath_cache = (
+                cli_args["filepath_cache"] or output_dir / "benchmark_cache.pkl"
+            )
+        runs = load_runs(
+            input_dir,
+            filepath_cache=filepath_cache,
+            max_workers=cli_args["workers"],
+        )
         os.makedirs(output_dir, exist_ok=True)
-        df_benchmark.to_csv(output_dir / "benchmark.csv", index=False)
+        filepath_store = output_dir / "benchmark.sqlite"
+        logging.info(f"Saving {len(runs)} runs in {filepath_store}")
+        write_benchmark_store(runs, filepath_store)
+        if not cli_args["no_csv"]:
+            output_filepath = output_dir / "benchmark.csv"
+            logging.info(f"Saving results in {output_filepath}")
+            df_benchmark = concat_runs(list(runs.values())) if runs else pd.DataFrame()
+            df_benchmark.to_csv(output_filepath, index=False)
         exit(0)
@@ -0,0 +1,182 @@
+"""
+CLI script to benchmark the CPU inference latency and throughput of a
+trained YOLO model and of its ONNX and NCNN exports.
+
+It sweeps the batch sizes, image sizes and numbers of threads and reports
+the p50/p95/p99 latencies, excluding the warmup, the images per second and
+the peak RSS of each configuration in inference_benchmark.csv along with
+inference_benchmark.json, tracked as DVC metrics.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.inference_benchmark import (
+    BenchmarkCase,
+    InferenceFormat,
+    locate_model,
+    run_benchmark,
+    to_metrics,
+    to_records,
+)
+
+
+def make_cli_parser() -> argparse.ArgumentParser:
+    """
+    Make the CLI parser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--model-dir",
+        help=(
+            "directory that contains the result of the ultralytics training of the "
+            "model"
+        ),
+        default="./data/04_models/yolo/best/",
+        type=Path,
+    )
+    parser.add_argument(
+        "--export-dir",
+        help="directory that contains the exports of the model made by export.py",
+        default="./data/04_models/yolo-export/best/",
+        type=Path,
+    )
+    parser.add_argument(
+        "--export-device",
+        help="device targeted by the benchmarked exports",
+        default="cpu",
+        type=str,
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="path to save the inference benchmark",
+        default="./data/06_reporting/yolo/inference/best/",
+        type=Path,
+    )
+    parser.add_argument(
+        "--formats",
+        help="formats to benchmark",
+        nargs="+",
+        choices=[f.value for f in InferenceFormat],
+        default=[f.value for f in InferenceFormat],
+        type=str,
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        help="batch sizes to sweep",
+        nargs="+",
+        default=[1],
+        type=int,
+    )
+    parser.add_argument(
+        "--imgsz",
+        help="image sizes to sweep, defaults to the imgsz the model was trained with",
+        nargs="+",
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--threads",
+        help="numbers of intra-op threads to sweep",
+        nargs="+",
+        default=[1, 2, 4],
+        type=int,
+    )
+    parser.add_argument(
+        "--n-warmup",
+        help="number of untimed inferences before measuring each configuration",
+        default=10,
+        type=int,
+    )
+    parser.add_argument(
+        "--n-runs",
+        help="number of timed inferences of each configuration",
+        default=50,
+        type=int,
+    )
+    parser.add_argument(
+        "-log",
+        "--loglevel",
+        default="warning",
+        help="Provide logging level. Example --loglevel debug, default=warning",
+    )
+    return parser
+
+
+def validate_parsed_args(args: dict) -> bool:
+    """
+    Return whether the parsed args are valid.
+    """
+    if not args["model_dir"].exists():
+        logging.error("Invalid --model-dir directory does not exist")
+        return False
+    elif min(args["batch_sizes"]) < 1 or min(args["threads"]) < 1:
+        logging.error("Invalid --batch-sizes or --threads, they should be at least 1")
+        return False
+    elif args["imgsz"] is not None and any(imgsz % 32 != 0 for imgsz in args["imgsz"]):
+        logging.error("Invalid --imgsz, it should be a multiple of 32")
+        return False
+    elif args["n_warmup"] < 0 or args["n_runs"] < 1:
+        logging.error("Invalid --n-warmup or --n-runs")
+        return False
+    else:
+        return True
+
+
+if __name__ == "__main__":
+    cli_parser = make_cli_parser()
+    args = vars(cli_parser.parse_args())
+    logging.basicConfig(level=args["loglevel"].upper())
+    if not validate_parsed_args(args):
+        logging.error(f"Could not validate the parsed args: {args}")
+        exit(1)
+    else:
+        logging.info(args)
+        output_dir = args["output_dir"]
+        imgszs = args["imgsz"] or [yaml_read(args["model_dir"] / "args.yaml")["imgsz"]]
+        filepaths_model = {}
+        for format in map(InferenceFormat, args["formats"]):
+            filepath_model = locate_model(
+                format,
+                model_dir=args["model_dir"],
+                export_dir=args["export_dir"] / format.value / args["export_device"],
+            )
+            if filepath_model is None:
+                logging.error(
+                    f"Could not find the {format.value} model, run export.py first"
+                )
+                exit(1)
+            filepaths_model[format] = filepath_model
+        cases = [
+            BenchmarkCase(
+                format=format,
+                filepath_model=filepath_model,
+                batch=batch,
+                imgsz=imgsz,
+                n_threads=n_threads,
+            )
+            for (format, filepath_model), batch, imgsz, n_threads in itertools.product(
+                filepaths_model.items(), args["batch_sizes"], imgszs, args["threads"]
+            )
+        ]
+        logging.info(f"Benchmarking {len(cases)} configurations")
+        results = run_benchmark(cases, n_warmup=args["n_warmup"], n_runs=args["n_runs"])
+        records = to_records(results)
+        os.makedirs(output_dir, exist_ok=True)
+        filepath_csv = output_dir / "inference_benchmark.csv"
+        logging.info(f"Saving inference benchmark to {filepath_csv}")
+        pd.DataFrame(records).to_csv(filepath_csv, index=False)
+        with open(output_dir / "inference_benchmark.json", "w") as f:
+            json.dump(to_metrics(records), f, indent=2)
+        n_failed = len(cases) - len(records)
+        if n_failed:
+            logging.error(f"{n_failed} configurations could not be benchmarked")
+            exit(1)
+        exit(0)
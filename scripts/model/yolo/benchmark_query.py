@@ -0,0 +1,148 @@
+"""
+CLI script to query the benchmark store of the YOLO train runs saved by
+benchmark.py.
+
+Queries:
+- top-k: the k runs with the highest metric at their best epoch
+- best-epoch: the epoch with the highest metric of each run
+- pareto: the runs on the Pareto front of the highest metric vs the lowest
+costs, eg. the model size and image size
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from pyro_train.model.yolo.benchmark_store import (
+    best_epochs,
+    load_benchmark_store,
+    pareto_runs,
+    top_k_runs,
+)
+
+
+def make_cli_parser() -> argparse.ArgumentParser:
+    """
+    Make the CLI parser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--filepath-store",
+        help="filepath of the benchmark store",
+        default=Path("./data/06_reporting/yolo/benchmark.sqlite"),
+        type=Path,
+    )
+    parser.add_argument(
+        "--query",
+        help="query to run on the benchmark store",
+        choices=["top-k", "best-epoch", "pareto"],
+        default="top-k",
+        type=str,
+    )
+    parser.add_argument(
+        "--metric",
+        help="metric to maximize, a column of results.csv or fitness",
+        default="fitness",
+        type=str,
+    )
+    parser.add_argument(
+        "--k",
+        help="number of runs returned by the top-k query",
+        default=10,
+        type=int,
+    )
+    parser.add_argument(
+        "--costs",
+        help="columns of the runs to minimize for the pareto query",
+        default=["weights_size_mb", "imgsz"],
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "--columns",
+        help="columns to display, along with the run, the metric and the costs",
+        default=["model", "epoch", "metrics/mAP50-95(B)"],
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "--output-filepath",
+        help="optional filepath to save the full result of the query as a CSV file",
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "-log",
+        "--loglevel",
+        default="warning",
+        help="Provide logging level. Example --loglevel debug, default=warning.",
+    )
+    return parser
+
+
+def validate_parsed_args(args: dict) -> bool:
+    """
+    Return whether the parsed args are valid.
+    """
+    if not args["filepath_store"].exists():
+        logging.error(
+            "Invalid --filepath-store file does not exist, run benchmark.py first"
+        )
+        return False
+    elif args["k"] < 1:
+        logging.error("Invalid --k, it should be at least 1")
+        return False
+    else:
+        return True
+
+
+def run_query(
+    df_runs: pd.DataFrame, df_epochs: pd.DataFrame, args: dict
+) -> pd.DataFrame:
+    """
+    Return the result of the query described by the `args`.
+    """
+    if args["query"] == "top-k":
+        return top_k_runs(df_runs, df_epochs, metric=args["metric"], k=args["k"])
+    elif args["query"] == "best-epoch":
+        return best_epochs(df_epochs, metric=args["metric"])
+    else:
+        return pareto_runs(
+            df_runs, df_epochs, metric=args["metric"], costs=args["costs"]
+        )
+
+
+if __name__ == "__main__":
+    cli_parser = make_cli_parser()
+    args = vars(cli_parser.parse_args())
+    logging.basicConfig(level=args["loglevel"].upper())
+    if not validate_parsed_args(args):
+        logging.error(f"Could not validate the parsed args: {args}")
+        exit(1)
+    else:
+        logging.info(args)
+        df_runs, df_epochs = load_benchmark_store(args["filepath_store"])
+        columns = [args["metric"]] + args["columns"]
+        if args["query"] == "pareto":
+            columns += args["costs"]
+        missing = [
+            c
+            for c in columns
+            if c not in df_runs.columns and c not in df_epochs.columns
+        ]
+        if args["metric"] in missing:
+            logging.error(f"Unknown --metric {args['metric']}")
+            exit(1)
+        if args["query"] == "pareto" and set(args["costs"]) & set(missing):
+            logging.error(f"Unknown --costs {set(args['costs']) & set(missing)}")
+            exit(1)
+        df = run_query(df_runs, df_epochs, args)
+        if args["output_filepath"] is not None:
+            df.to_csv(args["output_filepath"], index=False)
+        display_columns = ["run"] + [
+            c for c in dict.fromkeys(columns) if c in df.columns
+        ]
+        print(df[display_columns].to_string(index=False))
+        exit(0)
@@ -1,19 +1,79 @@
 """
 CLI script to run random hyperparameter search for training a YOLO
 model the object detection task of fire smokes.
+
+With --strategy tpe, the configurations are suggested batch after batch
+by a Tree-structured Parzen Estimator fitted on the trials already
+completed, warm-started from the train runs of --warm-start-dir.
+
+With --screening-data, the search runs at two fidelities: configurations
+are screened on a small dataset with reduced image sizes and epochs, and
+the top --promote-top-k ones are then trained on the --data dataset.
+
+With --latency, each trial exports its best weights to ONNX to measure
+their CPU inference latency with onnxruntime, and the Pareto front of
+fitness vs p95 latency is reported. With --latency-budget-ms, the
+configurations whose architecture is too slow at their image size are
+pruned before training.
+
+With --queue-dir, trials are not run locally but queued for workers that
+can run on several nodes, see hyperparameter_search_worker.py.
 """
 
 import argparse
 import logging
+import os
 import random
-import uuid
-from datetime import datetime
+from functools import partial
 from pathlib import Path
+from typing import Callable
 
+import numpy as np
+import pandas as pd
 from ultralytics import settings
 
 import pyro_train.model.yolo.hyperparameters.space as hyperparameters
-from pyro_train.model.yolo.train import load_pretrained_model, train
+from pyro_train.data.fingerprint import dataset_fingerprint
+from pyro_train.model.yolo.batch_tuning import BatchTuningConfig
+from pyro_train.model.yolo.hyperparameters.asha import ASHAConfig, RungStore
+from pyro_train.model.yolo.hyperparameters.fidelity import (
+    Fidelity,
+    ScreeningConfig,
+    make_screening_configuration,
+    select_top_k,
+)
+from pyro_train.model.yolo.hyperparameters.runner import (
+    DEFAULT_IMGSZ,
+    make_run_trial,
+    record_result,
+    run_trial_options,
+)
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialResult,
+    TrialStatus,
+    make_slots,
+    run_trials,
+)
+from pyro_train.model.yolo.hyperparameters.store import (
+    TrialRecord,
+    TrialState,
+    TrialStore,
+    make_trial_key,
+)
+from pyro_train.model.yolo.hyperparameters.tpe import (
+    Observation,
+    load_run_observations,
+    suggest_configurations,
+    value_indices_of_configuration,
+)
+from pyro_train.model.yolo.hyperparameters.trial_queue import (
+    TrialQueue,
+    run_queued_trials,
+)
+from pyro_train.model.yolo.latency import LatencyConfig, LatencyStats, probe_latency
+from pyro_train.model.yolo.train import DEFAULT_WORKERS
+from pyro_train.utils import pareto_front_mask, pareto_ranks
 
 
 def make_cli_parser() -> argparse.ArgumentParser:
@@ -56,6 +116,237 @@ def make_cli_parser() -> argparse.ArgumentParser:
         type=int,
         required=True,
     )
+    parser.add_argument(
+        "--strategy",
+        help=(
+            "how configurations are drawn: random draws n distinct configurations, "
+            "grid takes n configurations spreading the values of each key evenly, tpe "
+            "suggests them batch after batch from the results of the previous trials"
+        ),
+        choices=["random", "grid", "tpe"],
+        default="random",
+        type=str,
+    )
+    parser.add_argument(
+        "--random-seed",
+        help=(
+            "random seed used to draw the configurations, the same seed draws the same "
+            "configurations"
+        ),
+        default=0,
+        type=int,
+    )
+    parser.add_argument(
+        "--warm-start-dir",
+        help=(
+            "folder of previous train runs, with their args.yaml and results.csv "
+            "files, used to warm-start the tpe strategy"
+        ),
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "--screening-data",
+        help=(
+            "filepath to the data_yaml config file of a small dataset to screen the "
+            "configurations on before promoting the best ones to --data"
+        ),
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "--screening-imgsz-factor",
+        help="factor applied to the imgsz of the screened configurations",
+        default=0.5,
+        type=float,
+    )
+    parser.add_argument(
+        "--screening-epochs-factor",
+        help="factor applied to the epochs of the screened configurations",
+        default=0.25,
+        type=float,
+    )
+    parser.add_argument(
+        "--promote-top-k",
+        help=(
+            "number of screened configurations, the best by fitness, promoted to train "
+            "on --data"
+        ),
+        default=5,
+        type=int,
+    )
+    parser.add_argument(
+        "--latency",
+        help=(
+            "export the best weights of each trial to ONNX, measure their CPU "
+            "inference latency with onnxruntime and report the Pareto front of fitness "
+            "vs p95 latency"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--latency-budget-ms",
+        help=(
+            "prune the configurations whose p95 latency exceeds this budget, probed on "
+            "their untrained architecture before training. Implies --latency"
+        ),
+        default=None,
+        type=float,
+    )
+    parser.add_argument(
+        "--latency-threads",
+        help=(
+            "number of onnxruntime threads used to measure the latency, set it to the "
+            "number of cores of the target device"
+        ),
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--latency-runs",
+        help="number of timed inferences to measure the latency",
+        default=50,
+        type=int,
+    )
+    parser.add_argument(
+        "--throughput",
+        help=(
+            "record the wall time, images/s, dataloader wait, compute and validation "
+            "times and peak RSS of each epoch in the throughput.csv file of each trial"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-dataloader",
+        help=(
+            "probe the dataloader workers and the RAM cache on the dataset before "
+            "training and train with the fastest ones. The RAM cache is only probed "
+            "when the train split fits in the available memory"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-disk-cache",
+        help=(
+            "also probe the disk cache with --autotune-dataloader. It writes .npy "
+            "files next to the images of the dataset, keep it off for datasets that "
+            "are DVC outputs"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-batch",
+        help=(
+            "probe the training throughput of increasing batch sizes on the device "
+            "under a memory ceiling and train with the fastest one. The space should "
+            "not search the batch, which the trials would not train with"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-batch-max",
+        help="largest batch size probed by --autotune-batch",
+        default=128,
+        type=int,
+    )
+    parser.add_argument(
+        "--autotune-batch-memory-fraction",
+        help=(
+            "memory ceiling of --autotune-batch, as a fraction of the available RAM on "
+            "CPU or of the device memory on CUDA"
+        ),
+        default=0.8,
+        type=float,
+    )
+    parser.add_argument(
+        "--scale-lr0",
+        help=(
+            "scale lr0 linearly with the effective batch size chosen by "
+            "--autotune-batch, the sampled lr0 being the one of the default batch of "
+            "16. It has no effect on the trials with the auto optimizer"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        help="number of trials to run concurrently, each in its own process",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--devices",
+        help=(
+            "devices assigned to the concurrent trials in a round robin fashion, "
+            "defaults to the device selected by ultralytics, the first GPU when there "
+            "is one. Example --devices 0 1 or --devices cpu"
+        ),
+        default=None,
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "--threads-per-trial",
+        help=(
+            "number of CPU cores and threads allocated to each trial, defaults to an "
+            "even split of the available cores"
+        ),
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--workers-per-trial",
+        help=(
+            "number of dataloader workers of each trial, defaults to the workers of "
+            "a train run split between the --n-jobs concurrent trials"
+        ),
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--queue-dir",
+        help=(
+            "run the trials on the workers of a queue folder, on a filesystem shared "
+            "with them, instead of locally. Start the workers with "
+            "hyperparameter_search_worker.py"
+        ),
+        default=None,
+        type=Path,
+    )
+    parser.add_argument(
+        "--queue-poll-seconds",
+        help="interval between two checks of the queue for finished trials",
+        default=10.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--queue-stale-seconds",
+        help="claimed trials whose worker did not heartbeat for this long are requeued",
+        default=300.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--asha",
+        help=(
+            "early stop the underperforming trials with asynchronous successive "
+            "halving"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--asha-min-epochs",
+        help="number of epochs of the first ASHA rung",
+        default=5,
+        type=int,
+    )
+    parser.add_argument(
+        "--asha-reduction-factor",
+        help=(
+            "only the top 1/reduction_factor trials of each ASHA rung keep training, "
+            "rungs being spaced by this factor"
+        ),
+        default=3,
+        type=int,
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -72,10 +363,420 @@ def validate_parsed_args(args: dict) -> bool:
     if not args["data"].exists():
         logging.error("Invalid --data filepath does not exist")
         return False
+    elif args["warm_start_dir"] is not None and not args["warm_start_dir"].is_dir():
+        logging.error("Invalid --warm-start-dir, it should be an existing folder")
+        return False
+    elif args["screening_data"] is not None and not args["screening_data"].exists():
+        logging.error("Invalid --screening-data filepath does not exist")
+        return False
+    elif args["screening_data"] is not None and args["strategy"] == "tpe":
+        logging.error(
+            "Invalid --strategy tpe, it cannot be combined with --screening-data"
+        )
+        return False
+    elif not 0 < args["screening_imgsz_factor"] <= 1:
+        logging.error("Invalid --screening-imgsz-factor, it should be in ]0, 1]")
+        return False
+    elif not 0 < args["screening_epochs_factor"] <= 1:
+        logging.error("Invalid --screening-epochs-factor, it should be in ]0, 1]")
+        return False
+    elif args["promote_top_k"] < 1:
+        logging.error("Invalid --promote-top-k, it should be at least 1")
+        return False
+    elif args["latency_budget_ms"] is not None and args["latency_budget_ms"] <= 0:
+        logging.error("Invalid --latency-budget-ms, it should be positive")
+        return False
+    elif args["latency_threads"] < 1 or args["latency_runs"] < 1:
+        logging.error(
+            "Invalid --latency-threads or --latency-runs, they should be at least 1"
+        )
+        return False
+    elif args["queue_poll_seconds"] <= 0 or args["queue_stale_seconds"] <= 0:
+        logging.error(
+            "Invalid --queue-poll-seconds or --queue-stale-seconds, they should be "
+            "positive"
+        )
+        return False
+    elif args["n_jobs"] < 1:
+        logging.error("Invalid --n-jobs, it should be at least 1")
+        return False
+    elif args["threads_per_trial"] is not None and args["threads_per_trial"] < 1:
+        logging.error("Invalid --threads-per-trial, it should be at least 1")
+        return False
+    elif args["workers_per_trial"] is not None and args["workers_per_trial"] < 0:
+        logging.error("Invalid --workers-per-trial, it should be positive")
+        return False
+    elif args["asha_min_epochs"] < 1:
+        logging.error("Invalid --asha-min-epochs, it should be at least 1")
+        return False
+    elif args["asha_reduction_factor"] < 2:
+        logging.error("Invalid --asha-reduction-factor, it should be at least 2")
+        return False
+    elif args["autotune_disk_cache"] and not args["autotune_dataloader"]:
+        logging.error(
+            "Invalid --autotune-disk-cache, it requires --autotune-dataloader"
+        )
+        return False
+    elif args["autotune_batch_max"] < 2:
+        logging.error("Invalid --autotune-batch-max, it should be at least 2")
+        return False
+    elif not 0 < args["autotune_batch_memory_fraction"] <= 1:
+        logging.error(
+            "Invalid --autotune-batch-memory-fraction, it should be in (0, 1]"
+        )
+        return False
     else:
         return True
 
 
+def trial_experiment_name(
+    args: dict,
+    trial_key: str,
+    fidelity: Fidelity = Fidelity.full,
+) -> str:
+    if fidelity == Fidelity.full:
+        return f"{args['experiment_name']}_{trial_key}"
+    return f"{args['experiment_name']}_{fidelity.value}_{trial_key}"
+
+
+def workers_per_trial(args: dict) -> int:
+    """
+    Return the number of dataloader workers of each trial, the workers of a
+    train run split between the concurrent trials by default.
+    """
+    if args["workers_per_trial"] is not None:
+        return args["workers_per_trial"]
+    return max(1, DEFAULT_WORKERS // args["n_jobs"])
+
+
+def make_trials(
+    configurations: list[dict],
+    store: TrialStore,
+    data_fingerprint: str,
+    args: dict,
+    data_yaml_path: Path | None = None,
+    fidelity: Fidelity = Fidelity.full,
+) -> list[Trial]:
+    """
+    Add the `configurations` to the `store` and return the trials left to
+    run, skipping the ones already completed, failed or pruned.
+
+    Trials train on `data_yaml_path`, defaulting to `args["data"]`.
+    """
+    trials = []
+    trial_keys = set()
+    for configuration in configurations:
+        trial_key = make_trial_key(configuration, data_fingerprint)
+        if trial_key in trial_keys:
+            logging.info(f"Skipping duplicate configuration {configuration}")
+            continue
+        trial_keys.add(trial_key)
+        record = store.add(
+            trial_key,
+            experiment_name=trial_experiment_name(args, trial_key, fidelity),
+            config=configuration,
+            data_fingerprint=data_fingerprint,
+            fidelity=fidelity,
+        )
+        if record.state in {
+            TrialState.completed,
+            TrialState.failed,
+            TrialState.pruned,
+            TrialState.stopped,
+        }:
+            logging.info(
+                f"Skipping trial {trial_key}, already {record.state.value} with "
+                f"fitness {record.metrics.get('fitness')}"
+            )
+            continue
+        trials.append(
+            Trial(
+                trial_id=trial_key,
+                params={**configuration, "workers": workers_per_trial(args)},
+                data_yaml_path=data_yaml_path or args["data"],
+                project=str(args["output_dir"]),
+                experiment_name=record.experiment_name,
+                fidelity=fidelity,
+            )
+        )
+    return trials
+
+
+def prune_over_latency_budget(
+    configurations: list[dict],
+    store: TrialStore,
+    data_fingerprint: str,
+    args: dict,
+    latency_config: LatencyConfig,
+    probes: dict[tuple[str, int], LatencyStats],
+) -> list[dict]:
+    """
+    Return the `configurations` whose architecture meets the latency
+    budget at their image size. The other ones are recorded as pruned in
+    the `store` along with their probed latency.
+
+    `probes` caches the latency of each (model_type, imgsz) pair.
+    """
+    kept = []
+    for configuration in configurations:
+        probe_key = (
+            str(configuration["model_type"]),
+            int(configuration.get("imgsz", DEFAULT_IMGSZ)),
+        )
+        if probe_key not in probes:
+            probes[probe_key] = probe_latency(*probe_key, config=latency_config)
+        stats = probes[probe_key]
+        if stats.p95_ms <= args["latency_budget_ms"]:
+            kept.append(configuration)
+            continue
+        trial_key = make_trial_key(configuration, data_fingerprint)
+        record = store.add(
+            trial_key,
+            experiment_name=trial_experiment_name(args, trial_key),
+            config=configuration,
+            data_fingerprint=data_fingerprint,
+        )
+        if record.state not in {
+            TrialState.completed,
+            TrialState.failed,
+            TrialState.stopped,
+        }:
+            store.set_state(trial_key, TrialState.pruned, metrics=stats.to_metrics())
+        logging.info(
+            f"Pruning configuration {configuration}, p95 latency of "
+            f"{stats.p95_ms:.1f}ms over the budget"
+        )
+    logging.info(
+        f"{len(kept)}/{len(configurations)} configurations meet the latency budget of "
+        f"{args['latency_budget_ms']}ms"
+    )
+    return kept
+
+
+def report_pareto_front(
+    store: TrialStore,
+    data_fingerprint: str,
+    filepath_csv: Path,
+) -> None:
+    """
+    Save the Pareto front of fitness vs p95 latency of the completed full
+    fidelity trials of the `store` to `filepath_csv`.
+    """
+    records = [
+        r
+        for r in store.list([TrialState.completed])
+        if r.fidelity == Fidelity.full
+        and r.data_fingerprint == data_fingerprint
+        and "fitness" in r.metrics
+        and "latency_p95_ms" in r.metrics
+    ]
+    if not records:
+        logging.warning("No trial with a measured latency to report a Pareto front")
+        return
+    mask = pareto_front_mask(
+        [[-r.metrics["fitness"], r.metrics["latency_p95_ms"]] for r in records]
+    )
+    df_front = pd.DataFrame(
+        [
+            {
+                "experiment_name": r.experiment_name,
+                "fitness": r.metrics["fitness"],
+                "mAP50-95": r.metrics.get("metrics/mAP50-95(B)"),
+                "latency_p50_ms": r.metrics.get("latency_p50_ms"),
+                "latency_p95_ms": r.metrics["latency_p95_ms"],
+                **r.config,
+            }
+            for r, is_optimal in zip(records, mask)
+            if is_optimal
+        ]
+    ).sort_values("latency_p95_ms")
+    df_front.to_csv(filepath_csv, index=False)
+    logging.info(
+        "Pareto front of fitness vs p95 latency saved to "
+        f"{filepath_csv}:\n{df_front.to_string(index=False)}"
+    )
+
+
+def store_observations(
+    hyperparameter_space: hyperparameters.HyperparameterSpace,
+    store: TrialStore,
+    data_fingerprint: str,
+) -> tuple[list[Observation], dict[tuple[int, ...], TrialRecord]]:
+    """
+    Return the observations of the completed, stopped and pruned trials of
+    the `store` trained on the same data, along with all its trials by
+    value indices. Pruned trials, and trials stopped by ASHA whose
+    truncated fitness is not comparable, are observed with a null fitness.
+    """
+    observations = []
+    tried = {}
+    for record in store.list(list(TrialState)):
+        if record.data_fingerprint != data_fingerprint:
+            continue
+        value_indices = value_indices_of_configuration(
+            hyperparameter_space, record.config
+        )
+        if value_indices is None:
+            continue
+        tried[tuple(value_indices)] = record
+        if record.state == TrialState.completed and "fitness" in record.metrics:
+            observations.append(Observation(value_indices, record.metrics["fitness"]))
+        elif record.state in {TrialState.pruned, TrialState.stopped}:
+            observations.append(Observation(value_indices, 0.0))
+    return observations, tried
+
+
+def latency_aware_observations(
+    observations: list[Observation],
+    latencies: dict[tuple[int, ...], float],
+) -> list[Observation]:
+    """
+    Score the `observations` by their Pareto rank on fitness vs p95 latency,
+    ties being broken by fitness, so that TPE optimizes the Pareto front.
+    Observations without a measured latency count as infinitely slow.
+    """
+    costs = np.array(
+        [
+            [-o.fitness, latencies.get(tuple(o.value_indices), np.inf)]
+            for o in observations
+        ]
+    ).reshape(-1, 2)
+    return [
+        # Fitness is in [0, 1] so that it does not change the rank order
+        Observation(o.value_indices, -float(rank) + 0.5 * o.fitness)
+        for o, rank in zip(observations, pareto_ranks(costs))
+    ]
+
+
+def run_tpe_search(
+    hyperparameter_space: hyperparameters.HyperparameterSpace,
+    store: TrialStore,
+    data_fingerprint: str,
+    run: Callable[[list[Trial]], list[TrialResult]],
+    args: dict,
+    prune: Callable[[list[dict]], list[dict]] | None = None,
+) -> list[TrialResult]:
+    """
+    Run `args["n"]` trials suggested by TPE, in batches of `args["n_jobs"]`
+    trials. The trials left unfinished by a previous search are run first.
+
+    Suggested configurations go through `prune` when set, the pruned ones
+    not counting in the `args["n"]` trials. With `args["latency"]`, TPE
+    optimizes the Pareto front of fitness vs p95 latency.
+    """
+    warm_start_observations = []
+    if args["warm_start_dir"] is not None:
+        warm_start_observations = load_run_observations(
+            hyperparameter_space, args["warm_start_dir"], data_yaml_path=args["data"]
+        )
+        logging.info(
+            f"Warm-starting TPE with {len(warm_start_observations)} runs from "
+            f"{args['warm_start_dir']}"
+        )
+    unfinished = [
+        r
+        for r in store.list([TrialState.pending, TrialState.running])
+        if r.data_fingerprint == data_fingerprint
+    ]
+    results = run(
+        make_trials([r.config for r in unfinished], store, data_fingerprint, args)
+    )
+    while True:
+        observations, tried = store_observations(
+            hyperparameter_space, store, data_fingerprint
+        )
+        n_pruned = sum(1 for r in tried.values() if r.state == TrialState.pruned)
+        n_left = args["n"] - (len(tried) - n_pruned)
+        if n_left <= 0:
+            return results
+        # Trials of the store override the warm-start runs of the same configuration
+        observations = list(
+            {
+                tuple(o.value_indices): o
+                for o in warm_start_observations + observations
+            }.values()
+        )
+        if args["latency"]:
+            observations = latency_aware_observations(
+                observations,
+                latencies={
+                    k: r.metrics["latency_p95_ms"]
+                    for k, r in tried.items()
+                    if "latency_p95_ms" in r.metrics
+                },
+            )
+        configurations = suggest_configurations(
+            hyperparameter_space,
+            observations,
+            n=min(n_left, args["n_jobs"]),
+            rng=np.random.default_rng([args["random_seed"], len(tried)]),
+            excluded=set(tried),
+        )
+        logging.info(
+            f"TPE suggested {len(configurations)} configurations from "
+            f"{len(observations)} observations"
+        )
+        if not configurations:
+            logging.warning("TPE could not suggest any new configuration")
+            return results
+        if prune is not None:
+            configurations = prune(configurations)
+        results += run(make_trials(configurations, store, data_fingerprint, args))
+
+
+def run_multi_fidelity_search(
+    configurations: list[dict],
+    store: TrialStore,
+    data_fingerprint: str,
+    run: Callable[[list[Trial]], list[TrialResult]],
+    args: dict,
+) -> list[TrialResult]:
+    """
+    Screen the `configurations` on `args["screening_data"]` with reduced
+    image sizes and epochs, then train the top `args["promote_top_k"]`
+    ones by screening fitness on `args["data"]`. Screened trials stopped
+    by ASHA are not promoted.
+    """
+    screening_config = ScreeningConfig(
+        imgsz_factor=args["screening_imgsz_factor"],
+        epochs_factor=args["screening_epochs_factor"],
+    )
+    screening_fingerprint = dataset_fingerprint(args["screening_data"])
+    screening_configurations = [
+        make_screening_configuration(c, screening_config) for c in configurations
+    ]
+    trials = make_trials(
+        screening_configurations,
+        store,
+        screening_fingerprint,
+        args,
+        data_yaml_path=args["screening_data"],
+        fidelity=Fidelity.screening,
+    )
+    logging.info(
+        f"Screening {len(trials)} configurations on {args['screening_data']} with "
+        f"{screening_config}"
+    )
+    results = run(trials)
+
+    fitness_by_index = {}
+    for i, configuration in enumerate(screening_configurations):
+        record = store.get(make_trial_key(configuration, screening_fingerprint))
+        if record is not None and record.state == TrialState.completed:
+            fitness_by_index[i] = record.metrics.get("fitness", 0.0)
+    promoted = select_top_k(fitness_by_index, k=args["promote_top_k"])
+    for i in promoted:
+        logging.info(
+            f"Promoting configuration {configurations[i]} with screening fitness "
+            f"{fitness_by_index[i]:.4f}"
+        )
+    trials = make_trials(
+        [configurations[i] for i in promoted], store, data_fingerprint, args
+    )
+    logging.info(f"Training {len(trials)} promoted configurations on {args['data']}")
+    return results + run(trials)
+
+
 if __name__ == "__main__":
     cli_parser = make_cli_parser()
     args = vars(cli_parser.parse_args())
@@ -84,9 +785,10 @@ if __name__ == "__main__":
         logging.error(f"Could not validate the parsed args: {args}")
         exit(1)
     else:
+        args["latency"] = args["latency"] or args["latency_budget_ms"] is not None
         logging.info(args)
         n = args["n"]
-        random_seed = datetime.now().timestamp()
+        random_seed = args["random_seed"]
         filepath_space_yaml = args["filepath_space_yaml"]
         logging.info(f"Initializing random seed: {random_seed}")
         random.seed(random_seed)
@@ -94,29 +796,138 @@ if __name__ == "__main__":
         hyperparameter_space = hyperparameters.parse_space_yaml(
             filepath_space=filepath_space_yaml
         )
+        if args["autotune_batch"] and "batch" in hyperparameter_space.space:
+            logging.error(
+                "Invalid --autotune-batch, the space searches the batch, which would "
+                "not be the one the trials train with. Remove it from "
+                f"{filepath_space_yaml}"
+            )
+            exit(1)
 
-        configurations = hyperparameters.draw_n_random_configurations(
-            hyperparameter_space=hyperparameter_space,
-            n=n,
-            random_seed=random_seed,
-        )
+        os.makedirs(args["output_dir"], exist_ok=True)
+        filepath_store = args["output_dir"] / f"{args['experiment_name']}_search.sqlite"
+        store = TrialStore(filepath_store)
+        data_fingerprint = dataset_fingerprint(args["data"])
+        logging.info(f"Dataset fingerprint: {data_fingerprint}")
 
         # Update ultralytics settings to log with MLFlow
         settings.update({"mlflow": True})
-        logging.info(f"Generated {len(configurations)} configurations")
 
-        for idx, configuration in enumerate(configurations):
-            run_id = uuid.uuid4().hex
-            logging.info(
-                f"Starting train run {idx} with the following configuration: {configuration}"
+        asha_config = None
+        if args["asha"]:
+            asha_config = ASHAConfig(
+                min_epochs=args["asha_min_epochs"],
+                reduction_factor=args["asha_reduction_factor"],
             )
-            logging.info(f"loading pretrained model: {configuration['model_type']}")
-            model = load_pretrained_model(configuration["model_type"])
-            train(
-                model=model,
-                data_yaml_path=args["data"],
-                params=configuration,
-                project=str(args["output_dir"]),
-                experiment_name=f"{args['experiment_name']}_{run_id}",
+            # Create the rung store before the trials start writing to it
+            RungStore(filepath_store)
+            logging.info(f"Early stopping trials with {asha_config}")
+        latency_config = None
+        prune = None
+        if args["latency"]:
+            latency_config = LatencyConfig(
+                n_threads=args["latency_threads"], n_runs=args["latency_runs"]
+            )
+            logging.info(f"Measuring the latency of the trials with {latency_config}")
+        if args["latency_budget_ms"] is not None:
+            prune = partial(
+                prune_over_latency_budget,
+                store=store,
+                data_fingerprint=data_fingerprint,
+                args=args,
+                latency_config=latency_config,
+                probes={},
+            )
+        options = run_trial_options(
+            filepath_store,
+            asha_config=asha_config,
+            latency_config=latency_config,
+            throughput=args["throughput"],
+            autotune_dataloader=args["autotune_dataloader"],
+            autotune_disk_cache=args["autotune_disk_cache"],
+            batch_tuning_config=(
+                BatchTuningConfig(
+                    max_batch=args["autotune_batch_max"],
+                    memory_fraction=args["autotune_batch_memory_fraction"],
+                    scale_lr0=args["scale_lr0"],
+                )
+                if args["autotune_batch"]
+                else None
+            ),
+        )
+        if args["queue_dir"] is not None:
+            logging.info(f"Queuing the trials in {args['queue_dir']} for the workers")
+            run = partial(
+                run_queued_trials,
+                queue=TrialQueue(args["queue_dir"]),
+                options=options,
+                on_result=partial(record_result, store),
+                poll_seconds=args["queue_poll_seconds"],
+                stale_after_seconds=args["queue_stale_seconds"],
+            )
+        else:
+            run = partial(
+                run_trials,
+                run_trial=make_run_trial(options),
+                slots=make_slots(
+                    n_jobs=args["n_jobs"],
+                    devices=args["devices"] or [None],
+                    threads_per_trial=args["threads_per_trial"],
+                ),
+                on_result=partial(record_result, store),
+            )
+
+        logging.info(
+            f"Drawing {n} configurations with the {args['strategy']} strategy from a "
+            f"space of size {hyperparameter_space.size}"
+        )
+        if args["strategy"] == "tpe":
+            results = run_tpe_search(
+                hyperparameter_space,
+                store=store,
+                data_fingerprint=data_fingerprint,
+                run=run,
+                args=args,
+                prune=prune,
+            )
+        else:
+            if args["strategy"] == "grid":
+                configurations = hyperparameters.draw_strided_grid(
+                    hyperparameter_space=hyperparameter_space,
+                    n=n,
+                    random_seed=random_seed,
+                )
+            else:
+                configurations = hyperparameters.draw_n_unique_configurations(
+                    hyperparameter_space=hyperparameter_space,
+                    n=n,
+                    random_seed=random_seed,
+                )
+            logging.info(f"Generated {len(configurations)} configurations")
+            if prune is not None:
+                configurations = prune(configurations)
+            if args["screening_data"] is not None:
+                results = run_multi_fidelity_search(
+                    configurations,
+                    store=store,
+                    data_fingerprint=data_fingerprint,
+                    run=run,
+                    args=args,
+                )
+            else:
+                trials = make_trials(configurations, store, data_fingerprint, args)
+                logging.info(
+                    f"{len(trials)} trials to run, store: {store.count_by_state()}"
+                )
+                results = run(trials)
+        if args["latency"]:
+            report_pareto_front(
+                store,
+                data_fingerprint=data_fingerprint,
+                filepath_csv=args["output_dir"]
+                / f"{args['experiment_name']}_pareto_front.csv",
             )
-        exit(0)
+        n_failed = sum(1 for r in results if r.status == TrialStatus.failed)
+        if n_failed:
+            logging.error(f"{n_failed}/{len(results)} trials failed")
+        exit(1 if results and n_failed == len(results) else 0)
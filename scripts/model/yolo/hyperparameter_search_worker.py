@@ -0,0 +1,141 @@
+"""
+CLI script to run the trials queued by hyperparameter_search.py --queue-dir.
+
+Start one worker per node, or several on a single node, pointing to the
+same queue folder on a shared filesystem. The output dir and the datasets
+of the search should be reachable from every node with the same paths.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from ultralytics import settings
+
+from pyro_train.model.yolo.hyperparameters.runner import make_run_trial
+from pyro_train.model.yolo.hyperparameters.scheduler import make_slots
+from pyro_train.model.yolo.hyperparameters.trial_queue import TrialQueue, run_worker
+
+
+def make_cli_parser() -> argparse.ArgumentParser:
+    """
+    Make the CLI parser.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--queue-dir",
+        help="queue folder of the hyperparameter search",
+        type=Path,
+        required=True,
+    )
+    parser.add_argument(
+        "--n-jobs",
+        help=(
+            "number of trials to run concurrently on this node, each in its own "
+            "process"
+        ),
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--devices",
+        help=(
+            "devices assigned to the concurrent trials in a round robin fashion, "
+            "defaults to the device selected by ultralytics, the first GPU when there "
+            "is one. Example --devices 0 1 or --devices cpu"
+        ),
+        default=None,
+        nargs="+",
+        type=str,
+    )
+    parser.add_argument(
+        "--threads-per-trial",
+        help=(
+            "number of CPU cores and threads allocated to each trial, defaults to an "
+            "even split of the available cores"
+        ),
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--poll-seconds",
+        help="interval between two checks of the queue for pending trials",
+        default=10.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--heartbeat-seconds",
+        help=(
+            "interval between two heartbeats of the running trials, it should be well "
+            "below the --queue-stale-seconds of the search"
+        ),
+        default=30.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--max-idle-seconds",
+        help=(
+            "stop the worker once the queue has been empty for this long, never stop "
+            "by default"
+        ),
+        default=None,
+        type=float,
+    )
+    parser.add_argument(
+        "-log",
+        "--loglevel",
+        default="warning",
+        help="Provide logging level. Example --loglevel debug, default=warning",
+    )
+    return parser
+
+
+def validate_parsed_args(args: dict) -> bool:
+    """
+    Return whether the parsed args are valid.
+    """
+    if not args["queue_dir"].is_dir():
+        logging.error("Invalid --queue-dir, it should be an existing folder")
+        return False
+    elif args["n_jobs"] < 1:
+        logging.error("Invalid --n-jobs, it should be at least 1")
+        return False
+    elif args["threads_per_trial"] is not None and args["threads_per_trial"] < 1:
+        logging.error("Invalid --threads-per-trial, it should be at least 1")
+        return False
+    elif args["poll_seconds"] <= 0 or args["heartbeat_seconds"] <= 0:
+        logging.error(
+            "Invalid --poll-seconds or --heartbeat-seconds, they should be positive"
+        )
+        return False
+    else:
+        return True
+
+
+if __name__ == "__main__":
+    cli_parser = make_cli_parser()
+    args = vars(cli_parser.parse_args())
+    logging.basicConfig(level=args["loglevel"].upper())
+    if not validate_parsed_args(args):
+        logging.error(f"Could not validate the parsed args: {args}")
+        exit(1)
+    else:
+        logging.info(args)
+        # Update ultralytics settings to log with MLFlow
+        settings.update({"mlflow": True})
+        queue = TrialQueue(args["queue_dir"])
+        logging.info(f"Waiting for trials in {args['queue_dir']}: {queue.count()}")
+        n_trials = run_worker(
+            queue,
+            make_run_trial=make_run_trial,
+            slots=make_slots(
+                n_jobs=args["n_jobs"],
+                devices=args["devices"] or [None],
+                threads_per_trial=args["threads_per_trial"],
+            ),
+            poll_seconds=args["poll_seconds"],
+            heartbeat_seconds=args["heartbeat_seconds"],
+            max_idle_seconds=args["max_idle_seconds"],
+        )
+        logging.info(f"Ran {n_trials} trials, stopping after being idle")
+        exit(0)
@@ -11,6 +11,8 @@ from pathlib import Path
 from ultralytics import settings
 
 from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.batch_tuning import BatchTuningConfig
+from pyro_train.model.yolo.throughput import make_throughput_callbacks
 from pyro_train.model.yolo.train import load_pretrained_model, train
 
 
@@ -43,6 +45,65 @@ def make_cli_parser() -> argparse.ArgumentParser:
         required=True,
         type=Path,
     )
+    parser.add_argument(
+        "--throughput",
+        help=(
+            "record the wall time, images/s, dataloader wait, compute and validation "
+            "times and peak RSS of each epoch in throughput.csv, next to results.csv"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-dataloader",
+        help=(
+            "probe the dataloader workers and the RAM cache on the dataset before "
+            "training and train with the fastest ones. The RAM cache is only probed "
+            "when the train split fits in the available memory"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-disk-cache",
+        help=(
+            "also probe the disk cache with --autotune-dataloader. It writes .npy "
+            "files next to the images of the dataset, keep it off for datasets that "
+            "are DVC outputs"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-batch",
+        help=(
+            "probe the training throughput of increasing batch sizes on the device "
+            "under a memory ceiling and train with the fastest one, instead of the "
+            "configured batch"
+        ),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--autotune-batch-max",
+        help="largest batch size probed by --autotune-batch",
+        default=128,
+        type=int,
+    )
+    parser.add_argument(
+        "--autotune-batch-memory-fraction",
+        help=(
+            "memory ceiling of --autotune-batch, as a fraction of the available RAM on "
+            "CPU or of the device memory on CUDA"
+        ),
+        default=0.8,
+        type=float,
+    )
+    parser.add_argument(
+        "--scale-lr0",
+        help=(
+            "scale lr0 linearly with the effective batch size chosen by "
+            "--autotune-batch. It has no effect with the auto optimizer, which ignores "
+            "lr0"
+        ),
+        action="store_true",
+    )
     parser.add_argument(
         "-log",
         "--loglevel",
@@ -62,6 +123,19 @@ def validate_parsed_args(args: dict) -> bool:
     elif not args["config"].exists():
         logging.error("Invalid --config filepath does not exist")
         return False
+    elif args["autotune_disk_cache"] and not args["autotune_dataloader"]:
+        logging.error(
+            "Invalid --autotune-disk-cache, it requires --autotune-dataloader"
+        )
+        return False
+    elif args["autotune_batch_max"] < 2:
+        logging.error("Invalid --autotune-batch-max, it should be at least 2")
+        return False
+    elif not 0 < args["autotune_batch_memory_fraction"] <= 1:
+        logging.error(
+            "Invalid --autotune-batch-memory-fraction, it should be in (0, 1]"
+        )
+        return False
     else:
         return True
 
@@ -92,5 +166,17 @@ if __name__ == "__main__":
             params=params,
             project=str(args["output_dir"]),
             experiment_name=args["experiment_name"],
+            callbacks=make_throughput_callbacks() if args["throughput"] else {},
+            autotune_dataloader=args["autotune_dataloader"],
+            autotune_disk_cache=args["autotune_disk_cache"],
+            batch_tuning=(
+                BatchTuningConfig(
+                    max_batch=args["autotune_batch_max"],
+                    memory_fraction=args["autotune_batch_memory_fraction"],
+                    scale_lr0=args["scale_lr0"],
+                )
+                if args["autotune_batch"]
+                else None
+            ),
         )
         exit(0)
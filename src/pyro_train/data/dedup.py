@@ -0,0 +1,228 @@
+"""
+Near-duplicate detection with 64-bit perceptual hashes.
+
+Consecutive frames of a fixed camera are almost identical. Each image is
+summarized by a 64-bit difference hash (dHash) and two images are near
+duplicates when the Hamming distance between their hashes is small.
+
+Distances are computed for all pairs with vectorized XOR and popcount on
+blocks of hashes, so that memory stays bounded by a few block_size ** 2
+arrays, the XORed uint64 hashes of a block taking 8 * block_size ** 2
+bytes.
+Hashes are cached keyed by file size and mtime so that only new or
+modified images are hashed again.
+"""
+
+import csv
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+HASH_CHUNK_SIZE = 256
+
+# Number of set bits of each byte value.
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(filepath: str) -> int:
+    """
+    Return the 64-bit difference hash of the image located at `filepath`.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit tells
+    whether a pixel is brighter than its right neighbour.
+    """
+    with Image.open(filepath) as im:
+        # Let the JPEG decoder downscale while decoding
+        im.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        thumbnail = np.asarray(
+            im.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX),
+            dtype=np.int16,
+        )
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _dhashes(filepaths: list[str]) -> list[int]:
+    return [dhash(filepath) for filepath in filepaths]
+
+
+def compute_hashes(
+    filepaths: list[str],
+    workers: int = os.cpu_count() or 1,
+) -> np.ndarray:
+    """
+    Return the (n,) uint64 array of the difference hashes of the images
+    located at `filepaths`, using a pool of `workers` processes.
+    """
+    chunks = [
+        filepaths[i : i + HASH_CHUNK_SIZE]
+        for i in range(0, len(filepaths), HASH_CHUNK_SIZE)
+    ]
+    hashes = np.zeros(len(filepaths), dtype=np.uint64)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i, chunk_hashes in enumerate(executor.map(_dhashes, chunks)):
+            start = i * HASH_CHUNK_SIZE
+            hashes[start : start + len(chunk_hashes)] = chunk_hashes
+    return hashes
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+    """
+    Return the number of set bits of each element of the uint64 array `x`.
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    as_bytes = np.ascontiguousarray(x).view(np.uint8).reshape(*x.shape, 8)
+    return POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+def find_near_duplicate_pairs(
+    hashes: np.ndarray,
+    max_distance: int = 4,
+    block_size: int = 4096,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find all the pairs of hashes whose Hamming distance is at most
+    `max_distance`.
+
+    Returns:
+        pairs (np.ndarray): (n_pairs, 2) array of indices i < j.
+        distances (np.ndarray): (n_pairs,) array of Hamming distances.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    n = len(hashes)
+    pairs, distances = [], []
+    for i_start in range(0, n, block_size):
+        block_i = hashes[i_start : i_start + block_size]
+        for j_start in range(i_start, n, block_size):
+            block_j = hashes[j_start : j_start + block_size]
+            d = popcount(block_i[:, None] ^ block_j[None, :])
+            i, j = np.nonzero(d <= max_distance)
+            i, j = i + i_start, j + j_start
+            upper = i < j
+            pairs.append(np.stack([i[upper], j[upper]], axis=1))
+            distances.append(d[i[upper] - i_start, j[upper] - j_start])
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    return np.concatenate(pairs).astype(np.int64), np.concatenate(distances)
+
+
+def select_duplicates_to_drop(
+    pairs: np.ndarray,
+    is_train: np.ndarray,
+    drop_train_duplicates: bool = False,
+) -> np.ndarray:
+    """
+    Return the boolean mask of the images to drop from the train split,
+    given the near-duplicate `pairs` of indices i < j.
+
+    Train images that are near duplicates of a non train image leak into
+    the evaluation and are always dropped. When `drop_train_duplicates` is
+    set, the remaining train images are visited in order and each one kept
+    drops its later near duplicates.
+
+    __Note__: only direct pairs are considered, as near duplicates chain
+    along the slowly changing frames of a camera, whose first and last
+    frames can be far apart.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    i, j = pairs[:, 0], pairs[:, 1]
+    leaks = np.zeros(len(is_train), dtype=bool)
+    is_cross = is_train[i] != is_train[j]
+    leaks[np.where(is_train[i], i, j)[is_cross]] = True
+    drop = leaks
+    if drop_train_duplicates:
+        is_kept = is_train & ~leaks
+        train_pairs = pairs[is_train[i] & is_train[j]]
+        # Sorted by i, so that whether i is kept is known before its pairs
+        for a, b in train_pairs[np.lexsort((train_pairs[:, 1], train_pairs[:, 0]))]:
+            if is_kept[a]:
+                is_kept[b] = False
+        drop = is_train & ~is_kept
+    logging.info(
+        f"Dropping {np.count_nonzero(drop)} train images, {np.count_nonzero(leaks)} "
+        "leaking into the evaluation splits"
+    )
+    return drop
+
+
+def load_hashes_cache(filepath: Path) -> dict[str, tuple[int, int, int]]:
+    """
+    Load the image hashes cache stored at `filepath`, mapping each image
+    path to its size, mtime and hash.
+    """
+    if not filepath.exists():
+        return {}
+    with np.load(filepath) as data:
+        return {
+            str(path): (int(size), int(mtime_ns), int(h))
+            for path, size, mtime_ns, h in zip(
+                data["paths"], data["sizes"], data["mtimes_ns"], data["hashes"]
+            )
+        }
+
+
+def hash_images(
+    filepaths: list[str],
+    cache_filepath: Path | None = None,
+    workers: int = os.cpu_count() or 1,
+) -> np.ndarray:
+    """
+    Return the (n,) uint64 array of the difference hashes of the images
+    located at `filepaths`.
+
+    When `cache_filepath` is provided, images whose size and mtime did not
+    change since the previous run are not hashed again and the cache is
+    updated with the results of this run.
+    """
+    cache = load_hashes_cache(cache_filepath) if cache_filepath else {}
+    stats = [os.stat(filepath) for filepath in filepaths]
+    hashes = np.zeros(len(filepaths), dtype=np.uint64)
+    to_hash = []
+    for i, (filepath, stat) in enumerate(zip(filepaths, stats)):
+        cached = cache.get(filepath)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            hashes[i] = cached[2]
+        else:
+            to_hash.append(i)
+    logging.info(
+        f"Hashing {len(to_hash)} images, {len(filepaths) - len(to_hash)} found in cache"
+    )
+    if to_hash:
+        hashes[to_hash] = compute_hashes(
+            [filepaths[i] for i in to_hash], workers=workers
+        )
+    if cache_filepath:
+        os.makedirs(cache_filepath.parent, exist_ok=True)
+        np.savez(
+            cache_filepath,
+            paths=np.array(filepaths, dtype=str),
+            sizes=np.array([stat.st_size for stat in stats], dtype=np.int64),
+            mtimes_ns=np.array([stat.st_mtime_ns for stat in stats], dtype=np.int64),
+            hashes=hashes,
+        )
+    return hashes
+
+
+def save_duplicates_report(
+    filepath: Path,
+    filepaths: list[str],
+    pairs: np.ndarray,
+    distances: np.ndarray,
+) -> None:
+    """
+    Save the near-duplicate `pairs` of `filepaths` as a CSV file at
+    `filepath`.
+    """
+    os.makedirs(filepath.parent, exist_ok=True)
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path_a", "path_b", "distance"])
+        for (i, j), distance in zip(pairs, distances):
+            writer.writerow([filepaths[i], filepaths[j], int(distance)])
@@ -0,0 +1,222 @@
+"""
+Concurrent file copy engine used to materialize datasets on disk.
+
+Copying millions of small files is latency bound on network filesystems:
+most of the time is spent waiting on open/stat/close round trips rather
+than moving bytes. Running the copies from a pool of threads keeps many
+of these requests in flight at once.
+
+Files can also be materialized as hardlinks, reflinks or symlinks instead
+of full copies, which makes building a dataset almost free in disk space.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from pyro_train.utils import chunked
+
+# Same default as concurrent.futures.ThreadPoolExecutor, which is tuned
+# for I/O bound workloads.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# Number of copy instructions submitted to the pool per worker at once.
+# Keeps the number of pending futures bounded when streaming instructions.
+CHUNK_SIZE_PER_WORKER = 64
+
+# ioctl request number to clone a file on Linux (btrfs, XFS, ...), see
+# `man ioctl_ficlone`.
+FICLONE = 0x40049409
+
+
+class MaterializeMode(Enum):
+    """
+    Supported ways of materializing a file at its destination.
+    """
+
+    copy = "copy"
+    hardlink = "hardlink"
+    reflink = "reflink"
+    symlink = "symlink"
+
+
+@dataclass
+class CopyStats:
+    """
+    Simple DataClass summarizing a run of the copy engine.
+    """
+
+    n_files: int = 0
+    n_bytes: int = 0
+    n_skipped: int = 0
+    duration_seconds: float = 0.0
+    n_files_per_mode: Counter = field(default_factory=Counter)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.n_files / self.duration_seconds if self.duration_seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.n_bytes / self.duration_seconds if self.duration_seconds else 0.0
+
+
+def format_bytes(n_bytes: float) -> str:
+    """
+    Return a human readable representation of `n_bytes`.
+    """
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.1f}{unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f}TiB"
+
+
+def list_copy_instructions(src_dir: Path, dst_dir: Path) -> Iterator[dict]:
+    """
+    Yield a copy instruction for each file located directly in `src_dir`,
+    targeting the same file name in `dst_dir`.
+
+    Each yielded element has the following keys:
+    - from: Path - where the file comes from
+    - to: Path - where the file should be copied over
+    """
+    with os.scandir(src_dir) as it:
+        for entry in it:
+            if entry.is_file():
+                yield {"from": Path(entry.path), "to": dst_dir / entry.name}
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """
+    Create `dst` as a copy-on-write clone of `src`.
+
+    Throws:
+        OSError: when the platform or the filesystem does not support it.
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflinks are only supported on Linux", src)
+    import fcntl
+
+    with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+        try:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        except OSError:
+            f_dst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def materialize_file(src: Path, dst: Path, mode: MaterializeMode) -> MaterializeMode:
+    """
+    Materialize `src` at `dst` using `mode`, replacing `dst` if it
+    already exists.
+
+    Links cannot always be made, eg. a hardlink across filesystems or a
+    reflink on a filesystem without copy-on-write support. In that case
+    the file is copied instead.
+
+    Returns:
+        mode (MaterializeMode): the mode that was effectively used.
+    """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        if mode == MaterializeMode.hardlink:
+            os.link(src, dst)
+        elif mode == MaterializeMode.symlink:
+            os.symlink(os.path.abspath(src), dst)
+        elif mode == MaterializeMode.reflink:
+            _reflink(src, dst)
+        else:
+            shutil.copy2(src=src, dst=dst)
+        return mode
+    except OSError as e:
+        if mode == MaterializeMode.copy:
+            raise
+        logging.debug(f"Could not {mode.value} {src} to {dst}, copying instead: {e}")
+        shutil.copy2(src=src, dst=dst)
+        return MaterializeMode.copy
+
+
+def _materialize_file(
+    src: Path,
+    dst: Path,
+    mode: MaterializeMode,
+) -> tuple[MaterializeMode, int]:
+    """
+    Materialize `src` at `dst` and return the effective mode along with
+    the size of the file.
+    """
+    effective_mode = materialize_file(src=src, dst=dst, mode=mode)
+    return effective_mode, os.stat(dst).st_size
+
+
+def run_file_copy(
+    copy_data: Iterable[dict],
+    workers: int = DEFAULT_WORKERS,
+    mode: MaterializeMode = MaterializeMode.copy,
+) -> CopyStats:
+    """
+    Run the file copy instructions for each element of copy_data using a
+    pool of `workers` threads.
+
+    Each element should contain a from and to key. If not present, a
+    warning is printed and the element is skipped. Destination
+    directories are created once per unique parent instead of once per
+    file. Files are materialized with `mode`, falling back to a plain copy
+    per file when a link cannot be made.
+
+    Returns:
+        stats (CopyStats): number of files and bytes materialized.
+    """
+    assert workers >= 1, f"workers should be at least 1, got {workers}"
+    stats = CopyStats()
+    created_dirs: set[Path] = set()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunked(copy_data, size=workers * CHUNK_SIZE_PER_WORKER):
+            srcs, dsts = [], []
+            for e in chunk:
+                if "from" not in e or "to" not in e:
+                    logging.warning(
+                        "Skipping file copy - Missing `from` key or `to` key from "
+                        f"element: {e}"
+                    )
+                    stats.n_skipped += 1
+                    continue
+                parent = e["to"].parent
+                if parent not in created_dirs:
+                    os.makedirs(parent, exist_ok=True)
+                    created_dirs.add(parent)
+                srcs.append(e["from"])
+                dsts.append(e["to"])
+            modes = [mode] * len(srcs)
+            for effective_mode, n_bytes in executor.map(
+                _materialize_file, srcs, dsts, modes
+            ):
+                stats.n_files += 1
+                stats.n_bytes += n_bytes
+                stats.n_files_per_mode[effective_mode.value] += 1
+    stats.duration_seconds = time.perf_counter() - start
+    logging.info(
+        f"Materialized {stats.n_files} files ({format_bytes(stats.n_bytes)}) in "
+        f"{stats.duration_seconds:.2f}s - {stats.files_per_second:.1f} files/s, "
+        f"{format_bytes(stats.bytes_per_second)}/s - {dict(stats.n_files_per_mode)}"
+    )
+    if mode != MaterializeMode.copy and stats.n_files_per_mode["copy"]:
+        logging.warning(
+            f"{stats.n_files_per_mode['copy']} files could not be materialized as "
+            f"{mode.value} and were copied instead"
+        )
+    return stats
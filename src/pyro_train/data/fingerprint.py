@@ -0,0 +1,52 @@
+"""
+Fingerprint of the content of a YOLO dataset.
+
+The fingerprint identifies a dataset by the names and sizes of its files,
+which is cheap to compute with directory scans only and does not depend
+on where the dataset is located or on file mtimes.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+from pyro_train.data.utils import yaml_read
+
+SPLIT_KEYS = ["train", "val", "test"]
+
+
+def _update_with_dir(hasher, dir: Path) -> None:
+    """
+    Update `hasher` with the sorted names and sizes of the files of `dir`.
+    """
+    if not dir.is_dir():
+        return
+    with os.scandir(dir) as it:
+        entries = sorted(
+            (e.name, e.stat().st_size)
+            for e in it
+            if e.is_file() and e.name != "labels.cache"
+        )
+    for name, size in entries:
+        hasher.update(f"{name}\0{size}\n".encode())
+
+
+def dataset_fingerprint(data_yaml_path: Path) -> str:
+    """
+    Return the fingerprint of the dataset described by the data.yaml file
+    located at `data_yaml_path`: a sha256 of its class names and of the
+    files of each split, images and labels.
+    """
+    data = yaml_read(data_yaml_path)
+    root = data_yaml_path.parent / data.get("path", ".")
+    hasher = hashlib.sha256()
+    hasher.update(repr(data.get("names")).encode())
+    for key in SPLIT_KEYS:
+        if not data.get(key):
+            continue
+        split_dir = root / data[key]
+        hasher.update(f"[{key}]\n".encode())
+        _update_with_dir(hasher, split_dir)
+        if split_dir.name == "images":
+            _update_with_dir(hasher, split_dir.parent / "labels")
+    return hasher.hexdigest()
@@ -0,0 +1,288 @@
+"""
+Fast integrity scan of JPEG images that only reads their headers.
+
+The dimensions and EXIF orientation of a JPEG are read from its markers
+without decoding the image, and the file is flagged as truncated when it
+does not end with the End Of Image marker. Scan results are cached keyed
+by file size and mtime so that only new or modified images are read
+again.
+"""
+
+import csv
+import logging
+import os
+import struct
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import BinaryIO
+
+# Start Of Frame markers carrying the image dimensions, DHT (C4), JPG (C8)
+# and DAC (CC) share the same range but are not frames.
+SOF_MARKERS = {
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+}
+# Markers without a length field.
+STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+APP1_MARKER = 0xE1
+EXIF_ORIENTATION_TAG = 0x0112
+
+# ultralytics rejects images with a side smaller than 10 pixels.
+MIN_IMAGE_SIDE = 10
+
+SCAN_CHUNK_SIZE = 256
+
+
+@dataclass
+class ImageHeader:
+    """
+    Simple DataClass modeling the header scan of an image file.
+
+    width and height are the stored dimensions, before applying the EXIF
+    orientation. error is empty when the header could be parsed.
+    """
+
+    path: str
+    size: int
+    mtime_ns: int
+    width: int = 0
+    height: int = 0
+    orientation: int = 1
+    truncated: bool = False
+    error: str = ""
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.error and not self.truncated
+
+    @property
+    def oriented_shape(self) -> tuple[int, int]:
+        """
+        Return the (width, height) of the image once the EXIF orientation
+        is applied, orientations 5 to 8 swapping width and height.
+        """
+        if self.orientation in {5, 6, 7, 8}:
+            return self.height, self.width
+        return self.width, self.height
+
+
+def _parse_exif_orientation(data: bytes) -> int:
+    """
+    Return the orientation tag of the EXIF payload `data` of an APP1
+    segment, defaulting to 1 (no transformation).
+    """
+    tiff = data[6:]
+    if len(tiff) < 8 or tiff[:2] not in {b"II", b"MM"}:
+        return 1
+    endian = "<" if tiff[:2] == b"II" else ">"
+    (ifd_offset,) = struct.unpack(f"{endian}I", tiff[4:8])
+    if ifd_offset + 2 > len(tiff):
+        return 1
+    (n_entries,) = struct.unpack(f"{endian}H", tiff[ifd_offset : ifd_offset + 2])
+    for i in range(n_entries):
+        start = ifd_offset + 2 + 12 * i
+        entry = tiff[start : start + 12]
+        if len(entry) < 12:
+            break
+        tag, _, _, value = struct.unpack(f"{endian}HHIH", entry[:10])
+        if tag == EXIF_ORIENTATION_TAG:
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+
+def _read_markers(f: BinaryIO) -> tuple[int, int, int]:
+    """
+    Walk the markers of the JPEG file `f` until the Start Of Frame.
+
+    Returns:
+        width (int), height (int), orientation (int)
+
+    Throws:
+        ValueError: when the file is not a valid JPEG.
+    """
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("missing JPEG Start Of Image marker")
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("no Start Of Frame marker found")
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        # Fill bytes
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            raise ValueError("no Start Of Frame marker found")
+        m = marker[0]
+        if m in STANDALONE_MARKERS or m == 0x00:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise ValueError("unexpected end of file in marker segment")
+        (length,) = struct.unpack(">H", length_bytes)
+        if m in SOF_MARKERS:
+            segment = f.read(5)
+            if len(segment) < 5:
+                raise ValueError("unexpected end of file in Start Of Frame")
+            _, height, width = struct.unpack(">BHH", segment)
+            return width, height, orientation
+        if m == APP1_MARKER:
+            data = f.read(length - 2)
+            if data.startswith(b"Exif\x00\x00"):
+                orientation = _parse_exif_orientation(data)
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(filepath: str) -> ImageHeader:
+    """
+    Read the header of the JPEG image located at `filepath`.
+    """
+    with open(filepath, "rb") as f:
+        stat = os.fstat(f.fileno())
+        header = ImageHeader(
+            path=filepath, size=stat.st_size, mtime_ns=stat.st_mtime_ns
+        )
+        try:
+            header.width, header.height, header.orientation = _read_markers(f)
+            f.seek(-2, os.SEEK_END)
+            header.truncated = f.read(2) != b"\xff\xd9"
+        except (ValueError, OSError, struct.error) as e:
+            header.error = str(e)
+    return header
+
+
+def load_image_headers_cache(filepath: Path) -> dict[str, ImageHeader]:
+    """
+    Load the image headers cache stored at `filepath`, keyed by path.
+    """
+    if not filepath.exists():
+        return {}
+    cache = {}
+    with open(filepath, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            header = ImageHeader(
+                path=row["path"],
+                size=int(row["size"]),
+                mtime_ns=int(row["mtime_ns"]),
+                width=int(row["width"]),
+                height=int(row["height"]),
+                orientation=int(row["orientation"]),
+                truncated=row["truncated"] == "True",
+                error=row["error"],
+            )
+            cache[header.path] = header
+    return cache
+
+
+def save_image_headers(filepath: Path, headers: list[ImageHeader]) -> None:
+    """
+    Save the image `headers` as a CSV file at `filepath`.
+    """
+    os.makedirs(filepath.parent, exist_ok=True)
+    with open(filepath, "w", newline="") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=[field.name for field in fields(ImageHeader)]
+        )
+        writer.writeheader()
+        for header in headers:
+            writer.writerow(asdict(header))
+
+
+def scan_image_headers(
+    filepaths: list[str],
+    cache_filepath: Path | None = None,
+    workers: int = os.cpu_count() or 1,
+) -> list[ImageHeader]:
+    """
+    Read the headers of the images located at `filepaths` using a pool of
+    `workers` processes.
+
+    When `cache_filepath` is provided, images whose size and mtime did not
+    change since the previous scan are not read again and the cache is
+    updated with the results of this scan.
+    """
+    cache = load_image_headers_cache(cache_filepath) if cache_filepath else {}
+    headers: dict[str, ImageHeader] = {}
+    to_scan = []
+    for filepath in filepaths:
+        cached = cache.get(filepath)
+        if cached is not None:
+            stat = os.stat(filepath)
+            if cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+                headers[filepath] = cached
+                continue
+        to_scan.append(filepath)
+
+    logging.info(
+        f"Scanning {len(to_scan)} image headers, {len(headers)} found in cache"
+    )
+    if to_scan:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for header in executor.map(
+                read_image_header, to_scan, chunksize=SCAN_CHUNK_SIZE
+            ):
+                headers[header.path] = header
+
+    result = [headers[filepath] for filepath in filepaths]
+    if cache_filepath:
+        save_image_headers(cache_filepath, result)
+    return result
+
+
+def find_odd_images(
+    headers: list[ImageHeader],
+    min_shape_share: float = 0.01,
+) -> list[tuple[ImageHeader, str]]:
+    """
+    Return the images that are corrupt, truncated or odd-sized, along with
+    the reason why.
+
+    An image is odd-sized when one of its sides is smaller than
+    MIN_IMAGE_SIDE or when less than `min_shape_share` of the images share
+    its dimensions.
+    """
+    shape_counts = Counter(h.oriented_shape for h in headers if not h.error)
+    min_count = min_shape_share * len(headers)
+    result = []
+    for header in headers:
+        if header.error:
+            result.append((header, f"corrupt: {header.error}"))
+        elif header.truncated:
+            result.append((header, "truncated"))
+        elif min(header.width, header.height) < MIN_IMAGE_SIDE:
+            result.append((header, "too small"))
+        elif shape_counts[header.oriented_shape] < min_count:
+            result.append((header, "uncommon dimensions"))
+    return result
+
+
+def save_image_report(
+    filepath: Path, odd_images: list[tuple[ImageHeader, str]]
+) -> None:
+    """
+    Save the report of the `odd_images` as a CSV file at `filepath`.
+    """
+    os.makedirs(filepath.parent, exist_ok=True)
+    with open(filepath, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "width", "height", "orientation", "reason"])
+        for header, reason in odd_images:
+            writer.writerow(
+                [header.path, header.width, header.height, header.orientation, reason]
+            )
@@ -0,0 +1,287 @@
+"""
+Columnar index of the labels of a YOLO dataset.
+
+All the label files of a dataset are parsed once into a CSR-style layout:
+- boxes: one flat (n_boxes, 5) float32 array of class, x, y, w, h
+- offsets: (n_images + 1,) int64 array, the boxes of image i being
+boxes[offsets[i]:offsets[i + 1]]
+- image_ids: (n_images,) array of image stems
+- splits: (n_images,) uint8 array of indices in SPLITS
+
+The index is saved as plain .npy files that are memory-mapped when loaded
+and rebuilt when the mtime of one of the dataset folders, or of one of
+the label files, changed.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from pyro_train.data.scan import scan_split
+from pyro_train.utils import chunked
+
+SPLITS = ["train", "val", "test"]
+
+INDEX_VERSION = 1
+
+PARSE_CHUNK_SIZE = 2048
+
+ARRAY_NAMES = ["boxes", "offsets", "image_ids", "splits"]
+
+
+@dataclass
+class LabelIndex:
+    """
+    Simple DataClass modeling the columnar label index of a dataset.
+    """
+
+    boxes: np.ndarray
+    offsets: np.ndarray
+    image_ids: np.ndarray
+    splits: np.ndarray
+
+    @property
+    def n_images(self) -> int:
+        return len(self.image_ids)
+
+    @property
+    def n_boxes(self) -> int:
+        return len(self.boxes)
+
+    def boxes_per_image(self) -> np.ndarray:
+        """
+        Return the number of boxes of each image.
+        """
+        return np.diff(self.offsets)
+
+    def image_of_boxes(self) -> np.ndarray:
+        """
+        Return the index of the image of each box.
+        """
+        return np.repeat(np.arange(self.n_images), self.boxes_per_image())
+
+    def image_boxes(self, i: int) -> np.ndarray:
+        """
+        Return the (n, 5) boxes of image `i`.
+        """
+        return self.boxes[self.offsets[i] : self.offsets[i + 1]]
+
+    def image_mask(self, split: str | None = None) -> np.ndarray:
+        """
+        Return the boolean mask of the images belonging to `split`, or of
+        all the images when `split` is None.
+        """
+        if split is None:
+            return np.ones(self.n_images, dtype=bool)
+        return self.splits == SPLITS.index(split)
+
+    def box_mask(self, split: str | None = None) -> np.ndarray:
+        """
+        Return the boolean mask of the boxes belonging to `split`, or of
+        all the boxes when `split` is None.
+        """
+        return np.repeat(self.image_mask(split), self.boxes_per_image())
+
+    def empty_image_count(self, split: str | None = None) -> int:
+        """
+        Return the number of images without any box.
+        """
+        return int(
+            np.count_nonzero(self.boxes_per_image()[self.image_mask(split)] == 0)
+        )
+
+    def box_size_histogram(
+        self,
+        bins: int | np.ndarray = 20,
+        split: str | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the histogram of the box sizes, the size of a box being the
+        square root of its normalized area.
+
+        Returns:
+            hist (np.ndarray), bin_edges (np.ndarray): see `np.histogram`.
+        """
+        boxes = self.boxes[self.box_mask(split)]
+        sizes = np.sqrt(boxes[:, 3] * boxes[:, 4])
+        return np.histogram(sizes, bins=bins, range=(0.0, 1.0))
+
+    def split_stats(self) -> dict[str, dict]:
+        """
+        Return summary statistics of the boxes for each split.
+        """
+        counts = self.boxes_per_image()
+        stats = {}
+        for split in SPLITS:
+            image_mask = self.image_mask(split)
+            n_images = int(np.count_nonzero(image_mask))
+            if not n_images:
+                continue
+            boxes = self.boxes[self.box_mask(split)]
+            stats[split] = {
+                "n_images": n_images,
+                "n_empty_images": self.empty_image_count(split),
+                "n_boxes": len(boxes),
+                "max_boxes_per_image": int(counts[image_mask].max()),
+                "mean_boxes_per_image": float(counts[image_mask].mean()),
+                "mean_box_width": float(boxes[:, 3].mean()) if len(boxes) else 0.0,
+                "mean_box_height": float(boxes[:, 4].mean()) if len(boxes) else 0.0,
+            }
+        return stats
+
+
+def parse_label_file(label_path: str | None) -> np.ndarray:
+    """
+    Parse a YOLO label file into a (n, 5) float32 array of class, x, y,
+    w, h. Images without a label file have no box.
+
+    Throws:
+        ValueError: when a line does not contain 5 values.
+    """
+    if label_path is None:
+        return np.zeros((0, 5), dtype=np.float32)
+    with open(label_path, "r") as f:
+        values = f.read().split()
+    if len(values) % 5:
+        raise ValueError(f"Invalid YOLO label file {label_path}")
+    return np.array(values, dtype=np.float32).reshape(-1, 5)
+
+
+def _parse_label_files(label_paths: list[str | None]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parse a chunk of label files.
+
+    Returns:
+        counts (np.ndarray): number of boxes of each label file.
+        boxes (np.ndarray): concatenated boxes of all the label files.
+    """
+    boxes = [parse_label_file(label_path) for label_path in label_paths]
+    counts = np.array([len(b) for b in boxes], dtype=np.int64)
+    return counts, np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32)
+
+
+def dataset_signature(
+    dataset_dir: Path,
+    file_kinds: tuple[str, ...] = ("labels",),
+) -> dict[str, int]:
+    """
+    Return the mtimes of the images and labels folders of each split,
+    along with the latest mtime and the total size of the files of the
+    folders of `file_kinds`.
+
+    Adding, removing or renaming a file of a split updates the mtime of
+    its folder, while editing a file in place only updates its own mtime.
+    """
+    signature = {}
+    for split in SPLITS:
+        for kind in ["images", "labels"]:
+            dir = dataset_dir / split / kind
+            if not dir.exists():
+                continue
+            signature[f"{split}/{kind}"] = os.stat(dir).st_mtime_ns
+            if kind in file_kinds:
+                max_mtime_ns, size = 0, 0
+                with os.scandir(dir) as it:
+                    for entry in it:
+                        stat = entry.stat()
+                        max_mtime_ns = max(max_mtime_ns, stat.st_mtime_ns)
+                        size += stat.st_size
+                signature[f"{split}/{kind}/max_mtime"] = max_mtime_ns
+                signature[f"{split}/{kind}/size"] = size
+    return signature
+
+
+def build_label_index(
+    dataset_dir: Path,
+    workers: int = os.cpu_count() or 1,
+) -> LabelIndex:
+    """
+    Parse all the label files of the YOLO dataset located at `dataset_dir`
+    using a pool of `workers` processes.
+    """
+    image_ids, splits, counts, boxes = [], [], [], []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for split_index, split in enumerate(SPLITS):
+            images_dir = dataset_dir / split / "images"
+            if not images_dir.exists():
+                continue
+            entries = sorted(
+                scan_split(
+                    images_dir=images_dir, labels_dir=dataset_dir / split / "labels"
+                )
+            )
+            image_ids.extend(e.stem for e in entries)
+            splits.extend([split_index] * len(entries))
+            label_paths = [e.label_path for e in entries]
+            for chunk_counts, chunk_boxes in executor.map(
+                _parse_label_files,
+                chunked(label_paths, size=PARSE_CHUNK_SIZE),
+            ):
+                counts.append(chunk_counts)
+                boxes.append(chunk_boxes)
+
+    counts_all = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    offsets = np.zeros(len(counts_all) + 1, dtype=np.int64)
+    np.cumsum(counts_all, out=offsets[1:])
+    return LabelIndex(
+        boxes=np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32),
+        offsets=offsets,
+        image_ids=np.array(image_ids, dtype=str),
+        splits=np.array(splits, dtype=np.uint8),
+    )
+
+
+def save_label_index(
+    index: LabelIndex,
+    index_dir: Path,
+    signature: dict[str, int],
+) -> None:
+    """
+    Save the label `index` as .npy files in `index_dir` along with the
+    `signature` of the dataset it was built from.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(index_dir / f"{name}.npy", getattr(index, name))
+    with open(index_dir / "meta.json", "w") as f:
+        json.dump({"version": INDEX_VERSION, "signature": signature}, f)
+
+
+def load_label_index(index_dir: Path) -> LabelIndex:
+    """
+    Load the label index saved in `index_dir`, memory-mapping its arrays.
+    """
+    return LabelIndex(
+        **{
+            name: np.load(index_dir / f"{name}.npy", mmap_mode="r")
+            for name in ARRAY_NAMES
+        }
+    )
+
+
+def load_or_build_label_index(
+    dataset_dir: Path,
+    index_dir: Path,
+    workers: int = os.cpu_count() or 1,
+) -> LabelIndex:
+    """
+    Load the label index of `dataset_dir` from `index_dir`, building and
+    saving it first when it is missing or outdated.
+    """
+    signature = dataset_signature(dataset_dir)
+    filepath_meta = index_dir / "meta.json"
+    if filepath_meta.exists():
+        with open(filepath_meta, "r") as f:
+            meta = json.load(f)
+        if meta["version"] == INDEX_VERSION and meta["signature"] == signature:
+            logging.info(f"Loading label index from {index_dir}")
+            return load_label_index(index_dir)
+    logging.info(f"Building label index of {dataset_dir}")
+    index = build_label_index(dataset_dir, workers=workers)
+    save_label_index(index, index_dir=index_dir, signature=signature)
+    return index
@@ -0,0 +1,228 @@
+"""
+Build manifests to incrementally synchronize a dataset directory.
+
+A manifest records, for each materialized file of a dataset, the file it
+comes from along with its size, mtime and content hash at the time it was
+materialized. Comparing the manifest with the current copy instructions
+gives the minimal set of files to add, replace or delete.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from pyro_train.data.file_copy import (
+    DEFAULT_WORKERS,
+    CopyStats,
+    MaterializeMode,
+    run_file_copy,
+)
+from pyro_train.utils import compute_file_content_sha256
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    """
+    Simple DataClass modeling a materialized file in a build manifest.
+    """
+
+    src: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+@dataclass
+class SyncPlan:
+    """
+    Simple DataClass modeling the changes needed to synchronize a dataset.
+
+    - to_materialize: copy instructions for files to add or replace
+    - to_delete: destination files that are not part of the dataset anymore
+    - entries: manifest entries of the dataset once synchronized, the
+    entries of the files to materialize are missing their content hash.
+    """
+
+    to_materialize: list[dict] = field(default_factory=list)
+    to_delete: list[Path] = field(default_factory=list)
+    entries: dict[str, ManifestEntry] = field(default_factory=dict)
+    n_added: int = 0
+    n_replaced: int = 0
+    n_unchanged: int = 0
+
+
+@dataclass
+class SyncStats:
+    """
+    Simple DataClass summarizing a dataset synchronization.
+    """
+
+    n_added: int
+    n_replaced: int
+    n_deleted: int
+    n_unchanged: int
+    copy_stats: CopyStats
+
+
+def load_manifest(filepath: Path, mode: MaterializeMode) -> dict[str, ManifestEntry]:
+    """
+    Load the manifest entries stored at `filepath`.
+
+    Returns an empty manifest when the file does not exist or when it was
+    produced with another version or materialization `mode`, so that all
+    files get materialized again.
+    """
+    if not filepath.exists():
+        return {}
+    with open(filepath, "r") as f:
+        content = json.load(f)
+    if (
+        content.get("version") != MANIFEST_VERSION
+        or content.get("materialize") != mode.value
+    ):
+        logging.info(f"Ignoring outdated manifest {filepath}")
+        return {}
+    return {k: ManifestEntry(**v) for k, v in content["files"].items()}
+
+
+def save_manifest(
+    filepath: Path,
+    entries: dict[str, ManifestEntry],
+    mode: MaterializeMode,
+) -> None:
+    """
+    Save the manifest `entries` to `filepath`.
+    """
+    content = {
+        "version": MANIFEST_VERSION,
+        "materialize": mode.value,
+        "files": {k: asdict(entries[k]) for k in sorted(entries)},
+    }
+    tmp_filepath = filepath.with_suffix(".tmp")
+    with open(tmp_filepath, "w") as f:
+        json.dump(content, f)
+    os.replace(tmp_filepath, filepath)
+
+
+def plan_sync(
+    copy_data: Iterable[dict],
+    dataset_dir: Path,
+    manifest: dict[str, ManifestEntry],
+    workers: int = DEFAULT_WORKERS,
+) -> SyncPlan:
+    """
+    Compare the copy instructions `copy_data` targeting `dataset_dir` with
+    the `manifest` of the previous build.
+
+    A file is left untouched when it comes from the same source and the
+    source size and mtime did not change. When only the mtime changed, eg.
+    after a `dvc checkout`, the source content hash is compared to the
+    recorded one.
+    """
+    plan = SyncPlan()
+    to_verify: list[tuple[str, dict, os.stat_result]] = []
+    for e in copy_data:
+        key = str(e["to"].relative_to(dataset_dir))
+        stat = os.stat(e["from"])
+        entry = ManifestEntry(
+            src=str(e["from"]),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sha256="",
+        )
+        previous = manifest.get(key)
+        if previous is None:
+            plan.n_added += 1
+            plan.to_materialize.append(e)
+            plan.entries[key] = entry
+        elif (
+            previous.src != entry.src
+            or previous.size != entry.size
+            or not os.path.exists(e["to"])
+        ):
+            plan.n_replaced += 1
+            plan.to_materialize.append(e)
+            plan.entries[key] = entry
+        elif previous.mtime_ns != entry.mtime_ns:
+            to_verify.append((key, e, stat))
+        else:
+            plan.n_unchanged += 1
+            plan.entries[key] = previous
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = executor.map(
+            compute_file_content_sha256, [e["from"] for _, e, _ in to_verify]
+        )
+        for (key, e, stat), sha256 in zip(to_verify, hashes):
+            entry = ManifestEntry(
+                src=str(e["from"]),
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                sha256=sha256,
+            )
+            if sha256 == manifest[key].sha256:
+                plan.n_unchanged += 1
+            else:
+                plan.n_replaced += 1
+                plan.to_materialize.append(e)
+            plan.entries[key] = entry
+
+    plan.to_delete = [dataset_dir / key for key in manifest if key not in plan.entries]
+    return plan
+
+
+def sync_dataset(
+    copy_data: Iterable[dict],
+    dataset_dir: Path,
+    manifest_filepath: Path,
+    workers: int = DEFAULT_WORKERS,
+    mode: MaterializeMode = MaterializeMode.copy,
+) -> SyncStats:
+    """
+    Incrementally synchronize `dataset_dir` with the copy instructions
+    `copy_data`, using the manifest stored at `manifest_filepath` from the
+    previous build.
+
+    Only the files that differ are added, replaced or deleted. The
+    manifest is updated once the synchronization is done.
+    """
+    manifest = load_manifest(manifest_filepath, mode=mode)
+    plan = plan_sync(
+        copy_data=copy_data,
+        dataset_dir=dataset_dir,
+        manifest=manifest,
+        workers=workers,
+    )
+    logging.info(
+        f"Syncing {dataset_dir}: {plan.n_added} to add, {plan.n_replaced} to replace, "
+        f"{len(plan.to_delete)} to delete, {plan.n_unchanged} unchanged"
+    )
+    for filepath in plan.to_delete:
+        if os.path.lexists(filepath):
+            os.unlink(filepath)
+
+    copy_stats = run_file_copy(plan.to_materialize, workers=workers, mode=mode)
+
+    keys_to_hash = [str(e["to"].relative_to(dataset_dir)) for e in plan.to_materialize]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = executor.map(
+            compute_file_content_sha256,
+            [plan.entries[key].src for key in keys_to_hash],
+        )
+        for key, sha256 in zip(keys_to_hash, hashes):
+            plan.entries[key].sha256 = sha256
+
+    save_manifest(manifest_filepath, entries=plan.entries, mode=mode)
+    return SyncStats(
+        n_added=plan.n_added,
+        n_replaced=plan.n_replaced,
+        n_deleted=len(plan.to_delete),
+        n_unchanged=plan.n_unchanged,
+        copy_stats=copy_stats,
+    )
@@ -0,0 +1,179 @@
+"""
+Downscaled copies of YOLO datasets at the training resolution.
+
+Raw camera frames are often much larger than the training image size and
+the dataloader pays for a full JPEG decode and a resize of each of them at
+every epoch. Images are downscaled once so that their long side matches
+the training image size. The aspect ratio is kept and no padding is
+added, which keeps the normalized YOLO labels valid as is.
+"""
+
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from pyro_train.data.file_copy import (
+    DEFAULT_WORKERS,
+    MaterializeMode,
+    list_copy_instructions,
+    run_file_copy,
+)
+from pyro_train.data.scan import IMAGE_EXTENSION
+from pyro_train.utils import chunked
+
+RESIZE_CHUNK_SIZE = 64
+
+RESIZE_PARAMS_FILENAME = "resize.json"
+
+
+def resize_image(src: str, dst: str, long_side: int, quality: int = 95) -> bool:
+    """
+    Save a copy of the image `src` at `dst` downscaled so that its long
+    side is `long_side`. Images that are already small enough are copied
+    as is. The EXIF metadata, and so the orientation, is preserved.
+
+    Returns whether the image was downscaled.
+    """
+    with Image.open(src) as im:
+        width, height = im.size
+        ratio = long_side / max(width, height)
+        if ratio >= 1:
+            shutil.copy2(src, dst)
+            return False
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        # Let the JPEG decoder downscale by a power of two while decoding
+        im.draft("RGB", size)
+        exif = im.info.get("exif", b"")
+        im.convert("RGB").resize(size, Image.Resampling.LANCZOS).save(
+            dst,
+            format="JPEG",
+            quality=quality,
+            exif=exif,
+        )
+    return True
+
+
+def _resize_images(
+    srcs: list[str],
+    dsts: list[str],
+    long_side: int,
+    quality: int,
+) -> int:
+    return sum(
+        resize_image(src, dst, long_side=long_side, quality=quality)
+        for src, dst in zip(srcs, dsts)
+    )
+
+
+def _is_up_to_date(src: str, dst: str) -> bool:
+    try:
+        return os.stat(dst).st_mtime_ns >= os.stat(src).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _read_resize_params(filepath: Path) -> dict | None:
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _remove_stale_files(dir: Path, names: set[str]) -> int:
+    """
+    Delete the files of `dir` whose name is not in `names`. Returns the
+    number of deleted files.
+    """
+    if not dir.exists():
+        return 0
+    with os.scandir(dir) as it:
+        stale = [e.path for e in it if e.name not in names]
+    for filepath in stale:
+        os.unlink(filepath)
+    return len(stale)
+
+
+def resize_dataset(
+    input_dir: Path,
+    output_dir: Path,
+    long_side: int,
+    quality: int = 95,
+    splits: list[str] = ["train", "val", "test"],
+    workers: int = os.cpu_count() or 1,
+) -> None:
+    """
+    Write a copy of the YOLO dataset located at `input_dir` to
+    `output_dir` with all images downscaled to `long_side`, using a pool of
+    `workers` processes. Labels are hardlinked when possible.
+
+    Images whose downscaled copy is newer than the source are skipped,
+    unless the copy was made with another `long_side` or `quality`, as
+    recorded in the resize.json file of `output_dir`. Images and labels
+    that are not in the source dataset anymore are deleted.
+    """
+    params = {"long_side": long_side, "quality": quality}
+    filepath_params = output_dir / RESIZE_PARAMS_FILENAME
+    is_same_params = _read_resize_params(filepath_params) == params
+    if not is_same_params:
+        # Only written back once all the images are resized with params
+        filepath_params.unlink(missing_ok=True)
+    for split in splits:
+        images_dir = input_dir / split / "images"
+        if not images_dir.exists():
+            continue
+        os.makedirs(output_dir / split / "images", exist_ok=True)
+        with os.scandir(images_dir) as it:
+            srcs = sorted(e.path for e in it if e.name.endswith(IMAGE_EXTENSION))
+        dsts = [str(output_dir / split / "images" / Path(src).name) for src in srcs]
+        _remove_stale_files(
+            output_dir / split / "images", names={Path(src).name for src in srcs}
+        )
+        todo = [
+            (s, d)
+            for s, d in zip(srcs, dsts)
+            if not is_same_params or not _is_up_to_date(s, d)
+        ]
+        logging.info(
+            f"Resizing {len(todo)} images of {images_dir}, {len(srcs) - len(todo)} up "
+            "to date"
+        )
+        chunks = list(chunked(todo, size=RESIZE_CHUNK_SIZE))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            n_downscaled = sum(
+                executor.map(
+                    _resize_images,
+                    [[s for s, _ in chunk] for chunk in chunks],
+                    [[d for _, d in chunk] for chunk in chunks],
+                    [long_side] * len(chunks),
+                    [quality] * len(chunks),
+                )
+            )
+        logging.info(f"Downscaled {n_downscaled} images of {images_dir}")
+
+        labels_dir = input_dir / split / "labels"
+        label_names = set()
+        if labels_dir.exists():
+            with os.scandir(labels_dir) as it:
+                label_names = {e.name for e in it if e.name.endswith(".txt")}
+            run_file_copy(
+                (
+                    e
+                    for e in list_copy_instructions(
+                        src_dir=labels_dir,
+                        dst_dir=output_dir / split / "labels",
+                    )
+                    if e["from"].suffix == ".txt"
+                ),
+                workers=DEFAULT_WORKERS,
+                mode=MaterializeMode.hardlink,
+            )
+        _remove_stale_files(output_dir / split / "labels", names=label_names)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(filepath_params, "w") as f:
+        json.dump(params, f)
@@ -0,0 +1,128 @@
+"""
+Nested and stratified subsets of a dataset split.
+
+All the subsets are drawn from a single scan of the split. Every image
+gets a seeded sampling key (see `pyro_train.data.scan.sampling_key`) and
+a subset keeps the images with the smallest keys, which makes subsets
+drawn with the same seed nested: the 1% subset is included in the 5% one,
+itself included in the 20% one.
+
+When stratifying, images are grouped by number of boxes (background
+images with no box, 1, 2, ... up to MAX_BOXES_STRATUM boxes or more) and
+each stratum contributes to a subset in proportion to its size.
+"""
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from pyro_train.data.file_copy import DEFAULT_WORKERS
+from pyro_train.data.scan import DatasetEntry, sampling_key
+from pyro_train.utils import chunked
+
+# Images with at least this number of boxes end up in the same stratum.
+MAX_BOXES_STRATUM = 3
+
+# Candidates kept per stratum, as a multiple of the largest sampling ratio,
+# to select the exact number of images of each stratum once the split is
+# fully scanned.
+OVERSAMPLING_FACTOR = 2.0
+
+LABEL_READ_CHUNK_SIZE = 1024
+
+
+def count_boxes(label_path: str | None) -> int:
+    """
+    Return the number of boxes in the YOLO label file `label_path`.
+
+    Images without a label file have no box.
+    """
+    if label_path is None:
+        return 0
+    with open(label_path, "r") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def box_stratum(n_boxes: int) -> int:
+    """
+    Return the stratum of an image with `n_boxes` boxes, 0 being the
+    stratum of the background images.
+    """
+    return min(n_boxes, MAX_BOXES_STRATUM)
+
+
+def _iter_strata(
+    entries: Iterable[DatasetEntry],
+    workers: int,
+) -> Iterable[tuple[DatasetEntry, int]]:
+    """
+    Yield each entry along with its stratum, reading the label files with a
+    pool of `workers` threads.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunked(entries, size=LABEL_READ_CHUNK_SIZE):
+            n_boxes = executor.map(count_boxes, [e.label_path for e in chunk])
+            for entry, n in zip(chunk, n_boxes):
+                yield entry, box_stratum(n)
+
+
+def draw_nested_samples(
+    entries: Iterable[DatasetEntry],
+    sampling_ratios: list[float],
+    random_seed: int = 0,
+    stratify: bool = False,
+    workers: int = DEFAULT_WORKERS,
+) -> dict[float, list[DatasetEntry]]:
+    """
+    Draw one nested subset of `entries` for each of the `sampling_ratios`
+    in a single pass.
+
+    Each subset keeps the entries with the smallest sampling keys: the
+    int(n * ratio) first ones of the n entries without stratification, the
+    round(n * ratio) first ones of each stratum of n entries with
+    stratification. Only the entries whose key is below OVERSAMPLING_FACTOR
+    times the largest ratio are held in memory.
+
+    Returns:
+        samples (dict[float, list[DatasetEntry]]): entries of each subset
+        keyed by sampling ratio.
+    """
+    assert all(
+        0 <= ratio <= 1.0 for ratio in sampling_ratios
+    ), f"sampling ratios should be between 0 and 1, got {sampling_ratios}"
+    if not sampling_ratios:
+        return {}
+
+    bound = min(1.0, OVERSAMPLING_FACTOR * max(sampling_ratios))
+    counts: dict[int, int] = defaultdict(int)
+    candidates: dict[int, list[tuple[float, DatasetEntry]]] = defaultdict(list)
+    strata = (
+        _iter_strata(entries, workers=workers)
+        if stratify
+        else ((entry, 0) for entry in entries)
+    )
+    for entry, stratum in strata:
+        counts[stratum] += 1
+        key = sampling_key(entry.stem, random_seed=random_seed)
+        if key < bound:
+            candidates[stratum].append((key, entry))
+
+    samples: dict[float, list[DatasetEntry]] = {r: [] for r in sampling_ratios}
+    for stratum in sorted(counts):
+        ranked = [entry for _, entry in sorted(candidates[stratum])]
+        if stratify:
+            logging.info(f"Stratum {stratum} boxes: {counts[stratum]} images")
+        for ratio in sampling_ratios:
+            k = (
+                round(counts[stratum] * ratio)
+                if stratify
+                else int(counts[stratum] * ratio)
+            )
+            if k > len(ranked):
+                logging.warning(
+                    f"Stratum {stratum}: only {len(ranked)} candidates to draw {k} "
+                    f"images with ratio {ratio}"
+                )
+            samples[ratio].extend(ranked[:k])
+    return samples
@@ -0,0 +1,77 @@
+"""
+Streaming scan of YOLO dataset splits.
+
+A split is scanned with a single `os.scandir` pass over its labels
+directory and a single pass over its images directory. The two listings
+are joined in memory by file stem instead of issuing one stat syscall per
+image to check whether its label file exists.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+IMAGE_EXTENSION = ".jpg"
+LABEL_EXTENSION = ".txt"
+
+
+class DatasetEntry(NamedTuple):
+    """
+    An image of a dataset split along with its optional label file.
+    """
+
+    stem: str
+    image_path: str
+    label_path: str | None
+
+
+def list_label_stems(labels_dir: Path) -> set[str]:
+    """
+    Return the stems of the label files located in `labels_dir`.
+    """
+    if not labels_dir.exists():
+        return set()
+    with os.scandir(labels_dir) as it:
+        return {
+            entry.name[: -len(LABEL_EXTENSION)]
+            for entry in it
+            if entry.name.endswith(LABEL_EXTENSION)
+        }
+
+
+def scan_split(images_dir: Path, labels_dir: Path) -> Iterator[DatasetEntry]:
+    """
+    Yield a DatasetEntry for each image located in `images_dir`, joined
+    with its label file from `labels_dir` when it exists.
+
+    Images are yielded in the order the filesystem lists them.
+    """
+    label_stems = list_label_stems(labels_dir)
+    with os.scandir(images_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(IMAGE_EXTENSION):
+                continue
+            stem = entry.name[: -len(IMAGE_EXTENSION)]
+            label_path = (
+                os.path.join(labels_dir, f"{stem}{LABEL_EXTENSION}")
+                if stem in label_stems
+                else None
+            )
+            yield DatasetEntry(stem=stem, image_path=entry.path, label_path=label_path)
+
+
+def sampling_key(name: str, random_seed: int = 0) -> float:
+    """
+    Return a pseudo random number in [0, 1) derived from `name` and
+    `random_seed`.
+
+    The key of a file only depends on its name and the seed, not on the
+    other files of the dataset nor on the order in which they are listed.
+    """
+    digest = hashlib.blake2b(
+        name.encode("utf-8"),
+        digest_size=8,
+        key=str(random_seed).encode("utf-8"),
+    ).digest()
+    return int.from_bytes(digest, "big") / 2**64
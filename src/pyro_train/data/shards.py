@@ -0,0 +1,207 @@
+"""
+Sharded packed format of the splits of a YOLO dataset.
+
+Listing, moving and opening millions of small image and label files is
+slow, especially on network filesystems. A split is packed into a few
+large shard files, each being the concatenation of the encoded images,
+along with an index of plain .npy files:
+- names: (n_images,) array of image file names
+- shard_ids: (n_images,) uint32 array of the shard of each image
+- offsets, lengths: (n_images,) int64 arrays locating each image in its
+shard
+- shapes: (n_images, 2) int32 array of the (height, width) of each image,
+once the EXIF orientation is applied
+- boxes, box_offsets: packed labels, the boxes of image i being
+boxes[box_offsets[i]:box_offsets[i + 1]]
+
+The index arrays and the shards are memory-mapped when read, images are
+returned as memoryview slices of the shards without any copy.
+"""
+
+import json
+import logging
+import mmap
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from pyro_train.data.image_headers import read_image_header
+from pyro_train.data.label_index import dataset_signature, parse_label_file
+from pyro_train.data.scan import DatasetEntry, scan_split
+
+SHARDS_VERSION = 1
+
+# Size after which a new shard file is started.
+DEFAULT_SHARD_SIZE = 1 << 30
+
+INDEX_ARRAY_NAMES = [
+    "names",
+    "shard_ids",
+    "offsets",
+    "lengths",
+    "shapes",
+    "boxes",
+    "box_offsets",
+]
+
+
+def shard_filename(shard_id: int) -> str:
+    return f"shard_{shard_id:05d}.bin"
+
+
+def write_shards(
+    entries: list[DatasetEntry],
+    shards_dir: Path,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+) -> int:
+    """
+    Pack the images and labels of `entries` into shard files of about
+    `shard_size` bytes in `shards_dir`, along with their index.
+
+    The shards are written in a temporary folder that replaces
+    `shards_dir` once complete.
+
+    Returns:
+        n_shards (int): number of shard files written.
+    """
+    tmp_dir = shards_dir.with_name(f"{shards_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    n = len(entries)
+    shard_ids = np.zeros(n, dtype=np.uint32)
+    offsets = np.zeros(n, dtype=np.int64)
+    lengths = np.zeros(n, dtype=np.int64)
+    shapes = np.zeros((n, 2), dtype=np.int32)
+    boxes = []
+    shard_id, offset, f = 0, 0, None
+    try:
+        for i, entry in enumerate(entries):
+            if f is None or offset >= shard_size:
+                if f is not None:
+                    f.close()
+                    shard_id += 1
+                f = open(tmp_dir / shard_filename(shard_id), "wb")
+                offset = 0
+            with open(entry.image_path, "rb") as image_file:
+                data = image_file.read()
+            f.write(data)
+            shard_ids[i], offsets[i], lengths[i] = shard_id, offset, len(data)
+            offset += len(data)
+            header = read_image_header(entry.image_path)
+            if header.error:
+                logging.warning(
+                    f"Could not read the header of {entry.image_path}: {header.error}"
+                )
+            width, height = header.oriented_shape
+            shapes[i] = height, width
+            boxes.append(parse_label_file(entry.label_path))
+    finally:
+        if f is not None:
+            f.close()
+
+    box_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in boxes], out=box_offsets[1:])
+    index = {
+        "names": np.array([Path(e.image_path).name for e in entries], dtype=str),
+        "shard_ids": shard_ids,
+        "offsets": offsets,
+        "lengths": lengths,
+        "shapes": shapes,
+        "boxes": np.concatenate(boxes) if boxes else np.zeros((0, 5), np.float32),
+        "box_offsets": box_offsets,
+    }
+    for name, array in index.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+    n_shards = shard_id + 1 if n else 0
+    with open(tmp_dir / "meta.json", "w") as meta_file:
+        json.dump({"version": SHARDS_VERSION, "n_shards": n_shards}, meta_file)
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    os.replace(tmp_dir, shards_dir)
+    return n_shards
+
+
+def write_dataset_shards(
+    dataset_dir: Path,
+    shards_dir: Path,
+    splits: list[str] = ["train", "val"],
+    shard_size: int = DEFAULT_SHARD_SIZE,
+) -> None:
+    """
+    Pack each of the `splits` of the YOLO dataset located at `dataset_dir`
+    into `shards_dir`/<split>.
+
+    The shards are only written again when the folders of the dataset,
+    one of its image or label files, or the shard size changed since the
+    previous packing.
+    """
+    signature = {
+        **dataset_signature(dataset_dir, file_kinds=("images", "labels")),
+        "shard_size": shard_size,
+    }
+    filepath_meta = shards_dir / "meta.json"
+    if filepath_meta.exists():
+        with open(filepath_meta, "r") as f:
+            meta = json.load(f)
+        if meta["version"] == SHARDS_VERSION and meta["signature"] == signature:
+            logging.info(f"Shards of {dataset_dir} are up to date")
+            return
+    for split in splits:
+        entries = sorted(
+            scan_split(
+                images_dir=dataset_dir / split / "images",
+                labels_dir=dataset_dir / split / "labels",
+            )
+        )
+        n_shards = write_shards(entries, shards_dir / split, shard_size=shard_size)
+        logging.info(
+            f"Packed {len(entries)} images of {dataset_dir / split} into {n_shards} "
+            "shards"
+        )
+    with open(filepath_meta, "w") as f:
+        json.dump({"version": SHARDS_VERSION, "signature": signature}, f)
+
+
+class ShardReader:
+    """
+    Random access reader of the images and labels of a sharded split.
+
+    Shards are memory-mapped lazily, so that a reader can be pickled and
+    sent to dataloader worker processes before any shard is opened.
+    """
+
+    def __init__(self, shards_dir: Path):
+        self.shards_dir = shards_dir
+        for name in INDEX_ARRAY_NAMES:
+            setattr(self, name, np.load(shards_dir / f"{name}.npy", mmap_mode="r"))
+        self._mmaps: dict[int, mmap.mmap] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_mmaps": {}}
+
+    def _shard(self, shard_id: int) -> mmap.mmap:
+        if shard_id not in self._mmaps:
+            with open(self.shards_dir / shard_filename(shard_id), "rb") as f:
+                self._mmaps[shard_id] = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        return self._mmaps[shard_id]
+
+    def image_bytes(self, i: int) -> memoryview:
+        """
+        Return the encoded bytes of image `i`, without copying them.
+        """
+        offset = int(self.offsets[i])
+        return memoryview(self._shard(int(self.shard_ids[i])))[
+            offset : offset + int(self.lengths[i])
+        ]
+
+    def image_boxes(self, i: int) -> np.ndarray:
+        """
+        Return the (n, 5) boxes of image `i`.
+        """
+        return self.boxes[self.box_offsets[i] : self.box_offsets[i + 1]]
@@ -0,0 +1,245 @@
+"""
+Module to find the batch size maximizing the training throughput of a
+YOLO model on the current device, CPU included, where the ultralytics
+autobatch (`batch: -1`) only supports CUDA devices.
+
+Each batch size, in increasing order, runs a few training iterations,
+forward, backward and optimizer step, on random images in its own spawned
+process, which reports its images per second and its peak memory: the
+peak RSS on CPU, less the RSS of the interpreter and of the imported
+libraries, the peak allocated memory on CUDA. The probe stops before
+a batch size whose memory, extrapolated from the previous ones, would
+exceed the memory ceiling.
+
+The architecture of the model, untrained, is probed with a single class
+head, the throughput only depending on the architecture and the image
+size.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+import psutil
+import torch
+from ultralytics.cfg import get_cfg
+from ultralytics.nn.tasks import DetectionModel
+from ultralytics.utils.torch_utils import select_device
+
+from pyro_train.utils import peak_rss_mb
+
+
+@dataclass
+class BatchTuningConfig:
+    """
+    Simple DataClass modeling how the batch size is tuned.
+    """
+
+    max_batch: int = 128
+    n_warmup: int = 1
+    n_iterations: int = 3
+    memory_fraction: float = 0.8
+    min_gain: float = 0.05
+    scale_lr0: bool = False
+
+
+@dataclass
+class BatchProbe:
+    """
+    Simple DataClass modeling the measured training throughput of a batch
+    size.
+    """
+
+    batch: int
+    images_per_second: float
+    peak_memory_mb: float
+
+
+def candidate_batch_sizes(max_batch: int) -> list[int]:
+    """
+    Return the batch sizes to probe, the powers of 2 from 2 up to
+    `max_batch`.
+
+    Example:
+        >>> candidate_batch_sizes(100)
+        [2, 4, 8, 16, 32, 64]
+    """
+    return [2**i for i in range(1, max_batch.bit_length()) if 2**i <= max_batch]
+
+
+def extrapolate_memory_mb(probes: list[BatchProbe], batch: int) -> float | None:
+    """
+    Return the memory of `batch` linearly extrapolated from the last two
+    `probes`, or None when there are fewer than two.
+    """
+    if len(probes) < 2:
+        return None
+    a, b = probes[-2], probes[-1]
+    slope = (b.peak_memory_mb - a.peak_memory_mb) / (b.batch - a.batch)
+    return b.peak_memory_mb + slope * (batch - b.batch)
+
+
+def select_batch_size(probes: list[BatchProbe], min_gain: float = 0.05) -> int:
+    """
+    Return the batch size of the fastest of the `probes`, ordered by
+    batch size, a larger one being selected only when faster by more than
+    `min_gain`.
+    """
+    best = probes[0]
+    for probe in probes[1:]:
+        if probe.images_per_second > best.images_per_second * (1 + min_gain):
+            best = probe
+    return best.batch
+
+
+def effective_batch_size(batch: int, nbs: int = 64) -> int:
+    """
+    Return the number of images per optimizer step of `batch`, ultralytics
+    accumulating the gradients of the batches up to the nominal batch size
+    `nbs`.
+
+    Example:
+        >>> effective_batch_size(16), effective_batch_size(128)
+        (64, 128)
+    """
+    return batch * max(round(nbs / batch), 1)
+
+
+def scale_lr0(lr0: float, batch: int, reference_batch: int, nbs: int = 64) -> float:
+    """
+    Scale `lr0`, tuned for `reference_batch`, to `batch` with the linear
+    scaling rule applied to their effective batch sizes.
+    """
+    return (
+        lr0
+        * effective_batch_size(batch, nbs)
+        / effective_batch_size(reference_batch, nbs)
+    )
+
+
+def memory_ceiling_mb(device: str | None, memory_fraction: float) -> float:
+    """
+    Return the memory ceiling of the probed batch sizes, a fraction of the
+    total memory of the CUDA `device` or of the memory available on the
+    node.
+    """
+    torch_device = select_device(device, verbose=False)
+    if torch_device.type == "cuda":
+        total_memory = torch.cuda.get_device_properties(torch_device).total_memory
+        return total_memory / 1e6 * memory_fraction
+    return psutil.virtual_memory().available / 1e6 * memory_fraction
+
+
+def measure_batch(
+    model_cfg: dict,
+    imgsz: int,
+    batch: int,
+    device: str | None,
+    n_warmup: int,
+    n_iterations: int,
+) -> BatchProbe:
+    """
+    Time `n_iterations` training iterations of `batch` random images in
+    the current process, after `n_warmup` ones.
+
+    __Note__: on CPU, the peak memory is the one added to the RSS of the
+    process when called, so that the model, the images and the
+    activations are compared to the memory ceiling without the baseline
+    of the interpreter and of torch.
+    """
+    baseline_rss_mb = psutil.Process().memory_info().rss / 1e6
+    torch_device = select_device(device, verbose=False)
+    is_cuda = torch_device.type == "cuda"
+    model = DetectionModel(model_cfg, nc=1, verbose=False).to(torch_device)
+    model.args = get_cfg()
+    model.train()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.01, momentum=0.9)
+    data = {
+        "img": torch.rand(batch, 3, imgsz, imgsz, device=torch_device),
+        "batch_idx": torch.arange(batch, dtype=torch.float32, device=torch_device),
+        "cls": torch.zeros(batch, 1, device=torch_device),
+        "bboxes": torch.tensor([[0.5, 0.5, 0.2, 0.2]], device=torch_device).repeat(
+            batch, 1
+        ),
+    }
+
+    def step() -> None:
+        loss, _ = model.loss(data)
+        loss.sum().backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        if is_cuda:
+            torch.cuda.synchronize(torch_device)
+
+    if is_cuda:
+        torch.cuda.reset_peak_memory_stats(torch_device)
+    for _ in range(n_warmup):
+        step()
+    start = time.perf_counter()
+    for _ in range(n_iterations):
+        step()
+    duration = time.perf_counter() - start
+    return BatchProbe(
+        batch=batch,
+        images_per_second=batch * n_iterations / duration,
+        peak_memory_mb=(
+            torch.cuda.max_memory_allocated(torch_device) / 1e6
+            if is_cuda
+            else max(peak_rss_mb() - baseline_rss_mb, 0.0)
+        ),
+    )
+
+
+def tune_batch_size(
+    model_cfg: dict,
+    imgsz: int,
+    device: str | None,
+    config: BatchTuningConfig = BatchTuningConfig(),
+) -> int:
+    """
+    Return the batch size with the best training throughput of the
+    architecture `model_cfg`, the yaml dict of a DetectionModel, at `imgsz`
+    on `device`, under the memory ceiling.
+    """
+    model_name = model_cfg.get("yaml_file", "model")
+    ceiling_mb = memory_ceiling_mb(device, config.memory_fraction)
+    logging.info(
+        f"Probing the batch sizes of {model_name} at imgsz {imgsz} under "
+        f"{ceiling_mb:.0f}MB"
+    )
+    probes = []
+    for batch in candidate_batch_sizes(config.max_batch):
+        expected_mb = extrapolate_memory_mb(probes, batch)
+        if expected_mb is not None and expected_mb > ceiling_mb:
+            logging.info(
+                f"Stopping before batch {batch}, expected to use {expected_mb:.0f}MB"
+            )
+            break
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn")
+        ) as executor:
+            try:
+                probe = executor.submit(
+                    measure_batch,
+                    model_cfg,
+                    imgsz,
+                    batch,
+                    device,
+                    config.n_warmup,
+                    config.n_iterations,
+                ).result()
+            except Exception as e:
+                logging.warning(f"Stopping at batch {batch}, it failed: {e}")
+                break
+        logging.info(f"Training throughput {probe}")
+        if probe.peak_memory_mb > ceiling_mb:
+            logging.info(f"Stopping at batch {batch}, above the memory ceiling")
+            break
+        probes.append(probe)
+    if not probes:
+        raise RuntimeError(
+            f"No batch size of {model_name} fits under {ceiling_mb:.0f}MB"
+        )
+    return select_batch_size(probes, min_gain=config.min_gain)
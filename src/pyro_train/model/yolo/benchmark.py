@@ -0,0 +1,196 @@
+"""
+Module to aggregate the results of the YOLO train runs into a benchmark.
+
+Parsed runs are cached in a pickle file along with the mtime and size of
+their args.yaml and results.csv files. Refreshing the benchmark only
+stats the files of each run and reads, in a thread pool, the runs that are
+new or changed since the previous aggregation.
+"""
+
+import logging
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.throughput import THROUGHPUT_FILENAME
+
+BENCHMARK_CACHE_VERSION = 5
+
+# Files of a train run read by the benchmark.
+RUN_FILENAMES = ["args.yaml", "results.csv"]
+# Files of a train run read by the benchmark when they exist.
+OPTIONAL_RUN_FILENAMES = [THROUGHPUT_FILENAME, "weights/best.pt"]
+
+
+@dataclass
+class CachedRun:
+    """
+    Simple DataClass modeling a parsed train run and the signature of its
+    files when parsed.
+    """
+
+    signature: tuple
+    df_results: pd.DataFrame
+    args: dict
+    weights_size: int | None = None
+
+
+def run_signature(train_dir: Path) -> tuple | None:
+    """
+    Return the (mtime, size) of the files of the train run, None for the
+    optional ones that are missing, or None when one of the required files
+    is missing.
+    """
+    signature = []
+    for filename in RUN_FILENAMES + OPTIONAL_RUN_FILENAMES:
+        try:
+            stat = os.stat(train_dir / filename)
+        except FileNotFoundError:
+            if filename in RUN_FILENAMES:
+                return None
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def read_run(train_dir: Path) -> tuple[pd.DataFrame, dict, int | None]:
+    """
+    Return the results of the train run, its args and the size in bytes of
+    its best weights, if any.
+
+    The throughput of the epochs, when recorded, is added to the results
+    as throughput/ columns.
+    """
+    logging.info(f"Loading the results of {train_dir}")
+    cli_args = yaml_read(train_dir / "args.yaml")
+    df_results = pd.read_csv(train_dir / "results.csv")
+    if (train_dir / THROUGHPUT_FILENAME).exists():
+        df_throughput = pd.read_csv(train_dir / THROUGHPUT_FILENAME)
+        # Keep the last record of the epochs trained again after a resume
+        df_throughput = df_throughput.drop_duplicates("epoch", keep="last")
+        # Older ultralytics versions pad the column names with spaces
+        epoch_column = next(c for c in df_results.columns if c.strip() == "epoch")
+        df_results = df_results.merge(
+            df_throughput.add_prefix("throughput/").rename(
+                columns={"throughput/epoch": epoch_column}
+            ),
+            on=epoch_column,
+            how="left",
+        )
+    try:
+        weights_size = os.stat(train_dir / "weights" / "best.pt").st_size
+    except FileNotFoundError:
+        weights_size = None
+    return df_results, cli_args, weights_size
+
+
+def concat_runs(runs: list[CachedRun]) -> pd.DataFrame:
+    """
+    Return the results of the `runs` concatenated, with the args of each
+    run as extra columns having the same value for each row of the run.
+
+    The args are expanded to the rows of the results at once rather than
+    run by run, which is much faster for many runs.
+    """
+    df_results = pd.concat([run.df_results for run in runs], ignore_index=True)
+    df_args = pd.DataFrame([{k: str(v) for k, v in run.args.items()} for run in runs])
+    lengths = [len(run.df_results) for run in runs]
+    df_args = df_args.iloc[np.repeat(np.arange(len(runs)), lengths)].reset_index(
+        drop=True
+    )
+    return pd.concat([df_results, df_args], axis=1)
+
+
+def load_benchmark_cache(filepath_cache: Path) -> dict[str, CachedRun]:
+    """
+    Load the cached runs, by train dir name, saved at `filepath_cache`.
+    """
+    try:
+        with open(filepath_cache, "rb") as f:
+            cache = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return {}
+    if cache.get("version") != BENCHMARK_CACHE_VERSION:
+        return {}
+    return cache["runs"]
+
+
+def save_benchmark_cache(filepath_cache: Path, runs: dict[str, CachedRun]) -> None:
+    """
+    Save the cached `runs` at `filepath_cache`, atomically.
+    """
+    os.makedirs(filepath_cache.parent, exist_ok=True)
+    filepath_tmp = filepath_cache.with_name(f"{filepath_cache.name}.tmp")
+    with open(filepath_tmp, "wb") as f:
+        pickle.dump(
+            {"version": BENCHMARK_CACHE_VERSION, "runs": runs},
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(filepath_tmp, filepath_cache)
+
+
+def load_runs(
+    input_dir: Path,
+    filepath_cache: Path | None = None,
+    max_workers: int = 8,
+) -> dict[str, CachedRun]:
+    """
+    Return the parsed train runs of `input_dir` by train dir name, sorted.
+
+    When `filepath_cache` is set, only the new or changed runs are read and
+    the cache is updated.
+    """
+    cached = {} if filepath_cache is None else load_benchmark_cache(filepath_cache)
+    signatures = {}
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            signature = run_signature(Path(entry.path))
+            if signature is None:
+                logging.warning(f"Skipping {entry.path} - missing artifact")
+            else:
+                signatures[entry.name] = signature
+
+    to_read = [
+        name
+        for name, signature in signatures.items()
+        if name not in cached or cached[name].signature != signature
+    ]
+    logging.info(f"Reading {len(to_read)} new or changed runs out of {len(signatures)}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        read = dict(
+            zip(to_read, executor.map(lambda name: read_run(input_dir / name), to_read))
+        )
+
+    runs = {
+        name: (CachedRun(signature, *read[name]) if name in read else cached[name])
+        for name, signature in signatures.items()
+    }
+    if filepath_cache is not None and (to_read or runs.keys() != cached.keys()):
+        save_benchmark_cache(filepath_cache, runs)
+    return {name: runs[name] for name in sorted(runs)}
+
+
+def make_benchmark(
+    input_dir: Path,
+    filepath_cache: Path | None = None,
+    max_workers: int = 8,
+) -> pd.DataFrame:
+    """
+    Return the df_benchmark dataframe containing the concatenated results
+    of each train runs and their associated model parameters, stringified,
+    ordered by train dir name.
+    """
+    runs = load_runs(input_dir, filepath_cache=filepath_cache, max_workers=max_workers)
+    if not runs:
+        return pd.DataFrame()
+    return concat_runs(list(runs.values()))
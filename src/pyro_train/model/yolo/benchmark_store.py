@@ -0,0 +1,151 @@
+"""
+Module to store the benchmark of the YOLO train runs in SQLite and to
+query it.
+
+Unlike the benchmark.csv file, which repeats the stringified args of a run
+on each of its epochs, the store keeps typed values in two tables:
+- runs: one row per train run with its name in the `run` column, the size
+of its best weights and its args
+- epochs: one row per epoch of each run with the metrics of its
+results.csv file and the ultralytics fitness
+
+Queries load both tables in pandas and are vectorized.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pyro_train.model.yolo.benchmark import CachedRun
+from pyro_train.model.yolo.results import FITNESS_WEIGHTS
+from pyro_train.utils import pareto_front_mask
+
+
+def _sql_value(value):
+    """
+    Return `value` as a value SQLite can store, lists and dicts being
+    serialized to JSON.
+    """
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+def make_runs_table(runs: dict[str, CachedRun]) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "run": name,
+                "weights_size_mb": (
+                    None if run.weights_size is None else run.weights_size / 1e6
+                ),
+                **{k: _sql_value(v) for k, v in run.args.items()},
+            }
+            for name, run in runs.items()
+        ]
+    ).infer_objects()
+
+
+def make_epochs_table(runs: dict[str, CachedRun]) -> pd.DataFrame:
+    df_epochs = pd.concat(
+        [run.df_results.assign(run=name) for name, run in runs.items()],
+        ignore_index=True,
+    )
+    # Older ultralytics versions pad the column names with spaces
+    df_epochs.columns = [c.strip() for c in df_epochs.columns]
+    df_epochs["fitness"] = sum(
+        weight * df_epochs[k].fillna(0.0)
+        for k, weight in FITNESS_WEIGHTS.items()
+        if k in df_epochs.columns
+    )
+    return df_epochs[["run"] + [c for c in df_epochs.columns if c != "run"]]
+
+
+def write_benchmark_store(runs: dict[str, CachedRun], filepath_store: Path) -> None:
+    """
+    Write the runs and epochs tables of the `runs` to the SQLite file at
+    `filepath_store`, replacing it atomically.
+    """
+    os.makedirs(filepath_store.parent, exist_ok=True)
+    filepath_tmp = filepath_store.with_name(f"{filepath_store.name}.tmp")
+    if filepath_tmp.exists():
+        os.remove(filepath_tmp)
+    with closing(sqlite3.connect(filepath_tmp)) as connection:
+        if runs:
+            make_runs_table(runs).to_sql("runs", connection, index=False)
+            make_epochs_table(runs).to_sql("epochs", connection, index=False)
+            connection.execute("CREATE INDEX epochs_run ON epochs (run)")
+        connection.commit()
+    os.replace(filepath_tmp, filepath_store)
+
+
+def load_benchmark_store(filepath_store: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return the runs and epochs tables of the SQLite file at
+    `filepath_store`.
+    """
+    with closing(sqlite3.connect(filepath_store)) as connection:
+        tables = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        if not {"runs", "epochs"} <= tables:
+            return pd.DataFrame(columns=["run"]), pd.DataFrame(columns=["run"])
+        return (
+            pd.read_sql("SELECT * FROM runs", connection),
+            pd.read_sql("SELECT * FROM epochs", connection),
+        )
+
+
+def best_epochs(df_epochs: pd.DataFrame, metric: str = "fitness") -> pd.DataFrame:
+    """
+    Return the epoch with the highest `metric` of each run.
+    """
+    df = df_epochs.dropna(subset=[metric])
+    return df.loc[df.groupby("run")[metric].idxmax()].reset_index(drop=True)
+
+
+def _with_run_args(df_best: pd.DataFrame, df_runs: pd.DataFrame) -> pd.DataFrame:
+    # args such as time also name a metric, their columns get an _args suffix
+    return df_best.merge(df_runs, on="run", how="left", suffixes=("", "_args"))
+
+
+def top_k_runs(
+    df_runs: pd.DataFrame,
+    df_epochs: pd.DataFrame,
+    metric: str = "fitness",
+    k: int = 10,
+) -> pd.DataFrame:
+    """
+    Return the `k` runs with the highest `metric` at their best epoch,
+    along with their args.
+    """
+    df_best = best_epochs(df_epochs, metric).nlargest(k, metric)
+    return _with_run_args(df_best, df_runs)
+
+
+def pareto_runs(
+    df_runs: pd.DataFrame,
+    df_epochs: pd.DataFrame,
+    metric: str = "fitness",
+    costs: list[str] = ["weights_size_mb", "imgsz"],
+) -> pd.DataFrame:
+    """
+    Return the runs on the Pareto front of the highest `metric` at their
+    best epoch vs the lowest `costs`, eg. the model size and image size,
+    sorted by costs.
+    """
+    df = _with_run_args(best_epochs(df_epochs, metric), df_runs)
+    df = df.dropna(subset=[metric, *costs])
+    values = np.column_stack(
+        [-df[metric].to_numpy(dtype=float)]
+        + [df[cost].to_numpy(dtype=float) for cost in costs]
+    )
+    return df[pareto_front_mask(values)].sort_values(costs).reset_index(drop=True)
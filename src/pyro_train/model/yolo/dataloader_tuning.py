@@ -0,0 +1,187 @@
+"""
+Module to tune the dataloader settings of a YOLO train run, the number of
+workers and the image cache, on the node and dataset it trains on.
+
+Each candidate setting builds the actual training dataloader, with its
+augmentations, on a fraction of the train split and times a few batches
+after a warmup. The RAM cache is only probed when the whole train split
+fits in the available memory. The disk cache is only probed on request,
+and when it fits on the disk, as caching on disk writes .npy files next to
+the images, as ultralytics does, which later runs reuse. It should stay off
+for datasets that are DVC outputs, eg. under data/03_model_input.
+
+The dataloader workers compete with the training threads for the cores,
+so a setting that uses more workers or a cache is only preferred when it
+is faster by more than `min_gain`.
+"""
+
+import itertools
+import logging
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from pyro_train.model.yolo.hyperparameters.scheduler import available_cpus
+
+
+@dataclass
+class DataloaderSettings:
+    """
+    Simple DataClass modeling the dataloader settings of a train run.
+    """
+
+    workers: int
+    cache: str | None = None
+
+    def to_params(self) -> dict:
+        return {"workers": self.workers, "cache": self.cache or False}
+
+
+@dataclass
+class DataloaderProbe:
+    """
+    Simple DataClass modeling the measured throughput of a dataloader
+    setting.
+    """
+
+    settings: DataloaderSettings
+    images_per_second: float
+
+
+def candidate_workers(max_workers: int) -> list[int]:
+    """
+    Return the numbers of workers to probe, 0 and the powers of 2 up to
+    `max_workers`.
+
+    Example:
+        >>> candidate_workers(6)
+        [0, 1, 2, 4]
+    """
+    return [0] + [2**i for i in range(max_workers.bit_length()) if 2**i <= max_workers]
+
+
+def select_settings(
+    probes: list[DataloaderProbe], min_gain: float = 0.1
+) -> DataloaderSettings:
+    """
+    Return the settings of the fastest of the `probes`, ordered from the
+    cheapest to the most expensive, a more expensive one being selected
+    only when faster by more than `min_gain`.
+    """
+    best = probes[0]
+    for probe in probes[1:]:
+        if probe.images_per_second > best.images_per_second * (1 + min_gain):
+            best = probe
+    return best.settings
+
+
+def keep_workers(trainer_cls: type[DetectionTrainer]) -> type[DetectionTrainer]:
+    """
+    Return a subclass of `trainer_cls` that keeps the workers of its args
+    on CPU and MPS devices, where ultralytics does not use any.
+    """
+
+    class WorkersTrainer(trainer_cls):
+        def check_resume(self, overrides):
+            # Called before the workers are discarded, after the args of
+            # a resumed run are loaded.
+            super().check_resume(overrides)
+            self.requested_workers = self.args.workers
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.args.workers = self.requested_workers
+
+    WorkersTrainer.__name__ = f"Workers{trainer_cls.__name__}"
+    return WorkersTrainer
+
+
+def time_dataloader(dataloader, n_batches: int, n_warmup: int = 2) -> float:
+    """
+    Return the images per second `dataloader` yields over `n_batches`,
+    after `n_warmup` batches that start its workers.
+    """
+    batches = itertools.chain.from_iterable(itertools.repeat(dataloader))
+    for _ in range(n_warmup):
+        next(batches)
+    n_images = 0
+    start = time.perf_counter()
+    for _ in range(n_batches):
+        n_images += len(next(batches)["im_file"])
+    return n_images / (time.perf_counter() - start)
+
+
+def tune_dataloader(
+    trainer_cls: type[DetectionTrainer],
+    data_yaml_path: Path,
+    params: dict,
+    n_batches: int = 10,
+    n_warmup: int = 2,
+    max_workers: int | None = None,
+    min_gain: float = 0.1,
+    probe_disk_cache: bool = False,
+) -> DataloaderSettings:
+    """
+    Probe the dataloader settings of a train run with `params` on the
+    dataset at `data_yaml_path` and return the fastest.
+
+    `max_workers` defaults to half the cores the process can run on, the
+    other half being left to the training threads.
+
+    __Note__: the disk cache is only probed when `probe_disk_cache` is set,
+    as it writes .npy files in the dataset directory.
+    """
+    if max_workers is None:
+        max_workers = max(1, len(available_cpus()) // 2)
+    batch = params["batch"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trainer = trainer_cls(
+            overrides={
+                "data": str(data_yaml_path.absolute()),
+                "imgsz": params["imgsz"],
+                "batch": batch,
+                "device": params["device"],
+                "single_cls": params["single_cls"],
+                "project": tmp_dir,
+                "name": "dataloader_tuning",
+                "plots": False,
+            }
+        )
+        # The probed datasets only need the stride of the model, 32
+        trainer.model = None
+        trainer.args.cache = None
+        dataset = trainer.build_dataset(trainer.trainset, mode="train", batch=batch)
+        n_images = len(dataset)
+        cache_modes = [None]
+        if probe_disk_cache and dataset.check_cache_disk():
+            cache_modes.append("disk")
+        if dataset.check_cache_ram():
+            cache_modes.append("ram")
+        logging.info(f"Probing the cache modes {cache_modes} on {n_images} images")
+        trainer.args.fraction = min(1.0, (n_batches + n_warmup) * batch / n_images)
+
+        probes = []
+        for cache, workers in itertools.product(
+            cache_modes, candidate_workers(max_workers)
+        ):
+            settings = DataloaderSettings(workers=workers, cache=cache)
+            trainer.args.cache = cache
+            trainer.args.workers = workers
+            dataloader = trainer.get_dataloader(
+                trainer.trainset, batch_size=batch, rank=-1, mode="train"
+            )
+            images_per_second = time_dataloader(
+                dataloader, n_batches=n_batches, n_warmup=n_warmup
+            )
+            del dataloader
+            logging.info(
+                f"Dataloader throughput with {settings}: {images_per_second:.1f} "
+                "images/s"
+            )
+            probes.append(
+                DataloaderProbe(settings=settings, images_per_second=images_per_second)
+            )
+    return select_settings(probes, min_gain=min_gain)
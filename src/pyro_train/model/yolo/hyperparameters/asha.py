@@ -0,0 +1,193 @@
+"""
+Module to early stop hyperparameter search trials with the Asynchronous
+Successive Halving Algorithm (ASHA).
+
+Trials are launched with their full epochs budget. Rungs are placed at
+min_epochs * reduction_factor ** k epochs. When a trial reaches a rung,
+its fitness is recorded and compared to the fitness of all the trials
+that reached the same rung before: only the trials in the top
+1 / reduction_factor keep training, the others are stopped. The
+survivors are hence promoted to the next rung without waiting for the
+other trials, which suits trials running concurrently.
+
+A stopped trial leaves an asha_stop.json file in its run dir, so that it
+is recorded as stopped rather than completed, the fitness of its
+truncated run not being comparable with the one of the completed trials.
+
+Rung results are shared between the worker processes of the search
+through a SQLite database. Trials are only compared with the trials of
+the same fidelity trained on the same dataset, so that full fidelity
+trials are not cut against screening trials.
+"""
+
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+
+ASHA_STOP_FILENAME = "asha_stop.json"
+
+
+@dataclass
+class ASHAConfig:
+    """
+    Simple DataClass modeling the configuration of ASHA.
+    """
+
+    min_epochs: int = 5
+    reduction_factor: int = 3
+
+
+def rung_epochs(min_epochs: int, max_epochs: int, reduction_factor: int) -> list[int]:
+    """
+    Return the number of epochs of each rung below `max_epochs`.
+
+    Example:
+        >>> rung_epochs(min_epochs=5, max_epochs=100, reduction_factor=3)
+        [5, 15, 45]
+    """
+    rungs = []
+    epochs = min_epochs
+    while epochs < max_epochs:
+        rungs.append(epochs)
+        epochs *= reduction_factor
+    return rungs
+
+
+class RungStore:
+    """
+    SQLite store of the fitness of the trials at each rung.
+    """
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        with closing(self._connect()) as connection:
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(rungs)")]
+            if columns and "fidelity" not in columns:
+                # Stores created before the rungs were keyed by fidelity and
+                # dataset, whose results cannot be told apart.
+                connection.execute("DROP TABLE rungs")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rungs (
+                    trial_id TEXT NOT NULL,
+                    fidelity TEXT NOT NULL,
+                    data_fingerprint TEXT NOT NULL,
+                    rung INTEGER NOT NULL,
+                    fitness REAL NOT NULL,
+                    PRIMARY KEY (trial_id, fidelity, data_fingerprint, rung)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.filepath, timeout=60, isolation_level=None)
+
+    def record_and_decide(
+        self,
+        trial_id: str,
+        rung: int,
+        fitness: float,
+        reduction_factor: int,
+        fidelity: Fidelity,
+        data_fingerprint: str,
+    ) -> bool:
+        """
+        Record the `fitness` of `trial_id` at `rung` and return whether the
+        trial should continue, that is whether it is in the top
+        1 / `reduction_factor` of the trials recorded at this rung with the
+        same `fidelity` and `data_fingerprint`.
+
+        Recording and deciding happen in a single transaction so that
+        concurrent trials see each other's results.
+        """
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO rungs
+                (trial_id, fidelity, data_fingerprint, rung, fitness)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (trial_id, fidelity.value, data_fingerprint, rung, fitness),
+            )
+            values = [
+                row[0]
+                for row in connection.execute(
+                    """
+                    SELECT fitness FROM rungs
+                    WHERE rung = ? AND fidelity = ? AND data_fingerprint = ?
+                    """,
+                    (rung, fidelity.value, data_fingerprint),
+                )
+            ]
+            connection.execute("COMMIT")
+        cutoff = np.percentile(values, 100 * (1 - 1 / reduction_factor))
+        return fitness >= cutoff
+
+    def rung_results(
+        self,
+        rung: int,
+        fidelity: Fidelity,
+        data_fingerprint: str,
+    ) -> dict[str, float]:
+        """
+        Return the fitness of each trial recorded at `rung` with the same
+        `fidelity` and `data_fingerprint`.
+        """
+        with closing(self._connect()) as connection:
+            return dict(
+                connection.execute(
+                    """
+                    SELECT trial_id, fitness FROM rungs
+                    WHERE rung = ? AND fidelity = ? AND data_fingerprint = ?
+                    """,
+                    (rung, fidelity.value, data_fingerprint),
+                ).fetchall()
+            )
+
+
+def make_asha_callback(
+    store: RungStore,
+    trial_id: str,
+    rungs: list[int],
+    reduction_factor: int,
+    fidelity: Fidelity,
+    data_fingerprint: str,
+) -> Callable:
+    """
+    Make the ultralytics `on_fit_epoch_end` callback stopping the trial
+    `trial_id` when it underperforms at one of the `rungs`, among the
+    trials of the same `fidelity` and `data_fingerprint`, and saving the
+    stop in the asha_stop.json file of the run.
+    """
+
+    def on_fit_epoch_end(trainer) -> None:
+        epochs_done = trainer.epoch + 1
+        if epochs_done not in rungs or trainer.fitness is None:
+            return
+        fitness = float(trainer.fitness)
+        if not store.record_and_decide(
+            trial_id,
+            rung=epochs_done,
+            fitness=fitness,
+            reduction_factor=reduction_factor,
+            fidelity=fidelity,
+            data_fingerprint=data_fingerprint,
+        ):
+            logging.info(
+                f"Stopping trial {trial_id} at epoch {epochs_done}, fitness "
+                f"{fitness:.4f} below the rung cutoff"
+            )
+            with open(Path(trainer.save_dir) / ASHA_STOP_FILENAME, "w") as f:
+                json.dump({"rung": epochs_done, "fitness": fitness}, f)
+            trainer.stop = True
+
+    return on_fit_epoch_end
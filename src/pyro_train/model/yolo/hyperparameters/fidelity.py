@@ -0,0 +1,65 @@
+"""
+Module for multi-fidelity hyperparameter searches.
+
+Configurations are first screened at a low fidelity: trained on a small
+dataset, with a reduced image size and fewer epochs. Only the top k
+configurations by screening fitness are then promoted and trained at full
+fidelity, with their actual image size and epochs on the full dataset.
+"""
+
+import math
+from dataclasses import dataclass
+from enum import Enum
+
+# Stride of the YOLO models, image sizes must be multiples of it.
+YOLO_STRIDE = 32
+
+
+class Fidelity(Enum):
+    screening = "screening"
+    full = "full"
+
+
+@dataclass
+class ScreeningConfig:
+    """
+    Simple DataClass modeling how configurations are reduced to be
+    screened.
+    """
+
+    imgsz_factor: float = 0.5
+    epochs_factor: float = 0.25
+    min_epochs: int = 1
+
+
+def make_screening_configuration(
+    configuration: dict,
+    screening_config: ScreeningConfig,
+) -> dict:
+    """
+    Return the low fidelity version of `configuration`, with a reduced
+    image size, rounded to the YOLO stride, and fewer epochs.
+    """
+    screening_configuration = dict(configuration)
+    if "imgsz" in configuration:
+        imgsz = int(configuration["imgsz"]) * screening_config.imgsz_factor
+        screening_configuration["imgsz"] = max(
+            YOLO_STRIDE, int(round(imgsz / YOLO_STRIDE)) * YOLO_STRIDE
+        )
+    if "epochs" in configuration:
+        screening_configuration["epochs"] = max(
+            screening_config.min_epochs,
+            math.ceil(int(configuration["epochs"]) * screening_config.epochs_factor),
+        )
+    return screening_configuration
+
+
+def select_top_k(
+    fitness_by_index: dict[int, float],
+    k: int,
+) -> list[int]:
+    """
+    Return the indices of the `k` highest fitness, best first. Ties keep
+    the order of the indices.
+    """
+    return sorted(fitness_by_index, key=lambda i: (-fitness_by_index[i], i))[:k]
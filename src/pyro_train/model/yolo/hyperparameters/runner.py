@@ -0,0 +1,243 @@
+"""
+Module to run the trials of a hyperparameter search, in the worker
+processes of the local scheduler or of the queue workers, and to record
+their results.
+"""
+
+import json
+import logging
+import shutil
+from dataclasses import asdict
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import torch
+
+from pyro_train.model.yolo.batch_tuning import BatchTuningConfig
+from pyro_train.model.yolo.hyperparameters.asha import (
+    ASHA_STOP_FILENAME,
+    ASHAConfig,
+    RungStore,
+    make_asha_callback,
+    rung_epochs,
+)
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialResult,
+    TrialStatus,
+    WorkerSlot,
+)
+from pyro_train.model.yolo.hyperparameters.store import TrialState, TrialStore
+from pyro_train.model.yolo.latency import (
+    LatencyConfig,
+    export_onnx,
+    measure_onnx_latency,
+)
+from pyro_train.model.yolo.results import best_epoch_metrics, read_results_csv
+from pyro_train.model.yolo.throughput import make_throughput_callbacks
+from pyro_train.model.yolo.train import load_pretrained_model, merge_callbacks, train
+
+# Image size of the configurations that do not set it, as in train.
+DEFAULT_IMGSZ = 640
+
+
+def can_resume(filepath_checkpoint: Path) -> bool:
+    """
+    Tell whether the train run of the checkpoint at `filepath_checkpoint`
+    can be resumed.
+
+    __Note__: ultralytics strips the optimizer of last.pt and sets its epoch
+    to -1 once a run ends, including the runs stopped early by ASHA or by
+    their patience, which then have nothing to resume.
+    """
+    checkpoint = torch.load(filepath_checkpoint, map_location="cpu", weights_only=False)
+    return checkpoint.get("optimizer") is not None and checkpoint.get("epoch", -1) >= 0
+
+
+def run_trial(
+    trial: Trial,
+    slot: WorkerSlot,
+    filepath_store: Path,
+    asha_config: ASHAConfig | None = None,
+    latency_config: LatencyConfig | None = None,
+    throughput: bool = False,
+    autotune_dataloader: bool = False,
+    autotune_disk_cache: bool = False,
+    batch_tuning_config: BatchTuningConfig | None = None,
+) -> None:
+    """
+    Train a model with the configuration of `trial` on the device of
+    `slot`. Runs in the worker process of the trial.
+
+    A trial interrupted in a previous search is resumed from its last
+    checkpoint, unless its run had already ended, eg. stopped early, and is
+    only recorded. When `asha_config` is set, the trial is early stopped at
+    the ASHA rungs shared through the store at `filepath_store`. When
+    `latency_config` is set, the latency of the best weights of full
+    fidelity trials is measured and saved in the latency.json file of the
+    run. When `throughput` is set, the throughput of each epoch is saved in
+    the throughput.csv file of the run. When `autotune_dataloader` is set,
+    the dataloader workers and cache are tuned before training, the disk
+    cache being only probed when `autotune_disk_cache` is set. When
+    `batch_tuning_config` is set, the batch size of the trial is replaced by
+    the one with the best training throughput on the device of `slot`.
+    """
+    store = TrialStore(filepath_store)
+    store.set_state(trial.trial_id, TrialState.running)
+    params = {**trial.params, "device": slot.device}
+    callbacks = {}
+    if asha_config is not None:
+        rungs = rung_epochs(
+            min_epochs=asha_config.min_epochs,
+            max_epochs=params["epochs"],
+            reduction_factor=asha_config.reduction_factor,
+        )
+        logging.info(f"ASHA rungs of trial {trial.trial_id}: {rungs}")
+        record = store.get(trial.trial_id)
+        assert record is not None
+        callbacks["on_fit_epoch_end"] = [
+            make_asha_callback(
+                RungStore(filepath_store),
+                trial_id=trial.experiment_name,
+                rungs=rungs,
+                reduction_factor=asha_config.reduction_factor,
+                fidelity=trial.fidelity,
+                data_fingerprint=record.data_fingerprint,
+            )
+        ]
+    if throughput:
+        callbacks = merge_callbacks(callbacks, make_throughput_callbacks())
+    run_dir = Path(trial.project) / trial.experiment_name
+    filepath_last = run_dir / "weights" / "last.pt"
+    n_epochs_done = len(read_results_csv(run_dir / "results.csv"))
+    if n_epochs_done >= params["epochs"]:
+        logging.info(f"Train run {trial.trial_id} already trained all its epochs")
+    elif filepath_last.exists() and not can_resume(filepath_last):
+        logging.info(
+            f"Train run {trial.trial_id} already ended after {n_epochs_done} epochs"
+        )
+    else:
+        resume = filepath_last.exists()
+        if resume:
+            logging.info(
+                f"Resuming train run {trial.trial_id} from {filepath_last} after "
+                f"{n_epochs_done} epochs"
+            )
+            model = load_pretrained_model(str(filepath_last))
+        else:
+            # ultralytics would otherwise train in a new, suffixed, run dir
+            shutil.rmtree(run_dir, ignore_errors=True)
+            logging.info(
+                f"Starting train run {trial.trial_id} with the following "
+                f"configuration: {params}"
+            )
+            logging.info(f"loading pretrained model: {params['model_type']}")
+            model = load_pretrained_model(params["model_type"])
+        train(
+            model=model,
+            data_yaml_path=trial.data_yaml_path,
+            params=params,
+            project=trial.project,
+            experiment_name=trial.experiment_name,
+            callbacks=callbacks,
+            resume=resume,
+            autotune_dataloader=autotune_dataloader,
+            autotune_disk_cache=autotune_disk_cache,
+            batch_tuning=batch_tuning_config,
+        )
+
+    filepath_latency = run_dir / "latency.json"
+    if (
+        latency_config is not None
+        and trial.fidelity == Fidelity.full
+        and not filepath_latency.exists()
+    ):
+        if latency_config.n_threads > slot.n_threads:
+            logging.warning(
+                f"Measuring latency with {latency_config.n_threads} threads on the "
+                f"{slot.n_threads} cores of the trial slot"
+            )
+        imgsz = int(params.get("imgsz", DEFAULT_IMGSZ))
+        filepath_onnx = export_onnx(str(run_dir / "weights" / "best.pt"), imgsz=imgsz)
+        stats = measure_onnx_latency(filepath_onnx, imgsz=imgsz, config=latency_config)
+        logging.info(f"Latency of trial {trial.trial_id}: {stats}")
+        with open(filepath_latency, "w") as f:
+            json.dump(stats.to_metrics(), f)
+
+
+def record_result(store: TrialStore, result: TrialResult) -> None:
+    """
+    Record the state of a finished trial, its best epoch metrics and its
+    latency when measured in the `store`. Trials stopped by ASHA are
+    recorded as stopped.
+    """
+    trial = result.trial
+    run_dir = Path(trial.project) / trial.experiment_name
+    rows = read_results_csv(run_dir / "results.csv")
+    metrics = {**best_epoch_metrics(rows), "n_epochs": len(rows)}
+    if (run_dir / "latency.json").exists():
+        with open(run_dir / "latency.json", "r") as f:
+            metrics.update(json.load(f))
+    if result.status != TrialStatus.completed:
+        state = TrialState.failed
+    elif (run_dir / ASHA_STOP_FILENAME).exists():
+        state = TrialState.stopped
+    else:
+        state = TrialState.completed
+    store.set_state(trial.trial_id, state, metrics=metrics)
+
+
+def run_trial_options(
+    filepath_store: Path,
+    asha_config: ASHAConfig | None = None,
+    latency_config: LatencyConfig | None = None,
+    throughput: bool = False,
+    autotune_dataloader: bool = False,
+    autotune_disk_cache: bool = False,
+    batch_tuning_config: BatchTuningConfig | None = None,
+) -> dict:
+    """
+    Return the options of run_trial as a JSON serializable dict, to be
+    sent to the queue workers, with an absolute `filepath_store`.
+    """
+    return {
+        "filepath_store": str(filepath_store.absolute()),
+        "asha_config": None if asha_config is None else asdict(asha_config),
+        "latency_config": None if latency_config is None else asdict(latency_config),
+        "throughput": throughput,
+        "autotune_dataloader": autotune_dataloader,
+        "autotune_disk_cache": autotune_disk_cache,
+        "batch_tuning_config": (
+            None if batch_tuning_config is None else asdict(batch_tuning_config)
+        ),
+    }
+
+
+def make_run_trial(options: dict) -> Callable[[Trial, WorkerSlot], None]:
+    """
+    Make the run_trial function of the trials from their `options`.
+    """
+    return partial(
+        run_trial,
+        filepath_store=Path(options["filepath_store"]),
+        asha_config=(
+            None
+            if options["asha_config"] is None
+            else ASHAConfig(**options["asha_config"])
+        ),
+        latency_config=(
+            None
+            if options["latency_config"] is None
+            else LatencyConfig(**options["latency_config"])
+        ),
+        throughput=options.get("throughput", False),
+        autotune_dataloader=options.get("autotune_dataloader", False),
+        autotune_disk_cache=options.get("autotune_disk_cache", False),
+        batch_tuning_config=(
+            None
+            if options.get("batch_tuning_config") is None
+            else BatchTuningConfig(**options["batch_tuning_config"])
+        ),
+    )
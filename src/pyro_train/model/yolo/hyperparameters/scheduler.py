@@ -0,0 +1,244 @@
+"""
+Module to run hyperparameter search trials concurrently.
+
+Each trial runs in its own spawned worker process, pinned to a slot of
+CPU cores with a matching thread budget and assigned a device. A trial
+that crashes only terminates its own process: its failure is recorded
+and the slot is handed to the next trial.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from enum import Enum
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable
+
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+
+# Environment variables read by the numerical libraries to size their
+# thread pools.
+THREAD_ENV_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+
+class TrialStatus(Enum):
+    completed = "completed"
+    failed = "failed"
+
+
+@dataclass
+class Trial:
+    """
+    Simple DataClass modeling a trial of the hyperparameter search.
+    """
+
+    trial_id: str
+    params: dict
+    data_yaml_path: Path
+    project: str
+    experiment_name: str
+    fidelity: Fidelity = Fidelity.full
+
+
+@dataclass
+class WorkerSlot:
+    """
+    Simple DataClass modeling the resources allocated to a running trial.
+    """
+
+    index: int
+    device: str | None
+    cpus: list[int] = field(default_factory=list)
+
+    @property
+    def n_threads(self) -> int:
+        return max(1, len(self.cpus))
+
+
+@dataclass
+class TrialResult:
+    """
+    Simple DataClass modeling the outcome of a trial.
+    """
+
+    trial: Trial
+    status: TrialStatus
+    exitcode: int | None
+    device: str | None
+    duration_seconds: float
+
+
+def available_cpus() -> list[int]:
+    """
+    Return the CPU cores the current process is allowed to run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def make_slots(
+    n_jobs: int,
+    devices: list[str | None] = [None],
+    threads_per_trial: int | None = None,
+) -> list[WorkerSlot]:
+    """
+    Make `n_jobs` worker slots, assigning the `devices` in a round robin
+    fashion and `threads_per_trial` CPU cores to each slot. A None device
+    lets ultralytics select it, the first GPU when there is one.
+
+    When `threads_per_trial` is not set, the available cores are split
+    evenly between the slots. Slots share cores when there are not enough
+    of them.
+    """
+    cpus = available_cpus()
+    n_threads = threads_per_trial or max(1, len(cpus) // n_jobs)
+    return [
+        WorkerSlot(
+            index=i,
+            device=devices[i % len(devices)],
+            cpus=[cpus[(i * n_threads + j) % len(cpus)] for j in range(n_threads)],
+        )
+        for i in range(n_jobs)
+    ]
+
+
+def _limit_threads(n_threads: int) -> None:
+    """
+    Limit the thread pools of the current process to `n_threads`.
+    """
+    for name in THREAD_ENV_VARIABLES:
+        os.environ[name] = str(n_threads)
+    try:
+        import cv2
+        import torch
+
+        torch.set_num_threads(n_threads)
+        cv2.setNumThreads(n_threads)
+    except ImportError:
+        pass
+
+
+def _exit_with_parent(parent_pid: int, interval_seconds: float = 5.0) -> None:
+    """
+    Exit the current process once its parent process `parent_pid` died, so
+    that a killed scheduler does not leave its trials running.
+    """
+    while True:
+        time.sleep(interval_seconds)
+        if os.getppid() != parent_pid:
+            logging.error("The scheduler process died, stopping the trial")
+            os._exit(1)
+
+
+def _worker_main(
+    run_trial: Callable[[Trial, WorkerSlot], None],
+    trial: Trial,
+    slot: WorkerSlot,
+    loglevel: int = logging.INFO,
+) -> None:
+    """
+    Entrypoint of the worker process running `trial` in `slot`.
+    """
+    logging.basicConfig(level=loglevel)
+    threading.Thread(
+        target=_exit_with_parent, args=(os.getppid(),), daemon=True
+    ).start()
+    if hasattr(os, "sched_setaffinity") and slot.cpus:
+        os.sched_setaffinity(0, set(slot.cpus))
+    _limit_threads(slot.n_threads)
+    try:
+        run_trial(trial, slot)
+    except BaseException:
+        logging.error(f"Trial {trial.trial_id} failed:\n{traceback.format_exc()}")
+        raise SystemExit(1)
+
+
+def start_trial_process(
+    run_trial: Callable[[Trial, WorkerSlot], None],
+    trial: Trial,
+    slot: WorkerSlot,
+) -> multiprocessing.Process:
+    """
+    Start the spawned worker process running `trial` in `slot`.
+    """
+    process = multiprocessing.get_context("spawn").Process(
+        target=_worker_main,
+        args=(run_trial, trial, slot, logging.getLogger().level),
+        name=f"trial-{trial.trial_id}",
+    )
+    process.start()
+    logging.info(
+        f"Started trial {trial.trial_id} on device {slot.device or 'auto'} with "
+        f"{slot.n_threads} threads"
+    )
+    return process
+
+
+def run_trials(
+    trials: list[Trial],
+    run_trial: Callable[[Trial, WorkerSlot], None],
+    slots: list[WorkerSlot],
+    on_result: Callable[[TrialResult], None] | None = None,
+) -> list[TrialResult]:
+    """
+    Run the `trials` concurrently, one worker process per trial and at most
+    one trial per slot.
+
+    `run_trial` is called in the worker process with the trial and the
+    slot it runs in. It must be picklable, ie. defined at the top level of
+    a module. `on_result` is called in the current process as soon as a
+    trial finishes.
+
+    Returns:
+        results (list[TrialResult]): results ordered by completion time.
+    """
+    pending = list(reversed(trials))
+    free_slots = list(reversed(slots))
+    running: dict[int, tuple[multiprocessing.Process, Trial, WorkerSlot, float]] = {}
+    results = []
+    try:
+        while pending or running:
+            while pending and free_slots:
+                trial, slot = pending.pop(), free_slots.pop()
+                process = start_trial_process(run_trial, trial, slot)
+                running[process.sentinel] = (process, trial, slot, time.monotonic())
+
+            for sentinel in wait(list(running.keys())):
+                process, trial, slot, start = running.pop(sentinel)
+                process.join()
+                result = TrialResult(
+                    trial=trial,
+                    status=(
+                        TrialStatus.completed
+                        if process.exitcode == 0
+                        else TrialStatus.failed
+                    ),
+                    exitcode=process.exitcode,
+                    device=slot.device,
+                    duration_seconds=time.monotonic() - start,
+                )
+                log = logging.info if process.exitcode == 0 else logging.error
+                log(
+                    f"Trial {trial.trial_id} {result.status.value} with exit code "
+                    f"{process.exitcode} in {result.duration_seconds:.0f}s"
+                )
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+                free_slots.append(slot)
+    finally:
+        for process, _, _, _ in running.values():
+            process.terminate()
+            process.join()
+    return results
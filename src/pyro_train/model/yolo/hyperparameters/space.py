@@ -1,10 +1,18 @@
 """
 Module to generate hyperparameter search spaces for training YOLO models.
+
+A configuration of a HyperparameterSpace is identified by its index in the
+Cartesian product of the values of each key, decoded in mixed radix: the
+digit of each key is its value index, the last key varying the fastest.
+This gives sampling without replacement and grid iteration without ever
+building the product, whose size can exceed int64.
 """
 
 import random
+import sys
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 import numpy as np
 
@@ -57,6 +65,24 @@ class HyperparameterSpace:
 
     space: dict[str, np.ndarray]
 
+    @property
+    def radices(self) -> list[int]:
+        """
+        Return the number of values of each key.
+        """
+        return [len(v) for v in self.space.values()]
+
+    @property
+    def size(self) -> int:
+        """
+        Return the number of configurations of the space, as a Python int
+        as it can exceed int64.
+        """
+        size = 1
+        for radix in self.radices:
+            size *= radix
+        return size
+
 
 def make_model_types(
     model_versions: list[YOLOModelVersion],
@@ -242,6 +268,147 @@ def draw_n_random_configurations(
     ]
 
 
+def decode_index(hyperparameter_space: HyperparameterSpace, index: int) -> list[int]:
+    """
+    Decode the configuration `index` into the value index of each key.
+
+    Throws:
+        IndexError: when `index` is out of the space.
+    """
+    if not 0 <= index < hyperparameter_space.size:
+        raise IndexError(
+            f"index {index} out of a space of size {hyperparameter_space.size}"
+        )
+    digits = []
+    for radix in reversed(hyperparameter_space.radices):
+        index, digit = divmod(index, radix)
+        digits.append(digit)
+    return digits[::-1]
+
+
+def encode_index(hyperparameter_space: HyperparameterSpace, digits: list[int]) -> int:
+    """
+    Encode the value index of each key into the configuration index.
+    """
+    index = 0
+    for radix, digit in zip(hyperparameter_space.radices, digits):
+        index = index * radix + digit
+    return index
+
+
+def configuration_at(hyperparameter_space: HyperparameterSpace, index: int) -> dict:
+    """
+    Return the configuration at `index` of the space.
+    """
+    return {
+        k: v[digit].item()
+        for (k, v), digit in zip(
+            hyperparameter_space.space.items(),
+            decode_index(hyperparameter_space, index),
+        )
+    }
+
+
+def draw_n_unique_configurations(
+    hyperparameter_space: HyperparameterSpace,
+    n: int,
+    random_seed: float | int = 0,
+) -> list[dict]:
+    """
+    Draw n distinct configurations from the space using the provided
+    `random_seed`, or all of them when the space is smaller than n.
+    """
+    rng = random.Random(random_seed)
+    size = hyperparameter_space.size
+    if size <= sys.maxsize:
+        indices = rng.sample(range(size), min(n, size))
+    else:
+        # range objects this large have no len, collisions are negligible
+        indices, seen = [], set()
+        while len(indices) < n:
+            index = rng.randrange(size)
+            if index not in seen:
+                seen.add(index)
+                indices.append(index)
+    return [configuration_at(hyperparameter_space, index) for index in indices]
+
+
+def iterate_grid(
+    hyperparameter_space: HyperparameterSpace,
+    start: int = 0,
+    step: int = 1,
+) -> Iterator[dict]:
+    """
+    Iterate over the configurations of the space from index `start`, every
+    `step` configurations. A step of 1 iterates the full grid.
+    """
+    for index in range(start, hyperparameter_space.size, step):
+        yield configuration_at(hyperparameter_space, index)
+
+
+def draw_strided_grid(
+    hyperparameter_space: HyperparameterSpace,
+    n: int,
+    random_seed: int = 0,
+) -> list[dict]:
+    """
+    Return n distinct configurations spread over the grid of the space,
+    or all of them when the space is smaller than n.
+
+    As in a Latin hypercube, each key takes its values evenly over the n
+    configurations, the values of each key being shuffled with
+    `random_seed` so that the keys are not aligned with each other.
+    """
+    size = hyperparameter_space.size
+    if size <= n:
+        return list(iterate_grid(hyperparameter_space))
+    rng = np.random.default_rng(random_seed)
+    radices = np.array(hyperparameter_space.radices, dtype=np.int64)
+    evenly_spaced = (np.arange(n)[:, None] * 2 + 1) * radices // (2 * n)
+    indices: dict[int, None] = {}
+    while len(indices) < n:
+        # The shuffled keys can collide, the missing configurations are
+        # drawn again with new shuffles.
+        value_indices = np.stack(
+            [rng.permutation(column) for column in evenly_spaced.T], axis=1
+        )
+        for digits in value_indices.tolist():
+            indices.setdefault(encode_index(hyperparameter_space, digits))
+    return [
+        configuration_at(hyperparameter_space, index) for index in list(indices)[:n]
+    ]
+
+
+def draw_value_indices(
+    hyperparameter_space: HyperparameterSpace,
+    n: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Draw n configurations at once, with replacement, as a (n, n_keys)
+    array of the value index of each key.
+    """
+    radices = np.array(hyperparameter_space.radices, dtype=np.int64)
+    return rng.integers(0, radices, size=(n, len(radices)))
+
+
+def configurations_from_value_indices(
+    hyperparameter_space: HyperparameterSpace,
+    value_indices: np.ndarray,
+) -> list[dict]:
+    """
+    Return the configurations of the (n, n_keys) `value_indices` array.
+    """
+    columns = {
+        k: v[value_indices[:, j]]
+        for j, (k, v) in enumerate(hyperparameter_space.space.items())
+    }
+    return [
+        {k: column[i].item() for k, column in columns.items()}
+        for i in range(len(value_indices))
+    ]
+
+
 # # REPL
 # model_version = YOLOModelVersion.version_12
 # space = make_space(model_version)
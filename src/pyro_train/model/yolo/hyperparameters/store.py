@@ -0,0 +1,207 @@
+"""
+Module to persist the trials of a hyperparameter search in SQLite.
+
+Each trial is keyed by the hash of its configuration and of the
+fingerprint of the dataset it trains on, so that an identical
+(configuration, data) pair is never trained twice. The store records the
+status of the trials and their final metrics, which lets a restarted
+search skip the finished trials and resume the interrupted ones. Trials
+of a multi-fidelity search are recorded along with their fidelity.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+
+
+class TrialState(Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    # Not trained, eg. over the latency budget
+    pruned = "pruned"
+    # Stopped early by ASHA, with the fitness of its truncated run
+    stopped = "stopped"
+
+
+@dataclass
+class TrialRecord:
+    """
+    Simple DataClass modeling a trial persisted in the TrialStore.
+    """
+
+    trial_key: str
+    experiment_name: str
+    config: dict
+    data_fingerprint: str
+    state: TrialState
+    metrics: dict
+    fidelity: Fidelity = Fidelity.full
+
+
+def make_trial_key(config: dict, data_fingerprint: str) -> str:
+    """
+    Return the key identifying the (`config`, `data_fingerprint`) pair.
+    """
+    content = json.dumps(
+        {"config": config, "data": data_fingerprint}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def _to_record(row: tuple) -> TrialRecord:
+    return TrialRecord(
+        trial_key=row[0],
+        experiment_name=row[1],
+        config=json.loads(row[2]),
+        data_fingerprint=row[3],
+        state=TrialState(row[4]),
+        metrics=json.loads(row[5]),
+        fidelity=Fidelity(row[6]),
+    )
+
+
+class TrialStore:
+    """
+    SQLite store of the trials of a hyperparameter search.
+    """
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        with closing(self._connect()) as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS trials (
+                    trial_key TEXT PRIMARY KEY,
+                    experiment_name TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    data_fingerprint TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    metrics TEXT NOT NULL DEFAULT '{}',
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    fidelity TEXT NOT NULL DEFAULT 'full'
+                )
+                """
+            )
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(trials)")
+            ]
+            if "fidelity" not in columns:
+                # Stores created before multi-fidelity searches
+                connection.execute(
+                    "ALTER TABLE trials "
+                    "ADD COLUMN fidelity TEXT NOT NULL DEFAULT 'full'"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.filepath, timeout=60, isolation_level=None)
+
+    def add(
+        self,
+        trial_key: str,
+        experiment_name: str,
+        config: dict,
+        data_fingerprint: str,
+        fidelity: Fidelity = Fidelity.full,
+    ) -> TrialRecord:
+        """
+        Add a pending trial unless a trial with the same `trial_key` is
+        already stored. Returns the stored trial.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                """
+                INSERT OR IGNORE INTO trials
+                (trial_key, experiment_name, config, data_fingerprint, state,
+                created_at, updated_at, fidelity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    trial_key,
+                    experiment_name,
+                    json.dumps(config, sort_keys=True, default=str),
+                    data_fingerprint,
+                    TrialState.pending.value,
+                    now,
+                    now,
+                    fidelity.value,
+                ),
+            )
+        record = self.get(trial_key)
+        assert record is not None
+        return record
+
+    def get(self, trial_key: str) -> TrialRecord | None:
+        """
+        Return the trial stored with `trial_key`, if any.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                """
+                SELECT trial_key, experiment_name, config, data_fingerprint, state,
+                metrics, fidelity
+                FROM trials WHERE trial_key = ?
+                """,
+                (trial_key,),
+            ).fetchone()
+        return None if row is None else _to_record(row)
+
+    def list(self, states: list[TrialState]) -> list[TrialRecord]:
+        """
+        Return the trials in one of the `states`, oldest first.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"""
+                SELECT trial_key, experiment_name, config, data_fingerprint, state,
+                metrics, fidelity
+                FROM trials WHERE state IN ({", ".join("?" * len(states))})
+                ORDER BY created_at
+                """,
+                [state.value for state in states],
+            ).fetchall()
+        return [_to_record(row) for row in rows]
+
+    def set_state(
+        self,
+        trial_key: str,
+        state: TrialState,
+        metrics: dict | None = None,
+    ) -> None:
+        """
+        Update the state of the trial `trial_key`, and its metrics when
+        provided.
+        """
+        with closing(self._connect()) as connection:
+            if metrics is None:
+                connection.execute(
+                    "UPDATE trials SET state = ?, updated_at = ? WHERE trial_key = ?",
+                    (state.value, time.time(), trial_key),
+                )
+            else:
+                connection.execute(
+                    "UPDATE trials SET state = ?, metrics = ?, updated_at = ? "
+                    "WHERE trial_key = ?",
+                    (state.value, json.dumps(metrics), time.time(), trial_key),
+                )
+
+    def count_by_state(self) -> dict[str, int]:
+        """
+        Return the number of trials in each state.
+        """
+        with closing(self._connect()) as connection:
+            return dict(
+                connection.execute(
+                    "SELECT state, COUNT(*) FROM trials GROUP BY state"
+                ).fetchall()
+            )
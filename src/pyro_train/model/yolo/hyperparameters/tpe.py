@@ -0,0 +1,236 @@
+"""
+Module implementing a Tree-structured Parzen Estimator (TPE) search
+strategy over a HyperparameterSpace.
+
+TPE works on the value index of each key of the space: log-spaced axes
+built by the space parser are hence searched in log scale. Observed
+configurations are split between the good ones, the top `gamma` fraction
+by fitness, and the others. Each axis gets a Parzen density for both
+groups, a Gaussian kernel over the value indices for numeric axes and
+smoothed counts for categorical ones. Candidates are drawn from the good
+densities and the one maximizing the ratio of the good over the bad
+density is suggested.
+
+Observations can be warm-started from the train runs already on disk,
+using their args.yaml and results.csv files.
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.hyperparameters.space import (
+    HyperparameterSpace,
+    configurations_from_value_indices,
+    draw_value_indices,
+)
+from pyro_train.model.yolo.results import best_epoch_metrics, read_results_csv
+
+# Keys of the space named differently in the ultralytics args.yaml file.
+SPACE_KEY_TO_ARG = {"model_type": "model"}
+
+
+@dataclass
+class Observation:
+    """
+    Simple DataClass modeling an evaluated configuration of the space, as
+    the value index of each key.
+    """
+
+    value_indices: list[int]
+    fitness: float
+
+
+def value_indices_of_configuration(
+    hyperparameter_space: HyperparameterSpace,
+    configuration: dict,
+) -> list[int] | None:
+    """
+    Return the value index of each key of `configuration` in the space.
+    Numeric values are mapped to the closest value of their axis.
+
+    Returns None when a key is missing or a categorical value is not part
+    of the space.
+    """
+    value_indices = []
+    for k, values in hyperparameter_space.space.items():
+        if k not in configuration or configuration[k] is None:
+            return None
+        value = configuration[k]
+        if np.issubdtype(values.dtype, np.number):
+            try:
+                value_indices.append(int(np.argmin(np.abs(values - float(value)))))
+            except (TypeError, ValueError):
+                return None
+        else:
+            matches = np.flatnonzero(values == str(value))
+            if not len(matches):
+                return None
+            value_indices.append(int(matches[0]))
+    return value_indices
+
+
+def load_run_observations(
+    hyperparameter_space: HyperparameterSpace,
+    runs_dir: Path,
+    data_yaml_path: Path | None = None,
+) -> list[Observation]:
+    """
+    Load the observations of the train runs located in `runs_dir` from
+    their args.yaml and results.csv files, the fitness of a run being the
+    fitness of its best epoch.
+
+    Runs that cannot be mapped to the space are skipped, eg. when their
+    model is not in the space or was resumed from a checkpoint. As the
+    fitness of runs on other datasets or of other lengths are not
+    comparable, runs not trained on `data_yaml_path`, when set, and runs
+    whose epochs are not one of the epochs of the space are skipped too.
+    """
+    observations = []
+    if not runs_dir.is_dir():
+        return observations
+    for name in sorted(os.listdir(runs_dir)):
+        run_dir = runs_dir / name
+        if not (run_dir / "args.yaml").exists():
+            continue
+        metrics = best_epoch_metrics(read_results_csv(run_dir / "results.csv"))
+        if not metrics:
+            continue
+        args = yaml_read(run_dir / "args.yaml")
+        if data_yaml_path is not None and (
+            not args.get("data")
+            or Path(args["data"]).resolve() != data_yaml_path.resolve()
+        ):
+            logging.debug(f"Skipping run {run_dir}, it trained on {args.get('data')}")
+            continue
+        if "epochs" in hyperparameter_space.space and (
+            args.get("epochs") not in hyperparameter_space.space["epochs"]
+        ):
+            logging.debug(
+                f"Skipping run {run_dir}, it trained for {args.get('epochs')}"
+            )
+            continue
+        configuration = {
+            k: args.get(SPACE_KEY_TO_ARG.get(k, k)) for k in hyperparameter_space.space
+        }
+        if isinstance(configuration.get("model_type"), str):
+            configuration["model_type"] = Path(configuration["model_type"]).name
+        value_indices = value_indices_of_configuration(
+            hyperparameter_space, configuration
+        )
+        if value_indices is None:
+            logging.debug(f"Skipping run {run_dir}, it does not fit in the space")
+            continue
+        observations.append(Observation(value_indices, metrics["fitness"]))
+    return observations
+
+
+def _axis_density(
+    value_indices: np.ndarray,
+    radix: int,
+    is_numeric: bool,
+    prior_weight: float = 1.0,
+) -> np.ndarray:
+    """
+    Return the Parzen density over the `radix` values of an axis given the
+    observed `value_indices`, mixed with a uniform prior.
+    """
+    density = np.full(radix, prior_weight / radix)
+    if len(value_indices):
+        if is_numeric and radix > 1:
+            # Scott's rule like bandwidth over the value indices
+            bandwidth = max(1.0, radix / (len(value_indices) ** 0.2 * 4))
+            grid = np.arange(radix)[None, :]
+            kernels = np.exp(-0.5 * ((grid - value_indices[:, None]) / bandwidth) ** 2)
+            density += (kernels / kernels.sum(axis=1, keepdims=True)).sum(axis=0)
+        else:
+            density += np.bincount(value_indices, minlength=radix)
+    return density / density.sum()
+
+
+def suggest_value_indices(
+    hyperparameter_space: HyperparameterSpace,
+    observations: list[Observation],
+    rng: np.random.Generator,
+    n_candidates: int = 64,
+    gamma: float = 0.25,
+    n_startup: int = 5,
+) -> list[int]:
+    """
+    Suggest the next configuration to evaluate, as the value index of each
+    key. Configurations are drawn at random until `n_startup` observations
+    are available.
+    """
+    if len(observations) < n_startup:
+        return draw_value_indices(hyperparameter_space, n=1, rng=rng)[0].tolist()
+
+    fitness = np.array([o.fitness for o in observations])
+    order = np.argsort(-fitness, kind="stable")
+    n_good = max(1, int(np.ceil(gamma * len(observations))))
+    all_indices = np.array([o.value_indices for o in observations], dtype=np.int64)
+    good, bad = all_indices[order[:n_good]], all_indices[order[n_good:]]
+
+    candidates = np.zeros(
+        (n_candidates, len(hyperparameter_space.space)), dtype=np.int64
+    )
+    scores = np.zeros(n_candidates)
+    for j, values in enumerate(hyperparameter_space.space.values()):
+        is_numeric = np.issubdtype(values.dtype, np.number)
+        l_density = _axis_density(good[:, j], len(values), is_numeric)
+        g_density = _axis_density(bad[:, j], len(values), is_numeric)
+        candidates[:, j] = rng.choice(len(values), size=n_candidates, p=l_density)
+        scores += np.log(l_density[candidates[:, j]]) - np.log(
+            g_density[candidates[:, j]]
+        )
+    return candidates[int(np.argmax(scores))].tolist()
+
+
+def suggest_configurations(
+    hyperparameter_space: HyperparameterSpace,
+    observations: list[Observation],
+    n: int,
+    rng: np.random.Generator,
+    excluded: set[tuple[int, ...]] = set(),
+    max_attempts: int = 20,
+) -> list[dict]:
+    """
+    Suggest `n` distinct configurations to evaluate concurrently.
+
+    Each suggestion is added to the observations with the worst fitness
+    observed so far (constant liar), which pushes the next suggestions
+    away from it. Configurations in `excluded` are not suggested again, so
+    fewer than `n` configurations are returned when the space runs out.
+    """
+    observations = list(observations)
+    worst = min((o.fitness for o in observations), default=0.0)
+    seen = set(excluded)
+    suggestions = []
+    for _ in range(n):
+        value_indices = None
+        for attempt in range(2 * max_attempts):
+            if attempt < max_attempts:
+                candidate = suggest_value_indices(
+                    hyperparameter_space, observations, rng
+                )
+            else:
+                # The model keeps suggesting tried configurations, explore at random
+                candidate = draw_value_indices(hyperparameter_space, n=1, rng=rng)[
+                    0
+                ].tolist()
+            if tuple(candidate) not in seen:
+                value_indices = candidate
+                break
+        if value_indices is None:
+            break
+        seen.add(tuple(value_indices))
+        suggestions.append(value_indices)
+        observations.append(Observation(value_indices, worst))
+    if not suggestions:
+        return []
+    return configurations_from_value_indices(
+        hyperparameter_space, np.array(suggestions, dtype=np.int64)
+    )
@@ -0,0 +1,359 @@
+"""
+Module to distribute the trials of a hyperparameter search over several
+nodes through a queue folder on a shared filesystem.
+
+The coordinator writes the spec of each trial as a JSON file in the
+pending/ subfolder. Workers, on any node, claim a trial by renaming its
+file to claimed/, which is atomic: a single worker wins the claim. While
+the trial runs, the worker heartbeats by touching the claimed file. When
+the trial finishes, the worker takes its claimed file out of claimed/,
+again with an atomic rename, and writes its result to done/ along with
+its spec. Claims whose heartbeat is older than a timeout, eg. of a
+crashed node, are moved back to pending/ by the coordinator so that
+another worker picks them up.
+
+Heartbeats are compared to the clock of the coordinator, the clocks of
+the nodes should hence be synchronized. The paths of the trials are sent
+absolute, the shared filesystem should be mounted at the same path on
+every node.
+
+__Note__: the trial store and the ASHA rung store are SQLite databases
+that the workers write to through the shared filesystem. SQLite relies
+on file locks that are unreliable on network filesystems such as NFS,
+which can corrupt the databases: the output folder of the search, where
+they are stored, should be on a shared filesystem with working POSIX
+locks.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable
+
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialResult,
+    TrialStatus,
+    WorkerSlot,
+    start_trial_process,
+)
+
+QUEUE_SUBDIRS = ["pending", "claimed", "done", "tmp"]
+
+
+def trial_to_dict(trial: Trial) -> dict:
+    return {
+        **asdict(trial),
+        "data_yaml_path": str(Path(trial.data_yaml_path).absolute()),
+        "project": str(Path(trial.project).absolute()),
+        "fidelity": trial.fidelity.value,
+    }
+
+
+def trial_from_dict(data: dict) -> Trial:
+    return Trial(
+        **{
+            **data,
+            "data_yaml_path": Path(data["data_yaml_path"]),
+            "fidelity": Fidelity(data["fidelity"]),
+        }
+    )
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class TrialQueue:
+    """
+    Queue of trials stored in the `queue_dir` folder.
+    """
+
+    def __init__(self, queue_dir: Path):
+        self.queue_dir = queue_dir
+        for subdir in QUEUE_SUBDIRS:
+            os.makedirs(queue_dir / subdir, exist_ok=True)
+
+    def _path(self, subdir: str, trial_id: str) -> Path:
+        return self.queue_dir / subdir / f"{trial_id}.json"
+
+    def _write(self, subdir: str, trial_id: str, data: dict) -> None:
+        """
+        Write `data` atomically, readers never seeing a partial file.
+        """
+        filepath_tmp = self.queue_dir / "tmp" / f"{trial_id}.{uuid.uuid4().hex}"
+        with open(filepath_tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(filepath_tmp, self._path(subdir, trial_id))
+
+    def _read(self, subdir: str, trial_id: str) -> dict | None:
+        try:
+            with open(self._path(subdir, trial_id), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, trial_id: str, spec: dict) -> None:
+        """
+        Add the trial `trial_id` to the queue, unless it is already queued,
+        claimed or done.
+        """
+        if any(
+            self._path(subdir, trial_id).exists()
+            for subdir in ["pending", "claimed", "done"]
+        ):
+            return
+        self._write("pending", trial_id, spec)
+
+    def claim(self) -> tuple[str, dict] | None:
+        """
+        Claim the oldest pending trial, returning its id and spec, or None
+        when no trial is pending.
+        """
+        pending_dir = self.queue_dir / "pending"
+        filenames = sorted(
+            os.listdir(pending_dir), key=lambda f: _mtime(pending_dir / f)
+        )
+        for filename in filenames:
+            trial_id = Path(filename).stem
+            try:
+                os.rename(pending_dir / filename, self._path("claimed", trial_id))
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            # The claimed file keeps the mtime of its put, refresh it before
+            # the claim is considered stale
+            if not self.heartbeat(trial_id):
+                continue
+            spec = self._read("claimed", trial_id)
+            if spec is not None:
+                return trial_id, spec
+        return None
+
+    def heartbeat(self, trial_id: str) -> bool:
+        """
+        Refresh the claim of `trial_id`. Returns False when the claim was
+        lost, ie. the trial was requeued.
+        """
+        try:
+            os.utime(self._path("claimed", trial_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, trial_id: str, result: dict) -> bool:
+        """
+        Write the `result` of the claimed trial `trial_id` and release its
+        claim. Returns False when the claim was lost.
+
+        The claimed file is first renamed out of claimed/, so that the
+        trial cannot be requeued while its result is written.
+        """
+        filepath_completing = (
+            self.queue_dir / "tmp" / f"{trial_id}.{uuid.uuid4().hex}.completing"
+        )
+        try:
+            os.rename(self._path("claimed", trial_id), filepath_completing)
+        except FileNotFoundError:
+            return False
+        with open(filepath_completing, "r") as f:
+            spec = json.load(f)
+        self._write("done", trial_id, {"spec": spec, "result": result})
+        os.remove(filepath_completing)
+        return True
+
+    def result(self, trial_id: str) -> dict | None:
+        """
+        Return the result of the trial `trial_id` once done.
+        """
+        done = self._read("done", trial_id)
+        return None if done is None else done["result"]
+
+    def requeue_stale(self, stale_after_seconds: float) -> list[str]:
+        """
+        Move back to pending the claimed trials whose last heartbeat is
+        older than `stale_after_seconds`. Returns their ids.
+        """
+        claimed_dir = self.queue_dir / "claimed"
+        now = time.time()
+        requeued = []
+        for filename in os.listdir(claimed_dir):
+            trial_id = Path(filename).stem
+            if now - _mtime(claimed_dir / filename) < stale_after_seconds:
+                continue
+            if self._path("done", trial_id).exists():
+                continue
+            try:
+                os.rename(claimed_dir / filename, self._path("pending", trial_id))
+            except FileNotFoundError:
+                continue
+            requeued.append(trial_id)
+        return requeued
+
+    def count(self) -> dict[str, int]:
+        """
+        Return the number of trials in each state of the queue.
+        """
+        return {
+            subdir: len(os.listdir(self.queue_dir / subdir))
+            for subdir in ["pending", "claimed", "done"]
+        }
+
+
+def _mtime(filepath: Path) -> float:
+    try:
+        return os.stat(filepath).st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+
+def run_queued_trials(
+    trials: list[Trial],
+    queue: TrialQueue,
+    options: dict,
+    on_result: Callable[[TrialResult], None] | None = None,
+    poll_seconds: float = 10.0,
+    stale_after_seconds: float = 300.0,
+) -> list[TrialResult]:
+    """
+    Put the `trials` in the `queue` and wait for the workers to run them,
+    requeuing the stale claims. `options` are sent to the workers along
+    with each trial, their paths should hence be absolute.
+
+    Follows run_trials: `on_result` is called as soon as a trial is done.
+
+    Returns:
+        results (list[TrialResult]): results ordered by completion time.
+    """
+    for trial in trials:
+        queue.put(trial.trial_id, {"trial": trial_to_dict(trial), "options": options})
+    waiting = {trial.trial_id: trial for trial in trials}
+    results = []
+    while waiting:
+        for trial_id in list(waiting):
+            result = queue.result(trial_id)
+            if result is None:
+                continue
+            trial = waiting.pop(trial_id)
+            trial_result = TrialResult(
+                trial=trial,
+                status=TrialStatus(result["status"]),
+                exitcode=result["exitcode"],
+                device=result["device"],
+                duration_seconds=result["duration_seconds"],
+            )
+            log = (
+                logging.info
+                if trial_result.status == TrialStatus.completed
+                else logging.error
+            )
+            log(
+                f"Trial {trial_id} {trial_result.status.value} on worker "
+                f"{result['worker_id']} "
+                f"in {trial_result.duration_seconds:.0f}s"
+            )
+            results.append(trial_result)
+            if on_result is not None:
+                on_result(trial_result)
+        if not waiting:
+            break
+        for trial_id in queue.requeue_stale(stale_after_seconds):
+            logging.warning(
+                f"Requeued trial {trial_id}, its worker stopped heartbeating"
+            )
+        time.sleep(poll_seconds)
+    return results
+
+
+def run_worker(
+    queue: TrialQueue,
+    make_run_trial: Callable[[dict], Callable[[Trial, WorkerSlot], None]],
+    slots: list[WorkerSlot],
+    poll_seconds: float = 10.0,
+    heartbeat_seconds: float = 30.0,
+    max_idle_seconds: float | None = None,
+) -> int:
+    """
+    Claim and run the trials of the `queue`, at most one trial per slot,
+    until the queue has been empty for `max_idle_seconds`, forever when
+    None.
+
+    `make_run_trial` makes the run_trial function of a trial, as in
+    run_trials, from the options sent along with it. A trial whose claim
+    is lost is terminated.
+
+    Returns:
+        n_trials (int): number of trials run to completion.
+    """
+    worker_id = make_worker_id()
+    free_slots = list(reversed(slots))
+    running = {}
+    n_trials = 0
+    idle_since = time.monotonic()
+    while True:
+        while free_slots:
+            claimed = queue.claim()
+            if claimed is None:
+                break
+            trial_id, spec = claimed
+            trial, slot = trial_from_dict(spec["trial"]), free_slots.pop()
+            logging.info(f"Worker {worker_id} claimed trial {trial_id}")
+            process = start_trial_process(make_run_trial(spec["options"]), trial, slot)
+            running[trial_id] = (process, trial, slot, time.monotonic())
+
+        if not running:
+            if (
+                max_idle_seconds is not None
+                and time.monotonic() - idle_since > max_idle_seconds
+            ):
+                return n_trials
+            time.sleep(poll_seconds)
+            continue
+
+        deadline = time.monotonic() + heartbeat_seconds
+        freed_slot = False
+        while running and not freed_slot and time.monotonic() < deadline:
+            for trial_id, (process, trial, slot, start) in list(running.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                running.pop(trial_id)
+                free_slots.append(slot)
+                freed_slot = True
+                status = (
+                    TrialStatus.completed
+                    if process.exitcode == 0
+                    else TrialStatus.failed
+                )
+                result = {
+                    "status": status.value,
+                    "exitcode": process.exitcode,
+                    "device": slot.device,
+                    "duration_seconds": time.monotonic() - start,
+                    "worker_id": worker_id,
+                }
+                if queue.complete(trial_id, result):
+                    n_trials += 1
+                    logging.info(
+                        f"Trial {trial_id} {status.value} with exit code "
+                        f"{process.exitcode}"
+                    )
+                else:
+                    logging.warning(
+                        f"Dropping the result of trial {trial_id}, its claim was lost"
+                    )
+            time.sleep(min(poll_seconds, 1.0))
+        for trial_id, (process, _, slot, _) in list(running.items()):
+            if not queue.heartbeat(trial_id):
+                logging.error(f"Lost the claim of trial {trial_id}, terminating it")
+                process.terminate()
+                process.join()
+                running.pop(trial_id)
+                free_slots.append(slot)
+        idle_since = time.monotonic()
@@ -0,0 +1,272 @@
+"""
+Module to benchmark the CPU inference of a trained YOLO model and of its
+ONNX and NCNN exports, as they run on the edge cameras.
+
+Each benchmark case, a format with a batch size, an image size and a
+number of threads, runs in its own spawned process so that its peak RSS
+and its thread settings do not leak into the other cases. Only the
+forward pass of the network is timed, the pre and post processing being
+the same for every format.
+
+The inference libraries are imported by the loaders, so that the peak RSS
+of a case only accounts for the library of its format.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from enum import Enum
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from pyro_train.utils import peak_rss_mb
+
+
+class InferenceFormat(Enum):
+    """
+    Formats of the benchmarked models.
+    """
+
+    pt = "pt"
+    onnx = "onnx"
+    ncnn = "ncnn"
+
+
+@dataclass
+class BenchmarkCase:
+    """
+    Simple DataClass modeling a configuration of the inference benchmark.
+    """
+
+    format: InferenceFormat
+    filepath_model: Path
+    batch: int
+    imgsz: int
+    n_threads: int
+
+
+@dataclass
+class InferenceStats:
+    """
+    Simple DataClass modeling the measured inference of a benchmark case,
+    latencies being per batch in milliseconds.
+    """
+
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    images_per_second: float
+    peak_rss_mb: float
+
+
+def inference_stats(
+    durations_ms: list[float],
+    batch: int,
+    peak_rss_mb: float,
+) -> InferenceStats:
+    """
+    Summarize the measured `durations_ms` of batches of `batch` images into
+    InferenceStats.
+    """
+    p50, p95, p99 = np.percentile(durations_ms, [50, 95, 99])
+    mean_ms = float(np.mean(durations_ms))
+    return InferenceStats(
+        p50_ms=float(p50),
+        p95_ms=float(p95),
+        p99_ms=float(p99),
+        mean_ms=mean_ms,
+        images_per_second=batch * 1000 / mean_ms,
+        peak_rss_mb=peak_rss_mb,
+    )
+
+
+def load_pt(filepath_model: Path, n_threads: int) -> Callable[[np.ndarray], None]:
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(n_threads)
+    model = YOLO(filepath_model).model.fuse(verbose=False).float().eval()
+
+    def predict(images: np.ndarray) -> None:
+        with torch.inference_mode():
+            model(torch.from_numpy(images))
+
+    return predict
+
+
+def load_onnx(filepath_model: Path, n_threads: int) -> Callable[[np.ndarray], None]:
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = n_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(
+        str(filepath_model), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    input_name = session.get_inputs()[0].name
+
+    def predict(images: np.ndarray) -> None:
+        session.run(None, {input_name: images})
+
+    return predict
+
+
+def load_ncnn(filepath_model: Path, n_threads: int) -> Callable[[np.ndarray], None]:
+    """
+    Load the NCNN model whose param file is at `filepath_model`, the bin
+    file being next to it.
+
+    NCNN has no batch dimension, the images of a batch run one by one.
+    """
+    import ncnn
+
+    net = ncnn.Net()
+    net.opt.num_threads = n_threads
+    net.opt.use_vulkan_compute = False
+    net.load_param(str(filepath_model))
+    net.load_model(str(filepath_model.with_suffix(".bin")))
+    input_name = net.input_names()[0]
+    output_names = net.output_names()
+
+    def predict(images: np.ndarray) -> None:
+        for image in images:
+            with net.create_extractor() as extractor:
+                extractor.input(input_name, ncnn.Mat(image))
+                for output_name in output_names:
+                    extractor.extract(output_name)
+
+    return predict
+
+
+def locate_model(
+    format: InferenceFormat,
+    model_dir: Path,
+    export_dir: Path,
+) -> Path | None:
+    """
+    Return the model file of `format` among the train run at `model_dir`
+    and the exports at `export_dir`, as laid out by export.py, or None when
+    it is missing.
+    """
+    if format == InferenceFormat.pt:
+        filepaths = [model_dir / "weights" / "best.pt"]
+    elif format == InferenceFormat.onnx:
+        filepaths = sorted(export_dir.glob("*.onnx"))
+    else:
+        filepaths = sorted(export_dir.glob("*_ncnn_model/*.param"))
+    return next((f for f in filepaths if f.exists()), None)
+
+
+LOADERS = {
+    InferenceFormat.pt: load_pt,
+    InferenceFormat.onnx: load_onnx,
+    InferenceFormat.ncnn: load_ncnn,
+}
+
+
+def time_inferences(
+    predict: Callable[[np.ndarray], None],
+    images: np.ndarray,
+    n_warmup: int,
+    n_runs: int,
+) -> list[float]:
+    """
+    Return the durations in milliseconds of `n_runs` calls of `predict` on
+    `images`, after `n_warmup` calls that are not timed.
+    """
+    for _ in range(n_warmup):
+        predict(images)
+    durations_ms = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        predict(images)
+        durations_ms.append((time.perf_counter() - start) * 1000)
+    return durations_ms
+
+
+def measure_case(case: BenchmarkCase, n_warmup: int, n_runs: int) -> InferenceStats:
+    """
+    Measure the inference of the benchmark `case` in the current process.
+    """
+    predict = LOADERS[case.format](case.filepath_model, case.n_threads)
+    images = np.random.default_rng(0).random(
+        (case.batch, 3, case.imgsz, case.imgsz), dtype=np.float32
+    )
+    durations_ms = time_inferences(predict, images, n_warmup=n_warmup, n_runs=n_runs)
+    return inference_stats(durations_ms, batch=case.batch, peak_rss_mb=peak_rss_mb())
+
+
+def run_benchmark(
+    cases: list[BenchmarkCase],
+    n_warmup: int = 10,
+    n_runs: int = 50,
+) -> list[tuple[BenchmarkCase, InferenceStats | None]]:
+    """
+    Measure each benchmark case in a fresh spawned process.
+
+    Returns:
+        results (list[tuple[BenchmarkCase, InferenceStats | None]]): the
+        stats of each case, None when it failed.
+    """
+    results = []
+    for case in cases:
+        logging.info(f"Benchmarking {case}")
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn")
+        ) as executor:
+            try:
+                stats = executor.submit(measure_case, case, n_warmup, n_runs).result()
+                logging.info(f"Measured {stats}")
+            except Exception as e:
+                logging.error(f"Could not benchmark {case}: {e}")
+                stats = None
+        results.append((case, stats))
+    return results
+
+
+def to_records(
+    results: list[tuple[BenchmarkCase, InferenceStats | None]]
+) -> list[dict]:
+    """
+    Return the successful `results` as flat records, one per benchmark
+    case.
+    """
+    return [
+        {
+            "format": case.format.value,
+            "batch": case.batch,
+            "imgsz": case.imgsz,
+            "n_threads": case.n_threads,
+            **asdict(stats),
+        }
+        for case, stats in results
+        if stats is not None
+    ]
+
+
+def to_metrics(records: list[dict]) -> dict:
+    """
+    Return the `records` nested by format and case, to be tracked as DVC
+    metrics.
+
+    Example:
+        >>> record = {"format": "onnx", "batch": 1, "imgsz": 640, "n_threads": 4}
+        >>> to_metrics([{**record, "p50_ms": 12.0}])
+        {'onnx': {'batch1_imgsz640_threads4': {'p50_ms': 12.0}}}
+    """
+    metrics = {}
+    for record in records:
+        key = "batch{batch}_imgsz{imgsz}_threads{n_threads}".format(**record)
+        metrics.setdefault(record["format"], {})[key] = {
+            k: v
+            for k, v in record.items()
+            if k not in {"format", "batch", "imgsz", "n_threads"}
+        }
+    return metrics
@@ -0,0 +1,155 @@
+"""
+Module to pre-build the ultralytics label caches of a YOLO dataset.
+
+Before training, ultralytics verifies every image and label of a split
+and stores the result in a `labels.cache` file next to the `labels`
+folder. Building these caches once when the dataset is created saves
+this scan at the start of every training run and reports the corrupt
+images up front.
+
+__Note__: ultralytics keys the cache with the absolute paths of the
+images, a cache is only reused when training from the same location.
+"""
+
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.data.utils import img2label_paths, load_dataset_cache_file
+
+from pyro_train.data.file_copy import DEFAULT_WORKERS
+
+
+@dataclass
+class LabelCacheReport:
+    """
+    Simple DataClass summarizing the verification of a dataset split.
+    """
+
+    cache_path: Path
+    n_images: int
+    n_found: int
+    n_missing: int
+    n_empty: int
+    n_corrupt: int
+    messages: list[str] = field(default_factory=list)
+
+
+def _has_entries(dir: Path) -> bool:
+    with os.scandir(dir) as it:
+        return any(True for _ in it)
+
+
+def _is_truncated_jpeg(filepath: str) -> bool:
+    with open(filepath, "rb") as f:
+        f.seek(-2, os.SEEK_END)
+        return f.read() != b"\xff\xd9"
+
+
+def _unshare_truncated_jpeg(filepath: str) -> bool:
+    """
+    Replace `filepath` by a plain copy when it is a link to a truncated
+    JPEG. Returns whether the file was replaced.
+    """
+    is_link = os.path.islink(filepath) or os.stat(filepath).st_nlink > 1
+    if not is_link or not _is_truncated_jpeg(filepath):
+        return False
+    tmp_filepath = f"{filepath}.tmp"
+    shutil.copy2(os.path.realpath(filepath), tmp_filepath)
+    os.replace(tmp_filepath, filepath)
+    return True
+
+
+def unshare_truncated_jpegs(images_dir: Path, workers: int = DEFAULT_WORKERS) -> int:
+    """
+    Replace the links to truncated JPEGs in `images_dir` by plain copies.
+
+    ultralytics restores truncated JPEGs in place when verifying them,
+    which would otherwise write through hardlinks and symlinks into the
+    raw dataset.
+
+    Returns:
+        n_unshared (int): number of files replaced by a copy.
+    """
+    with os.scandir(images_dir) as it:
+        filepaths = [e.path for e in it if e.name.lower().endswith((".jpg", ".jpeg"))]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(_unshare_truncated_jpeg, filepaths))
+
+
+def build_label_cache(
+    images_dir: Path,
+    names: list[str],
+    single_cls: bool = True,
+) -> LabelCacheReport:
+    """
+    Verify the images of `images_dir` and their labels and save the
+    ultralytics `labels.cache` file, the same way ultralytics does it at
+    the start of a training run.
+
+    Returns:
+        report (LabelCacheReport): verification results of the split.
+    """
+    # ultralytics resolves the image paths from the data.yaml file and the
+    # cache is only valid for the exact same paths.
+    dataset = YOLODataset(
+        img_path=str(images_dir.resolve()),
+        data={"names": dict(enumerate(names)), "nc": len(names)},
+        task="detect",
+        augment=False,
+        single_cls=single_cls,
+    )
+    cache_path = Path(img2label_paths(dataset.im_files[:1])[0]).parent.with_suffix(
+        ".cache"
+    )
+    cache = load_dataset_cache_file(cache_path)
+    n_found, n_missing, n_empty, n_corrupt, n_images = cache["results"]
+    return LabelCacheReport(
+        cache_path=cache_path,
+        n_images=n_images,
+        n_found=n_found,
+        n_missing=n_missing,
+        n_empty=n_empty,
+        n_corrupt=n_corrupt,
+        messages=cache["msgs"],
+    )
+
+
+def build_label_caches(
+    dataset_dir: Path,
+    names: list[str],
+    splits: list[str] = ["train", "val"],
+    single_cls: bool = True,
+) -> dict[str, LabelCacheReport]:
+    """
+    Build the label cache of each of the `splits` of the YOLO dataset
+    located at `dataset_dir`, skipping the splits without images.
+    """
+    reports = {}
+    for split in splits:
+        images_dir = dataset_dir / split / "images"
+        if not images_dir.exists() or not _has_entries(images_dir):
+            logging.info(f"Skipping label cache of {images_dir} - no images")
+            continue
+        n_unshared = unshare_truncated_jpegs(images_dir)
+        if n_unshared:
+            logging.warning(
+                f"Replaced {n_unshared} links to truncated JPEGs by copies in "
+                f"{images_dir}"
+            )
+        report = build_label_cache(images_dir, names=names, single_cls=single_cls)
+        logging.info(
+            f"Label cache {report.cache_path}: {report.n_found} images with labels, "
+            f"{report.n_missing + report.n_empty} backgrounds, {report.n_corrupt} "
+            "corrupt"
+        )
+        for message in report.messages:
+            logging.warning(message)
+        if report.n_corrupt:
+            logging.error(f"{report.n_corrupt} corrupt images found in {images_dir}")
+        reports[split] = report
+    return reports
@@ -0,0 +1,143 @@
+"""
+Module to measure the CPU inference latency of YOLO models with
+onnxruntime, as they run on the edge devices.
+
+Models are exported to ONNX with a static input shape and run on a single
+image with a fixed number of threads. The latency only depends on the
+architecture and the image size, so that untrained architectures can be
+probed before training anything. Their detection head has the 80 COCO
+classes, which slightly overestimates the latency of the single class
+models.
+"""
+
+import logging
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+from ultralytics import YOLO
+
+
+@dataclass
+class LatencyConfig:
+    """
+    Simple DataClass modeling how latency is measured.
+    """
+
+    n_threads: int = 4
+    n_warmup: int = 10
+    n_runs: int = 50
+
+
+@dataclass
+class LatencyStats:
+    """
+    Simple DataClass modeling the latency of a model, in milliseconds.
+    """
+
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+    n_threads: int
+
+    def to_metrics(self) -> dict:
+        return {
+            "latency_p50_ms": self.p50_ms,
+            "latency_p95_ms": self.p95_ms,
+            "latency_mean_ms": self.mean_ms,
+            "latency_threads": self.n_threads,
+        }
+
+
+def latency_stats(durations_ms: list[float], n_threads: int) -> LatencyStats:
+    """
+    Summarize the measured `durations_ms` into LatencyStats.
+    """
+    p50, p95 = np.percentile(durations_ms, [50, 95])
+    return LatencyStats(
+        p50_ms=float(p50),
+        p95_ms=float(p95),
+        mean_ms=float(np.mean(durations_ms)),
+        n_threads=n_threads,
+    )
+
+
+def export_onnx(model_path: str, imgsz: int) -> Path:
+    """
+    Export the model at `model_path`, weights or architecture yaml file, to
+    ONNX with a static (1, 3, `imgsz`, `imgsz`) input.
+
+    Returns:
+        filepath_onnx (Path): exported model, next to `model_path`.
+    """
+    model = YOLO(model_path)
+    return Path(
+        model.export(
+            format="onnx", imgsz=imgsz, dynamic=False, simplify=True, device="cpu"
+        )
+    )
+
+
+def measure_onnx_latency(
+    filepath_onnx: Path,
+    imgsz: int,
+    config: LatencyConfig = LatencyConfig(),
+) -> LatencyStats:
+    """
+    Measure the latency of the ONNX model at `filepath_onnx` on the CPU,
+    running `config.n_runs` inferences after `config.n_warmup` ones.
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config.n_threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(
+        str(filepath_onnx), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    input_name = session.get_inputs()[0].name
+    image = np.random.default_rng(0).random((1, 3, imgsz, imgsz), dtype=np.float32)
+    for _ in range(config.n_warmup):
+        session.run(None, {input_name: image})
+    durations_ms = []
+    for _ in range(config.n_runs):
+        start = time.perf_counter()
+        session.run(None, {input_name: image})
+        durations_ms.append((time.perf_counter() - start) * 1000)
+    return latency_stats(durations_ms, n_threads=config.n_threads)
+
+
+def architecture_yaml(model_type: str) -> str:
+    """
+    Return the architecture yaml file of `model_type`.
+
+    Example:
+        >>> architecture_yaml("yolo11s.pt")
+        'yolo11s.yaml'
+    """
+    path = Path(model_type)
+    return path.with_suffix(".yaml").name if path.suffix == ".pt" else model_type
+
+
+def probe_latency(
+    model_type: str,
+    imgsz: int,
+    config: LatencyConfig = LatencyConfig(),
+) -> LatencyStats:
+    """
+    Measure the latency of the untrained architecture of `model_type` at
+    `imgsz`, without downloading its weights.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath_onnx = export_onnx(architecture_yaml(model_type), imgsz=imgsz)
+        # Architectures are exported in the working directory
+        filepath_onnx = Path(
+            shutil.move(filepath_onnx, Path(tmp_dir) / filepath_onnx.name)
+        )
+        stats = measure_onnx_latency(filepath_onnx, imgsz=imgsz, config=config)
+    logging.info(f"Latency of {model_type} at imgsz {imgsz}: {stats}")
+    return stats
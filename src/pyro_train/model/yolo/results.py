@@ -0,0 +1,46 @@
+"""
+Module to read the metrics ultralytics saves in the results.csv file of
+a train run, one row per epoch.
+"""
+
+import csv
+from pathlib import Path
+
+# Weights of the metrics in the ultralytics fitness of detection models.
+FITNESS_WEIGHTS = {
+    "metrics/mAP50(B)": 0.1,
+    "metrics/mAP50-95(B)": 0.9,
+}
+
+
+def read_results_csv(filepath: Path) -> list[dict[str, float]]:
+    """
+    Read the per epoch metrics of the results.csv file at `filepath`.
+    Returns an empty list when the file does not exist yet.
+    """
+    if not filepath.exists():
+        return []
+    with open(filepath, "r", newline="") as f:
+        return [
+            # Older ultralytics versions pad the column names with spaces
+            {k.strip(): float(v) for k, v in row.items() if k and v}
+            for row in csv.DictReader(f)
+        ]
+
+
+def fitness(metrics: dict[str, float]) -> float:
+    """
+    Return the ultralytics fitness of the epoch `metrics`.
+    """
+    return sum(weight * metrics.get(k, 0.0) for k, weight in FITNESS_WEIGHTS.items())
+
+
+def best_epoch_metrics(rows: list[dict[str, float]]) -> dict[str, float]:
+    """
+    Return the metrics of the epoch with the best fitness along with that
+    fitness, or an empty dict when there is no epoch.
+    """
+    if not rows:
+        return {}
+    best = max(rows, key=fitness)
+    return {**best, "fitness": fitness(best)}
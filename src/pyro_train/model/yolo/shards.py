@@ -0,0 +1,161 @@
+"""
+Module to train the YOLO models on sharded datasets.
+
+The dataset reads the images and labels of a split from the shards
+written by `pyro_train.data.shards` instead of individual files. Images
+are decoded straight from memoryview slices of the memory-mapped shards.
+
+A data.yaml file declares a sharded dataset with the `shards: true` key,
+its split paths pointing to the shard folders.
+"""
+
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+import psutil
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+from pyro_train.data.shards import ShardReader
+
+
+class ShardedYOLODataset(YOLODataset):
+    """
+    YOLODataset reading a split packed into shards.
+
+    The image file names are kept in `im_files` for logging and plotting
+    but no file is opened. Caching images on disk is not supported.
+    """
+
+    def get_img_files(self, img_path: str) -> list[str]:
+        self.reader = ShardReader(Path(img_path))
+        names = list(self.reader.names)
+        if self.fraction < 1:
+            names = names[: round(len(names) * self.fraction)]
+        return [str(Path(img_path) / name) for name in names]
+
+    def get_labels(self) -> list[dict]:
+        labels = []
+        for i, im_file in enumerate(self.im_files):
+            boxes = np.array(self.reader.image_boxes(i), dtype=np.float32)
+            # Drop the duplicate boxes, as ultralytics does when verifying
+            # the label files
+            _, unique = np.unique(boxes, axis=0, return_index=True)
+            if len(unique) < len(boxes):
+                boxes = boxes[unique]
+            labels.append(
+                {
+                    "im_file": im_file,
+                    "shape": tuple(int(x) for x in self.reader.shapes[i]),
+                    "cls": boxes[:, 0:1],
+                    "bboxes": boxes[:, 1:],
+                    "segments": [],
+                    "keypoints": None,
+                    "normalized": True,
+                    "bbox_format": "xywh",
+                }
+            )
+        return labels
+
+    def check_cache_disk(self, safety_margin: float = 0.5) -> bool:
+        LOGGER.warning(
+            f"{self.prefix}cache='disk' is not supported with shards, not caching "
+            "images"
+        )
+        self.cache = None
+        return False
+
+    def check_cache_ram(self, safety_margin: float = 0.5) -> bool:
+        # The shapes of all the images are known, there is no need to
+        # decode a sample of them.
+        shapes = np.asarray(self.reader.shapes[: self.ni], dtype=np.float64)
+        ratios = self.imgsz / shapes.max(axis=1)
+        mem_required = (shapes.prod(axis=1) * 3 * ratios**2).sum() * (1 + safety_margin)
+        mem = psutil.virtual_memory()
+        if mem_required > mem.available:
+            self.cache = None
+            LOGGER.warning(
+                f"{self.prefix}{mem_required / (1 << 30):.1f}GB RAM required to "
+                f"cache images but only {mem.available / (1 << 30):.1f}GB available, "
+                "not caching images"
+            )
+            return False
+        return True
+
+    def load_image(self, i: int, rect_mode: bool = True):
+        """
+        Load and resize image `i`, mirroring `BaseDataset.load_image`.
+        """
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+        # im_files are reordered in rect mode, the reader keeps the order
+        # of the shards.
+        j = self.shard_indices[i]
+        im = cv2.imdecode(
+            np.frombuffer(self.reader.image_bytes(j), dtype=np.uint8), cv2.IMREAD_COLOR
+        )
+        if im is None:
+            raise FileNotFoundError(f"Could not decode image {self.im_files[i]}")
+
+        h0, w0 = im.shape[:2]
+        if rect_mode:
+            r = self.imgsz / max(h0, w0)
+            if r != 1:
+                w, h = (
+                    min(math.ceil(w0 * r), self.imgsz),
+                    min(math.ceil(h0 * r), self.imgsz),
+                )
+                im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        elif not (h0 == w0 == self.imgsz):
+            im = cv2.resize(
+                im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR
+            )
+
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                k = self.buffer.pop(0)
+                if self.cache != "ram":
+                    self.ims[k], self.im_hw0[k], self.im_hw[k] = None, None, None
+
+        return im, (h0, w0), im.shape[:2]
+
+    @property
+    def shard_indices(self) -> list[int]:
+        if not hasattr(self, "_shard_indices"):
+            positions = {name: j for j, name in enumerate(self.reader.names)}
+            self._shard_indices = [positions[Path(f).name] for f in self.im_files]
+        return self._shard_indices
+
+
+class ShardedDetectionTrainer(DetectionTrainer):
+    """
+    DetectionTrainer building ShardedYOLODataset datasets.
+    """
+
+    def build_dataset(
+        self, img_path: str, mode: str = "train", batch: int | None = None
+    ):
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return ShardedYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=self.args.cache or None,
+            single_cls=self.args.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+        )
@@ -0,0 +1,153 @@
+"""
+Module to instrument the throughput of the YOLO train runs with
+ultralytics callbacks.
+
+For each epoch, the time spent waiting on the dataloader is measured
+between the end of a batch, or the start of the epoch, and the start of
+the next batch. The time spent in the forward, backward and optimizer
+steps is measured between the start and the end of each batch. The
+epochs are saved in the throughput.csv file of the run, next to its
+results.csv file, with the same epoch numbers. The peak RSS is the one of
+the training process, the dataloader workers not included.
+"""
+
+import csv
+import logging
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Callable
+
+from pyro_train.utils import peak_rss_mb
+
+THROUGHPUT_FILENAME = "throughput.csv"
+
+
+@dataclass
+class EpochThroughput:
+    """
+    Simple DataClass modeling the throughput of a train epoch, durations
+    being in seconds.
+    """
+
+    epoch: int
+    epoch_s: float
+    train_s: float
+    dataloader_s: float
+    compute_s: float
+    validation_s: float
+    n_images: int
+    images_per_second: float
+    dataloader_fraction: float
+    peak_rss_mb: float
+
+
+def append_throughput_csv(filepath: Path, row: EpochThroughput) -> None:
+    """
+    Append the epoch `row` to the throughput.csv file at `filepath`,
+    writing its header when the file is new.
+    """
+    is_new = not filepath.exists()
+    with open(filepath, "a", newline="") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=[field.name for field in fields(EpochThroughput)]
+        )
+        if is_new:
+            writer.writeheader()
+        writer.writerow(asdict(row))
+
+
+class ThroughputRecorder:
+    """
+    Record the throughput of each epoch of a train run from the ultralytics
+    callback events.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.epoch_start = None
+
+    def on_train_epoch_start(self, trainer) -> None:
+        self.epoch_start = self.last_mark = self.clock()
+        self.dataloader_s = 0.0
+        self.compute_s = 0.0
+        self.validation_s = 0.0
+        self.train_end = None
+        self.val_start = None
+
+    def on_train_batch_start(self, trainer) -> None:
+        now = self.clock()
+        self.dataloader_s += now - self.last_mark
+        self.last_mark = now
+
+    def on_train_batch_end(self, trainer) -> None:
+        now = self.clock()
+        self.compute_s += now - self.last_mark
+        self.last_mark = now
+
+    def on_train_epoch_end(self, trainer) -> None:
+        self.train_end = self.clock()
+
+    def on_val_start(self, validator) -> None:
+        self.val_start = self.clock()
+
+    def on_val_end(self, validator) -> None:
+        # The final validation of best.pt runs after the last epoch
+        if self.epoch_start is not None and self.val_start is not None:
+            self.validation_s += self.clock() - self.val_start
+
+    def on_fit_epoch_end(self, trainer) -> None:
+        # Also called after the final validation, once the epoch is recorded
+        if self.epoch_start is None or self.train_end is None:
+            return
+        row = self.epoch_throughput(
+            epoch=trainer.epoch + 1,
+            n_images=len(trainer.train_loader.dataset),
+            epoch_end=self.clock(),
+        )
+        self.epoch_start = None
+        logging.info(f"Throughput of epoch {row.epoch}: {row}")
+        append_throughput_csv(Path(trainer.save_dir) / THROUGHPUT_FILENAME, row)
+
+    def epoch_throughput(
+        self, epoch: int, n_images: int, epoch_end: float
+    ) -> EpochThroughput:
+        train_s = self.train_end - self.epoch_start
+        return EpochThroughput(
+            epoch=epoch,
+            epoch_s=epoch_end - self.epoch_start,
+            train_s=train_s,
+            dataloader_s=self.dataloader_s,
+            compute_s=self.compute_s,
+            validation_s=self.validation_s,
+            n_images=n_images,
+            images_per_second=n_images / train_s if train_s > 0 else 0.0,
+            dataloader_fraction=self.dataloader_s / train_s if train_s > 0 else 0.0,
+            peak_rss_mb=peak_rss_mb(),
+        )
+
+    def callbacks(self) -> dict[str, list[Callable]]:
+        """
+        Return the callbacks of the recorder by ultralytics event, to be
+        passed to train.
+        """
+        return {
+            event: [getattr(self, event)]
+            for event in [
+                "on_train_epoch_start",
+                "on_train_batch_start",
+                "on_train_batch_end",
+                "on_train_epoch_end",
+                "on_val_start",
+                "on_val_end",
+                "on_fit_epoch_end",
+            ]
+        }
+
+
+def make_throughput_callbacks() -> dict[str, list[Callable]]:
+    """
+    Make the ultralytics callbacks saving the throughput of each epoch in
+    the throughput.csv file of the run.
+    """
+    return ThroughputRecorder().callbacks()
@@ -2,9 +2,24 @@
 Module to train the YOLO models.
 """
 
+import logging
 from pathlib import Path
+from typing import Callable
 
 from ultralytics import YOLO
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from pyro_train.data.utils import yaml_read
+from pyro_train.model.yolo.batch_tuning import (
+    BatchTuningConfig,
+    scale_lr0,
+    tune_batch_size,
+)
+from pyro_train.model.yolo.dataloader_tuning import keep_workers, tune_dataloader
+from pyro_train.model.yolo.shards import ShardedDetectionTrainer
+
+# Dataloader workers of a train run.
+DEFAULT_WORKERS = 8
 
 
 def load_pretrained_model(model_str: str) -> YOLO:
@@ -14,15 +29,54 @@ def load_pretrained_model(model_str: str) -> YOLO:
     return YOLO(model_str)
 
 
+def merge_callbacks(*callbacks: dict[str, list[Callable]]) -> dict[str, list[Callable]]:
+    """
+    Merge the `callbacks` by ultralytics event, keeping their order.
+    """
+    merged = {}
+    for event_callbacks in callbacks:
+        for event, fns in event_callbacks.items():
+            merged.setdefault(event, []).extend(fns)
+    return merged
+
+
 def train(
     model: YOLO,
     data_yaml_path: Path,
     params: dict,
     project: str = "data/04_models/yolo/",
     experiment_name: str = "train",
+    callbacks: dict[str, list[Callable]] = {},
+    resume: bool = False,
+    autotune_dataloader: bool = False,
+    autotune_disk_cache: bool = False,
+    batch_tuning: BatchTuningConfig | None = None,
 ):
     """
     Main function for running a train run.
+
+    When `resume` is set, `model` should be loaded from the last.pt
+    checkpoint of an interrupted run, which is resumed with its own
+    parameters.
+
+    `callbacks` maps ultralytics events (eg. on_fit_epoch_end) to extra
+    callbacks added to the model before training.
+
+    Datasets whose data.yaml declares `shards: true` are read from their
+    shards with the ShardedDetectionTrainer.
+
+    When `autotune_dataloader` is set, the workers and the cache of the
+    dataloader are the fastest ones probed on the dataset, see
+    `pyro_train.model.yolo.dataloader_tuning`, and are saved in the args of
+    the run. The workers are then also used on CPU and MPS devices. The disk
+    cache, which writes .npy files next to the images, is only probed when
+    `autotune_disk_cache` is set.
+
+    When `batch_tuning` is set, the batch size is the one with the best
+    training throughput on the device under a memory ceiling, see
+    `pyro_train.model.yolo.batch_tuning`, `lr0` being scaled along when
+    `batch_tuning.scale_lr0` is set and the optimizer is not auto, which
+    ignores `lr0`. It is tuned before the dataloader.
     """
     assert data_yaml_path.exists(), f"data_yaml_path does not exist, {data_yaml_path}"
     default_params = {
@@ -36,6 +90,10 @@ def train(
         "optimizer": "auto",
         "patience": 100,
         "warmup_epochs": 3,
+        # compute parameters
+        "device": None,
+        "workers": DEFAULT_WORKERS,
+        "cache": False,
         # eval parameters
         "box": 7.5,
         "cls": 0.5,
@@ -54,7 +112,44 @@ def train(
         "translate": 0.1,
     }
     params = {**default_params, **params}
+    is_sharded = yaml_read(data_yaml_path).get("shards", False)
+    trainer_cls = ShardedDetectionTrainer if is_sharded else DetectionTrainer
+    if batch_tuning is not None and not resume:
+        batch = tune_batch_size(
+            model.model.yaml,
+            imgsz=params["imgsz"],
+            device=params["device"],
+            config=batch_tuning,
+        )
+        logging.info(f"Training with the tuned batch size {batch}")
+        if batch_tuning.scale_lr0 and params["optimizer"] == "auto":
+            logging.warning("Not scaling lr0, which the auto optimizer ignores")
+        elif batch_tuning.scale_lr0:
+            # batch -1 is the ultralytics autobatch, only supported on CUDA
+            reference_batch = (
+                params["batch"] if params["batch"] > 0 else default_params["batch"]
+            )
+            lr0 = scale_lr0(params["lr0"], batch=batch, reference_batch=reference_batch)
+            logging.info(f"Scaling lr0 from {params['lr0']} to {lr0}")
+            params = {**params, "lr0": lr0}
+        params = {**params, "batch": batch}
+    if autotune_dataloader:
+        trainer_cls = keep_workers(trainer_cls)
+        if not resume:
+            settings = tune_dataloader(
+                trainer_cls,
+                data_yaml_path,
+                params,
+                probe_disk_cache=autotune_disk_cache,
+            )
+            logging.info(f"Training with the tuned dataloader settings {settings}")
+            params = {**params, **settings.to_params()}
+    for event, event_callbacks in callbacks.items():
+        for callback in event_callbacks:
+            model.add_callback(event, callback)
     model.train(
+        trainer=trainer_cls,
+        resume=resume,
         project=project,
         name=experiment_name,
         data=data_yaml_path.absolute(),
@@ -68,6 +163,10 @@ def train(
         optimizer=params["optimizer"],
         patience=params["patience"],
         warmup_epochs=params["warmup_epochs"],
+        # compute parameters
+        device=params["device"],
+        workers=params["workers"],
+        cache=params["cache"],
         # val parameters
         box=params["box"],
         cls=params["cls"],
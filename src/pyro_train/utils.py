@@ -1,5 +1,11 @@
 import hashlib
+import resource
+import sys
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
 
 
 def compute_file_content_sha256(filepath: Path) -> str:
@@ -20,3 +26,53 @@ def compute_file_content_sha256(filepath: Path) -> str:
 
     # Return the hexadecimal digest of the hash
     return hash_sha256.hexdigest()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Yield successive lists of `size` elements from `iterable`, the last
+    one being possibly shorter.
+    """
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def pareto_front_mask(costs: np.ndarray) -> np.ndarray:
+    """
+    Return the boolean mask of the rows of the (n, m) `costs` array that are
+    not dominated by any other row, all the m objectives being minimized.
+    """
+    costs = np.asarray(costs, dtype=float)
+    mask = np.ones(len(costs), dtype=bool)
+    for i, cost in enumerate(costs):
+        dominated_by = np.all(costs <= cost, axis=1) & np.any(costs < cost, axis=1)
+        mask[i] = not dominated_by.any()
+    return mask
+
+
+def pareto_ranks(costs: np.ndarray) -> np.ndarray:
+    """
+    Return the non-dominated sorting rank of each row of the (n, m) `costs`
+    array: 0 for the Pareto front, 1 for the front of the remaining rows
+    and so on.
+    """
+    costs = np.asarray(costs, dtype=float)
+    ranks = np.zeros(len(costs), dtype=np.int64)
+    remaining = np.arange(len(costs))
+    rank = 0
+    while len(remaining):
+        mask = pareto_front_mask(costs[remaining])
+        ranks[remaining[mask]] = rank
+        remaining = remaining[~mask]
+        rank += 1
+    return ranks
+
+
+def peak_rss_mb() -> float:
+    """
+    Return the peak resident set size of the current process in MB.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return maxrss / 1e6 if sys.platform == "darwin" else maxrss / 1e3
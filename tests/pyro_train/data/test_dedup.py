@@ -0,0 +1,78 @@
+import numpy as np
+from PIL import Image
+
+from pyro_train.data.dedup import (
+    dhash,
+    find_near_duplicate_pairs,
+    popcount,
+    select_duplicates_to_drop,
+)
+
+
+def test_dhash_near_duplicates(tmp_path):
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)).resize(
+            (320, 240)
+        )
+        for _ in range(2)
+    ]
+    images[0].save(tmp_path / "a.jpg", quality=95)
+    images[0].save(tmp_path / "a_recompressed.jpg", quality=50)
+    images[1].save(tmp_path / "b.jpg", quality=95)
+
+    a, a_recompressed, b = (
+        dhash(str(tmp_path / name)) for name in ["a.jpg", "a_recompressed.jpg", "b.jpg"]
+    )
+
+    assert bin(a ^ a_recompressed).count("1") <= 4
+    assert bin(a ^ b).count("1") > 4
+
+
+def test_find_near_duplicate_pairs_blocks():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2**63, 50, dtype=np.uint64)
+    hashes[37] = hashes[3] ^ np.uint64(0b101)
+    hashes[45] = hashes[3] ^ (np.uint64(1) << np.uint64(63))
+
+    pairs, distances = find_near_duplicate_pairs(hashes, max_distance=2, block_size=8)
+
+    assert pairs.tolist() == [[3, 37], [3, 45]]
+    assert distances.tolist() == [2, 1]
+    assert popcount(hashes[[3]] ^ hashes[[37]]).tolist() == [2]
+
+
+def test_select_duplicates_to_drop():
+    # 0-1 are train near duplicates, 2 is a train image leaking into val 3
+    pairs = np.array([[0, 1], [2, 3]])
+    is_train = np.array([True, True, True, False, True])
+
+    assert select_duplicates_to_drop(pairs, is_train).tolist() == [
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert select_duplicates_to_drop(
+        pairs, is_train, drop_train_duplicates=True
+    ).tolist() == [False, True, True, False, False]
+
+
+def test_select_duplicates_to_drop_chains():
+    # A~B~C with only A in val, and D~E~F in train
+    pairs = np.array([[0, 1], [1, 2], [3, 4], [4, 5]])
+    is_train = np.array([False, True, True, True, True, True])
+
+    assert select_duplicates_to_drop(pairs, is_train).tolist() == [
+        False,
+        True,
+        False,
+        False,
+        False,
+        False,
+    ]
+    # F is not a near duplicate of D, the kept image
+    assert select_duplicates_to_drop(
+        pairs, is_train, drop_train_duplicates=True
+    ).tolist() == [False, True, False, False, True, False]
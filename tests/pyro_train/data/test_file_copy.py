@@ -0,0 +1,63 @@
+from pyro_train.data.file_copy import (
+    MaterializeMode,
+    list_copy_instructions,
+    materialize_file,
+    run_file_copy,
+)
+
+
+def test_run_file_copy(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for i in range(10):
+        (src_dir / f"{i}.txt").write_text("0 0.5 0.5 0.1 0.1\n" * i)
+    dst_dir = tmp_path / "dst" / "nested"
+
+    stats = run_file_copy(
+        list_copy_instructions(src_dir=src_dir, dst_dir=dst_dir),
+        workers=4,
+    )
+
+    assert stats.n_files == 10
+    assert stats.n_bytes == sum(f.stat().st_size for f in src_dir.iterdir())
+    assert sorted(f.name for f in dst_dir.iterdir()) == sorted(
+        f.name for f in src_dir.iterdir()
+    )
+    assert (dst_dir / "3.txt").read_text() == (src_dir / "3.txt").read_text()
+
+
+def test_run_file_copy_skips_invalid_elements(tmp_path):
+    stats = run_file_copy([{"from": tmp_path / "missing-to-key"}], workers=1)
+    assert stats.n_files == 0
+    assert stats.n_skipped == 1
+
+
+def test_run_file_copy_materialize_modes(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "a.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    for mode in MaterializeMode:
+        dst_dir = tmp_path / mode.value
+        stats = run_file_copy(
+            list_copy_instructions(src_dir=src_dir, dst_dir=dst_dir),
+            workers=2,
+            mode=mode,
+        )
+        assert stats.n_files == 1
+        assert (dst_dir / "a.txt").read_text() == "0 0.5 0.5 0.1 0.1\n"
+    assert (tmp_path / "symlink" / "a.txt").is_symlink()
+    assert (tmp_path / "hardlink" / "a.txt").stat().st_ino == (
+        src_dir / "a.txt"
+    ).stat().st_ino
+
+
+def test_materialize_file_replaces_existing_destination(tmp_path):
+    src = tmp_path / "src.txt"
+    src.write_text("new")
+    dst = tmp_path / "dst.txt"
+    dst.write_text("old")
+    assert materialize_file(src, dst, MaterializeMode.hardlink) in [
+        MaterializeMode.hardlink,
+        MaterializeMode.copy,
+    ]
+    assert dst.read_text() == "new"
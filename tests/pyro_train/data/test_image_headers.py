@@ -0,0 +1,55 @@
+from PIL import Image
+
+from pyro_train.data.image_headers import (
+    find_odd_images,
+    read_image_header,
+    scan_image_headers,
+)
+
+
+def test_read_image_header(tmp_path):
+    filepath = tmp_path / "rotated.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.new("RGB", (120, 80)).save(filepath, exif=exif)
+
+    header = read_image_header(str(filepath))
+
+    assert (header.width, header.height, header.orientation) == (120, 80, 6)
+    assert header.oriented_shape == (80, 120)
+    assert header.is_valid
+
+
+def test_read_image_header_invalid_files(tmp_path):
+    filepath_truncated = tmp_path / "truncated.jpg"
+    Image.new("RGB", (64, 64)).save(filepath_truncated, progressive=True)
+    filepath_truncated.write_bytes(filepath_truncated.read_bytes()[:-20])
+    filepath_corrupt = tmp_path / "corrupt.jpg"
+    filepath_corrupt.write_bytes(b"not a jpeg")
+
+    header_truncated = read_image_header(str(filepath_truncated))
+    header_corrupt = read_image_header(str(filepath_corrupt))
+
+    assert (header_truncated.width, header_truncated.height) == (64, 64)
+    assert header_truncated.truncated
+    assert header_corrupt.error
+    reasons = [
+        reason for _, reason in find_odd_images([header_truncated, header_corrupt])
+    ]
+    assert reasons[0] == "truncated"
+    assert reasons[1].startswith("corrupt")
+
+
+def test_scan_image_headers_uses_cache(tmp_path):
+    filepaths = []
+    for i in range(3):
+        filepath = tmp_path / f"{i}.jpg"
+        Image.new("RGB", (32 + i, 32)).save(filepath)
+        filepaths.append(str(filepath))
+    cache_filepath = tmp_path / "cache" / "image_headers.csv"
+
+    headers = scan_image_headers(filepaths, cache_filepath=cache_filepath, workers=2)
+    headers_cached = scan_image_headers(filepaths, cache_filepath=cache_filepath)
+
+    assert [h.width for h in headers] == [32, 33, 34]
+    assert headers_cached == headers
@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from pyro_train.data.label_index import load_or_build_label_index
+
+
+def make_dataset(dataset_dir):
+    for split, n in [("train", 6), ("val", 2)]:
+        (dataset_dir / split / "images").mkdir(parents=True)
+        (dataset_dir / split / "labels").mkdir(parents=True)
+        for i in range(n):
+            (dataset_dir / split / "images" / f"{i}.jpg").touch()
+            if i % 3:
+                (dataset_dir / split / "labels" / f"{i}.txt").write_text(
+                    "0 0.5 0.5 0.2 0.2\n" * i
+                )
+
+
+def test_load_or_build_label_index(tmp_path):
+    dataset_dir = tmp_path / "datasets"
+    make_dataset(dataset_dir)
+    index_dir = tmp_path / "label_index"
+
+    index = load_or_build_label_index(dataset_dir, index_dir=index_dir, workers=2)
+
+    assert index.n_images == 8
+    assert index.n_boxes == 1 + 2 + 4 + 5 + 1
+    assert index.empty_image_count(split="train") == 2
+    assert index.empty_image_count() == 3
+    i = list(index.image_ids).index("4")
+    assert index.image_boxes(i).shape == (4, 5)
+    hist, _ = index.box_size_histogram(bins=10, split="val")
+    assert hist.sum() == 1
+    assert index.split_stats()["train"]["n_boxes"] == 12
+
+    index_cached = load_or_build_label_index(dataset_dir, index_dir=index_dir)
+    assert isinstance(index_cached.boxes, np.memmap)
+    np.testing.assert_array_equal(index_cached.offsets, index.offsets)
+
+
+def test_load_or_build_label_index_edited_label(tmp_path):
+    dataset_dir = tmp_path / "datasets"
+    make_dataset(dataset_dir)
+    index_dir = tmp_path / "label_index"
+    load_or_build_label_index(dataset_dir, index_dir=index_dir, workers=2)
+    labels_dir = dataset_dir / "train" / "labels"
+    labels_mtime_ns = os.stat(labels_dir).st_mtime_ns
+
+    # Editing a label in place leaves the mtime of its folder unchanged
+    filepath_label = labels_dir / "1.txt"
+    filepath_label.write_text("0 0.5 0.5 0.2 0.2\n" * 3)
+    mtime_ns = os.stat(filepath_label).st_mtime_ns + 10**9
+    os.utime(filepath_label, ns=(mtime_ns, mtime_ns))
+    os.utime(labels_dir, ns=(labels_mtime_ns, labels_mtime_ns))
+
+    index = load_or_build_label_index(dataset_dir, index_dir=index_dir, workers=2)
+    assert index.n_boxes == 3 + 2 + 4 + 5 + 1
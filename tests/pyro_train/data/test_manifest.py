@@ -0,0 +1,41 @@
+import os
+
+from pyro_train.data.file_copy import list_copy_instructions
+from pyro_train.data.manifest import sync_dataset
+
+
+def test_sync_dataset_only_materializes_changes(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for i in range(5):
+        (src_dir / f"{i}.txt").write_text(f"{i}")
+    dataset_dir = tmp_path / "dataset"
+    manifest_filepath = tmp_path / "manifest.json"
+
+    def sync():
+        return sync_dataset(
+            list_copy_instructions(src_dir=src_dir, dst_dir=dataset_dir),
+            dataset_dir=dataset_dir,
+            manifest_filepath=manifest_filepath,
+            workers=2,
+        )
+
+    stats = sync()
+    assert (stats.n_added, stats.n_unchanged) == (5, 0)
+
+    # Only the mtime changes, the content hash is the same
+    os.utime(src_dir / "0.txt", ns=(0, 0))
+    (src_dir / "1.txt").write_text("updated")
+    (src_dir / "2.txt").unlink()
+    (src_dir / "5.txt").write_text("5")
+    stats = sync()
+    assert (stats.n_added, stats.n_replaced, stats.n_deleted, stats.n_unchanged) == (
+        1,
+        1,
+        1,
+        3,
+    )
+    assert sorted(f.name for f in dataset_dir.iterdir()) == sorted(
+        f.name for f in src_dir.iterdir()
+    )
+    assert (dataset_dir / "1.txt").read_text() == "updated"
@@ -0,0 +1,64 @@
+import numpy as np
+from PIL import Image
+
+from pyro_train.data.resize import resize_dataset
+
+
+def make_dataset(dataset_dir, n_images=3):
+    images_dir = dataset_dir / "train" / "images"
+    labels_dir = dataset_dir / "train" / "labels"
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in range(n_images):
+        pixels = rng.integers(0, 255, (120, 200, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(images_dir / f"{i}.jpg")
+        (labels_dir / f"{i}.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+
+
+def test_resize_dataset(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    make_dataset(input_dir)
+
+    resize_dataset(input_dir, output_dir, long_side=100, workers=1)
+
+    with Image.open(output_dir / "train" / "images" / "0.jpg") as im:
+        assert im.size == (100, 60)
+    assert (output_dir / "train" / "labels" / "0.txt").read_text() == (
+        "0 0.5 0.5 0.2 0.2\n"
+    )
+
+
+def test_resize_dataset_new_params(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    make_dataset(input_dir)
+    resize_dataset(input_dir, output_dir, long_side=100, workers=1)
+
+    # The resized images are newer than their sources
+    resize_dataset(input_dir, output_dir, long_side=50, workers=1)
+
+    for i in range(3):
+        with Image.open(output_dir / "train" / "images" / f"{i}.jpg") as im:
+            assert im.size == (50, 30)
+
+
+def test_resize_dataset_removes_stale_files(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    make_dataset(input_dir)
+    resize_dataset(input_dir, output_dir, long_side=100, workers=1)
+
+    (input_dir / "train" / "images" / "1.jpg").unlink()
+    (input_dir / "train" / "labels" / "1.txt").unlink()
+    (input_dir / "train" / "labels" / "2.txt").unlink()
+    resize_dataset(input_dir, output_dir, long_side=100, workers=1)
+
+    assert sorted(p.name for p in (output_dir / "train" / "images").iterdir()) == [
+        "0.jpg",
+        "2.jpg",
+    ]
+    assert sorted(p.name for p in (output_dir / "train" / "labels").iterdir()) == [
+        "0.txt"
+    ]
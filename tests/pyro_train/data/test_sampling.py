@@ -0,0 +1,61 @@
+from pyro_train.data.sampling import draw_nested_samples
+from pyro_train.data.scan import DatasetEntry
+
+
+def make_entries(tmp_path, n: int) -> list[DatasetEntry]:
+    entries = []
+    for i in range(n):
+        label_path = None
+        # One image out of four is a background image
+        if i % 4:
+            label_path = tmp_path / f"{i}.txt"
+            label_path.write_text("0 0.5 0.5 0.1 0.1\n" * (i % 4))
+        entries.append(
+            DatasetEntry(
+                stem=str(i),
+                image_path=str(tmp_path / f"{i}.jpg"),
+                label_path=None if label_path is None else str(label_path),
+            )
+        )
+    return entries
+
+
+def test_draw_nested_samples_stratified(tmp_path):
+    entries = make_entries(tmp_path, n=400)
+    samples = draw_nested_samples(
+        entries,
+        sampling_ratios=[0.05, 0.25],
+        random_seed=0,
+        stratify=True,
+        workers=2,
+    )
+    small = {e.stem for e in samples[0.05]}
+    large = {e.stem for e in samples[0.25]}
+    assert small <= large
+    # 100 images per stratum
+    assert len(small) == 4 * 5
+    assert len(large) == 4 * 25
+    assert sum(1 for e in samples[0.25] if e.label_path is None) == 25
+
+
+def test_draw_nested_samples_is_deterministic(tmp_path):
+    entries = make_entries(tmp_path, n=100)
+    samples = draw_nested_samples(entries, sampling_ratios=[0.1, 0.5], random_seed=3)
+    samples_reversed = draw_nested_samples(
+        reversed(entries), sampling_ratios=[0.1, 0.5], random_seed=3
+    )
+    for ratio in [0.1, 0.5]:
+        assert {e.stem for e in samples[ratio]} == {
+            e.stem for e in samples_reversed[ratio]
+        }
+    assert {e.stem for e in samples[0.1]} <= {e.stem for e in samples[0.5]}
+
+
+def test_draw_nested_samples_has_exact_sizes(tmp_path):
+    entries = make_entries(tmp_path, n=1000)
+    samples = draw_nested_samples(
+        entries, sampling_ratios=[0.013, 0.1, 0.37], random_seed=0
+    )
+    assert [len(samples[r]) for r in [0.013, 0.1, 0.37]] == [13, 100, 370]
+    assert {e.stem for e in samples[0.013]} <= {e.stem for e in samples[0.1]}
+    assert {e.stem for e in samples[0.1]} <= {e.stem for e in samples[0.37]}
@@ -0,0 +1,25 @@
+from pyro_train.data.scan import sampling_key, scan_split
+
+
+def test_scan_split_joins_images_and_labels(tmp_path):
+    images_dir = tmp_path / "images"
+    labels_dir = tmp_path / "labels"
+    images_dir.mkdir()
+    labels_dir.mkdir()
+    for stem in ["a", "b", "c"]:
+        (images_dir / f"{stem}.jpg").touch()
+    (images_dir / "notes.md").touch()
+    (labels_dir / "a.txt").touch()
+    (labels_dir / "orphan.txt").touch()
+
+    entries = {e.stem: e for e in scan_split(images_dir, labels_dir)}
+
+    assert sorted(entries) == ["a", "b", "c"]
+    assert entries["a"].label_path == str(labels_dir / "a.txt")
+    assert entries["b"].label_path is None
+
+
+def test_sampling_key_is_deterministic():
+    assert sampling_key("frame_0", random_seed=1) == sampling_key("frame_0", 1)
+    assert sampling_key("frame_0", random_seed=1) != sampling_key("frame_0", 2)
+    assert 0 <= sampling_key("frame_0") < 1
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from pyro_train.data.scan import scan_split
+from pyro_train.data.shards import ShardReader, write_dataset_shards, write_shards
+
+
+def test_write_and_read_shards(tmp_path):
+    images_dir, labels_dir = tmp_path / "images", tmp_path / "labels"
+    images_dir.mkdir()
+    labels_dir.mkdir()
+    for i in range(5):
+        Image.new("RGB", (40 + i, 30)).save(images_dir / f"img_{i}.jpg")
+    (labels_dir / "img_1.txt").write_text("0 0.5 0.5 0.1 0.2\n0 0.1 0.1 0.1 0.1\n")
+    entries = sorted(scan_split(images_dir=images_dir, labels_dir=labels_dir))
+
+    n_shards = write_shards(entries, tmp_path / "shards", shard_size=1)
+    reader = ShardReader(tmp_path / "shards")
+
+    assert n_shards == 5
+    assert len(reader) == 5
+    assert list(reader.names) == [f"img_{i}.jpg" for i in range(5)]
+    for i in range(5):
+        assert (
+            bytes(reader.image_bytes(i)) == (images_dir / f"img_{i}.jpg").read_bytes()
+        )
+    assert reader.shapes[3].tolist() == [30, 43]
+    assert reader.image_boxes(0).shape == (0, 5)
+    np.testing.assert_allclose(reader.image_boxes(1)[0], [0, 0.5, 0.5, 0.1, 0.2])
+
+
+def test_write_dataset_shards_edited_label(tmp_path):
+    dataset_dir = tmp_path / "datasets"
+    images_dir = dataset_dir / "train" / "images"
+    labels_dir = dataset_dir / "train" / "labels"
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir(parents=True)
+    Image.new("RGB", (40, 30)).save(images_dir / "img_0.jpg")
+    filepath_label = labels_dir / "img_0.txt"
+    filepath_label.write_text("0 0.5 0.5 0.1 0.2\n")
+    write_dataset_shards(dataset_dir, tmp_path / "shards", splits=["train"])
+    labels_mtime_ns = os.stat(labels_dir).st_mtime_ns
+
+    # Editing a label in place leaves the mtime of its folder unchanged
+    filepath_label.write_text("0 0.5 0.5 0.1 0.2\n0 0.1 0.1 0.1 0.1\n")
+    mtime_ns = os.stat(filepath_label).st_mtime_ns + 10**9
+    os.utime(filepath_label, ns=(mtime_ns, mtime_ns))
+    os.utime(labels_dir, ns=(labels_mtime_ns, labels_mtime_ns))
+    write_dataset_shards(dataset_dir, tmp_path / "shards", splits=["train"])
+
+    assert ShardReader(tmp_path / "shards" / "train").image_boxes(0).shape == (2, 5)
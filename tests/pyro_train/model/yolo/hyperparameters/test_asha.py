@@ -0,0 +1,84 @@
+from functools import partial
+from types import SimpleNamespace
+
+from pyro_train.model.yolo.hyperparameters.asha import (
+    ASHA_STOP_FILENAME,
+    RungStore,
+    make_asha_callback,
+    rung_epochs,
+)
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+
+
+def test_rung_epochs():
+    assert rung_epochs(min_epochs=5, max_epochs=100, reduction_factor=3) == [5, 15, 45]
+    assert rung_epochs(min_epochs=10, max_epochs=10, reduction_factor=3) == []
+
+
+def test_record_and_decide(tmp_path):
+    store = RungStore(tmp_path / "search.sqlite")
+    record_and_decide = partial(
+        store.record_and_decide,
+        reduction_factor=2,
+        fidelity=Fidelity.full,
+        data_fingerprint="data",
+    )
+
+    # The first trials reaching a rung continue, later ones have to beat
+    # the top 1 / reduction_factor of the rung.
+    assert record_and_decide("a", rung=5, fitness=0.5)
+    assert not record_and_decide("b", rung=5, fitness=0.2)
+    assert record_and_decide("c", rung=5, fitness=0.6)
+    assert record_and_decide("d", rung=15, fitness=0.1)
+    assert store.rung_results(5, fidelity=Fidelity.full, data_fingerprint="data") == {
+        "a": 0.5,
+        "b": 0.2,
+        "c": 0.6,
+    }
+
+
+def test_record_and_decide_by_fidelity_and_dataset(tmp_path):
+    store = RungStore(tmp_path / "search.sqlite")
+    record_and_decide = partial(store.record_and_decide, rung=5, reduction_factor=2)
+
+    assert record_and_decide(
+        "a", fitness=0.8, fidelity=Fidelity.full, data_fingerprint="full"
+    )
+    # Trials are not cut against the trials of another fidelity or dataset
+    assert record_and_decide(
+        "b", fitness=0.2, fidelity=Fidelity.screening, data_fingerprint="small"
+    )
+    assert record_and_decide(
+        "c", fitness=0.3, fidelity=Fidelity.full, data_fingerprint="small"
+    )
+    assert not record_and_decide(
+        "d", fitness=0.1, fidelity=Fidelity.screening, data_fingerprint="small"
+    )
+
+
+def test_asha_callback_saves_the_stop(tmp_path):
+    callback = make_asha_callback(
+        RungStore(tmp_path / "search.sqlite"),
+        trial_id="a",
+        rungs=[2],
+        reduction_factor=2,
+        fidelity=Fidelity.full,
+        data_fingerprint="full",
+    )
+    RungStore(tmp_path / "search.sqlite").record_and_decide(
+        "b",
+        rung=2,
+        fitness=0.8,
+        reduction_factor=2,
+        fidelity=Fidelity.full,
+        data_fingerprint="full",
+    )
+    trainer = SimpleNamespace(epoch=0, fitness=0.1, save_dir=tmp_path, stop=False)
+
+    callback(trainer)
+    assert not trainer.stop
+    trainer.epoch = 1
+    callback(trainer)
+
+    assert trainer.stop
+    assert (tmp_path / ASHA_STOP_FILENAME).exists()
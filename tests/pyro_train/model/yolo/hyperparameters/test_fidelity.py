@@ -0,0 +1,24 @@
+from pyro_train.model.yolo.hyperparameters.fidelity import (
+    ScreeningConfig,
+    make_screening_configuration,
+    select_top_k,
+)
+
+
+def test_make_screening_configuration():
+    configuration = {"imgsz": 1024, "epochs": 50, "lr0": 0.01}
+
+    screening_configuration = make_screening_configuration(
+        configuration, ScreeningConfig(imgsz_factor=0.3, epochs_factor=0.25)
+    )
+
+    assert screening_configuration == {"imgsz": 320, "epochs": 13, "lr0": 0.01}
+    assert configuration["imgsz"] == 1024
+    assert make_screening_configuration(
+        {"imgsz": 64, "epochs": 2}, ScreeningConfig(imgsz_factor=0.1, epochs_factor=0.1)
+    ) == {"imgsz": 32, "epochs": 1}
+
+
+def test_select_top_k():
+    assert select_top_k({0: 0.1, 1: 0.5, 2: 0.3, 3: 0.5}, k=3) == [1, 3, 2]
+    assert select_top_k({0: 0.1}, k=3) == [0]
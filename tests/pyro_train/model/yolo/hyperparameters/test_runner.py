@@ -0,0 +1,82 @@
+import pytest
+import torch
+
+from pyro_train.model.yolo.hyperparameters import runner
+from pyro_train.model.yolo.hyperparameters.asha import ASHA_STOP_FILENAME
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialResult,
+    TrialStatus,
+    WorkerSlot,
+)
+from pyro_train.model.yolo.hyperparameters.store import TrialState, TrialStore
+
+
+def test_can_resume(tmp_path):
+    torch.save({"epoch": 3, "optimizer": {"state": {}}}, tmp_path / "last.pt")
+    torch.save({"epoch": -1, "optimizer": None}, tmp_path / "stripped.pt")
+
+    assert runner.can_resume(tmp_path / "last.pt")
+    assert not runner.can_resume(tmp_path / "stripped.pt")
+
+
+def test_run_trial_of_an_ended_run(tmp_path, monkeypatch):
+    # The run was stopped early after 2 of its 10 epochs, its last.pt stripped
+    run_dir = tmp_path / "runs" / "search_0"
+    (run_dir / "weights").mkdir(parents=True)
+    (run_dir / "results.csv").write_text(
+        "epoch, metrics/mAP50(B), metrics/mAP50-95(B)\n1, 0.5, 0.2\n2, 0.6, 0.3\n"
+    )
+    torch.save({"epoch": -1, "optimizer": None}, run_dir / "weights" / "last.pt")
+    store = TrialStore(tmp_path / "search.sqlite")
+    store.add("key", experiment_name="search_0", config={}, data_fingerprint="data")
+
+    def train(**kwargs):
+        pytest.fail("the ended run should not be trained again")
+
+    monkeypatch.setattr(runner, "train", train)
+    monkeypatch.setattr(runner, "load_pretrained_model", train)
+    runner.run_trial(
+        Trial(
+            trial_id="key",
+            params={"model_type": "yolov8n.pt", "epochs": 10},
+            data_yaml_path=tmp_path / "data.yaml",
+            project=str(tmp_path / "runs"),
+            experiment_name="search_0",
+        ),
+        slot=WorkerSlot(index=0, device=None),
+        filepath_store=tmp_path / "search.sqlite",
+    )
+
+
+def test_record_result_of_a_stopped_trial(tmp_path):
+    run_dir = tmp_path / "runs" / "search_0"
+    run_dir.mkdir(parents=True)
+    (run_dir / "results.csv").write_text(
+        "epoch, metrics/mAP50(B), metrics/mAP50-95(B)\n1, 0.5, 0.2\n"
+    )
+    (run_dir / ASHA_STOP_FILENAME).write_text('{"rung": 1, "fitness": 0.23}')
+    store = TrialStore(tmp_path / "search.sqlite")
+    store.add("key", experiment_name="search_0", config={}, data_fingerprint="data")
+    trial = Trial(
+        trial_id="key",
+        params={"epochs": 10},
+        data_yaml_path=tmp_path / "data.yaml",
+        project=str(tmp_path / "runs"),
+        experiment_name="search_0",
+    )
+
+    runner.record_result(
+        store,
+        TrialResult(
+            trial=trial,
+            status=TrialStatus.completed,
+            exitcode=0,
+            device=None,
+            duration_seconds=1.0,
+        ),
+    )
+
+    record = store.get("key")
+    assert record.state == TrialState.stopped
+    assert record.metrics["n_epochs"] == 1
@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialStatus,
+    WorkerSlot,
+    make_slots,
+    run_trials,
+)
+
+
+def _run_trial(trial: Trial, slot: WorkerSlot) -> None:
+    if trial.params["crash"]:
+        raise RuntimeError("invalid configuration")
+    output = Path(trial.project) / f"{trial.trial_id}.txt"
+    output.write_text(f"{slot.device} {os.environ['OMP_NUM_THREADS']}")
+
+
+def test_make_slots():
+    slots = make_slots(n_jobs=3, devices=["0", "1"], threads_per_trial=2)
+
+    assert [slot.device for slot in slots] == ["0", "1", "0"]
+    assert all(slot.n_threads == 2 for slot in slots)
+
+
+def test_run_trials_isolates_crashes(tmp_path):
+    trials = [
+        Trial(
+            trial_id=str(i),
+            params={"crash": i == 1},
+            data_yaml_path=tmp_path / "data.yaml",
+            project=str(tmp_path),
+            experiment_name=f"trial_{i}",
+        )
+        for i in range(3)
+    ]
+    slots = [WorkerSlot(index=i, device=f"dev{i}", cpus=[0]) for i in range(2)]
+
+    results = run_trials(trials, run_trial=_run_trial, slots=slots)
+
+    statuses = {r.trial.trial_id: r.status for r in results}
+    assert statuses == {
+        "0": TrialStatus.completed,
+        "1": TrialStatus.failed,
+        "2": TrialStatus.completed,
+    }
+    assert (tmp_path / "0.txt").read_text() == "dev0 1"
+    assert (tmp_path / "2.txt").exists()
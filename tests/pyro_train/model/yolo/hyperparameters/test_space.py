@@ -0,0 +1,90 @@
+import numpy as np
+
+from pyro_train.model.yolo.hyperparameters.space import (
+    HyperparameterSpace,
+    configuration_at,
+    configurations_from_value_indices,
+    decode_index,
+    draw_n_unique_configurations,
+    draw_strided_grid,
+    draw_value_indices,
+    encode_index,
+    iterate_grid,
+)
+
+
+def make_hyperparameter_space() -> HyperparameterSpace:
+    return HyperparameterSpace(
+        space={
+            "optimizer": np.array(["SGD", "AdamW"]),
+            "imgsz": np.array([640, 1024, 1280]),
+            "lr0": np.logspace(-4, -2, 4),
+        }
+    )
+
+
+def test_index_decoding():
+    hyperparameter_space = make_hyperparameter_space()
+
+    assert hyperparameter_space.size == 24
+    assert decode_index(hyperparameter_space, 23) == [1, 2, 3]
+    assert all(
+        encode_index(hyperparameter_space, decode_index(hyperparameter_space, i)) == i
+        for i in range(24)
+    )
+    assert configuration_at(hyperparameter_space, 7) == {
+        "optimizer": "SGD",
+        "imgsz": 1024,
+        "lr0": 0.01,
+    }
+    configurations = list(iterate_grid(hyperparameter_space))
+    assert len({tuple(c.values()) for c in configurations}) == 24
+    assert len(draw_strided_grid(hyperparameter_space, n=5)) == 5
+    assert len(draw_strided_grid(hyperparameter_space, n=30)) == 24
+
+
+def test_draw_strided_grid_spreads_every_key():
+    hyperparameter_space = HyperparameterSpace(
+        space={f"key_{i}": np.arange(4 + 2 * i) for i in range(6)}
+    )
+
+    configurations = draw_strided_grid(hyperparameter_space, n=12, random_seed=1)
+
+    assert len({tuple(c.values()) for c in configurations}) == 12
+    for i in range(6):
+        values = [c[f"key_{i}"] for c in configurations]
+        assert len(set(values)) == min(12, 4 + 2 * i)
+        assert max(values.count(v) for v in values) <= 3
+    assert configurations == draw_strided_grid(
+        hyperparameter_space, n=12, random_seed=1
+    )
+
+
+def test_draw_n_unique_configurations():
+    hyperparameter_space = make_hyperparameter_space()
+
+    configurations = draw_n_unique_configurations(hyperparameter_space, n=30)
+
+    assert len(configurations) == 24
+    assert len({tuple(c.values()) for c in configurations}) == 24
+    assert configurations == draw_n_unique_configurations(hyperparameter_space, n=30)
+
+
+def test_draw_in_huge_spaces():
+    hyperparameter_space = HyperparameterSpace(
+        space={f"key_{i}": np.arange(100) for i in range(12)}
+    )
+
+    configurations = draw_n_unique_configurations(hyperparameter_space, n=10)
+    value_indices = draw_value_indices(
+        hyperparameter_space, n=1000, rng=np.random.default_rng(0)
+    )
+
+    assert hyperparameter_space.size == 100**12
+    assert len({tuple(c.values()) for c in configurations}) == 10
+    assert value_indices.shape == (1000, 12)
+    assert value_indices.max() < 100
+    assert (
+        len(configurations_from_value_indices(hyperparameter_space, value_indices))
+        == 1000
+    )
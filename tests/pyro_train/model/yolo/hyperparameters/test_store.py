@@ -0,0 +1,75 @@
+import sqlite3
+
+from pyro_train.model.yolo.hyperparameters.fidelity import Fidelity
+from pyro_train.model.yolo.hyperparameters.store import (
+    TrialState,
+    TrialStore,
+    make_trial_key,
+)
+
+
+def test_make_trial_key():
+    key = make_trial_key({"lr0": 0.01, "batch": 16}, "data")
+
+    assert key == make_trial_key({"batch": 16, "lr0": 0.01}, "data")
+    assert key != make_trial_key({"batch": 16, "lr0": 0.01}, "other_data")
+
+
+def test_trial_store(tmp_path):
+    store = TrialStore(tmp_path / "search.sqlite")
+    config = {"lr0": 0.01}
+    key = make_trial_key(config, "data")
+
+    record = store.add(
+        key, experiment_name="search_0", config=config, data_fingerprint="data"
+    )
+    store.set_state(key, TrialState.completed, metrics={"fitness": 0.5})
+    # Adding the same trial again keeps its state
+    record_again = TrialStore(tmp_path / "search.sqlite").add(
+        key, experiment_name="search_1", config=config, data_fingerprint="data"
+    )
+
+    assert record.state == TrialState.pending
+    assert record_again.state == TrialState.completed
+    assert record_again.experiment_name == "search_0"
+    assert record_again.metrics == {"fitness": 0.5}
+    assert store.count_by_state() == {"completed": 1}
+
+
+def test_trial_store_fidelity(tmp_path):
+    filepath = tmp_path / "search.sqlite"
+    # Store created before the fidelity column was added
+    connection = sqlite3.connect(filepath)
+    connection.execute(
+        """
+        CREATE TABLE trials (
+            trial_key TEXT PRIMARY KEY,
+            experiment_name TEXT NOT NULL,
+            config TEXT NOT NULL,
+            data_fingerprint TEXT NOT NULL,
+            state TEXT NOT NULL,
+            metrics TEXT NOT NULL DEFAULT '{}',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    connection.execute(
+        "INSERT INTO trials "
+        "VALUES ('old', 'search_old', '{}', 'data', 'completed', '{}', 0, 0)"
+    )
+    connection.commit()
+    connection.close()
+
+    store = TrialStore(filepath)
+    store.add(
+        "new",
+        "search_new",
+        config={},
+        data_fingerprint="small",
+        fidelity=Fidelity.screening,
+    )
+
+    assert store.get("old").fidelity == Fidelity.full
+    assert store.get("new").fidelity == Fidelity.screening
+    assert [r.trial_key for r in store.list([TrialState.pending])] == ["new"]
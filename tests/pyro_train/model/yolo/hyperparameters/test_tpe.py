@@ -0,0 +1,134 @@
+import numpy as np
+
+from pyro_train.data.utils import yaml_write
+from pyro_train.model.yolo.hyperparameters.space import HyperparameterSpace
+from pyro_train.model.yolo.hyperparameters.tpe import (
+    Observation,
+    load_run_observations,
+    suggest_configurations,
+    suggest_value_indices,
+    value_indices_of_configuration,
+)
+
+
+def make_hyperparameter_space() -> HyperparameterSpace:
+    return HyperparameterSpace(
+        space={
+            "model_type": np.array(["yolov8n.pt", "yolov8s.pt"]),
+            "lr0": np.logspace(-5, -1, 9),
+        }
+    )
+
+
+def test_value_indices_of_configuration():
+    hyperparameter_space = make_hyperparameter_space()
+
+    assert value_indices_of_configuration(
+        hyperparameter_space, {"model_type": "yolov8s.pt", "lr0": 0.0011}
+    ) == [1, 4]
+    assert (
+        value_indices_of_configuration(
+            hyperparameter_space, {"model_type": "yolov9c.pt", "lr0": 0.001}
+        )
+        is None
+    )
+    assert value_indices_of_configuration(hyperparameter_space, {"lr0": 0.001}) is None
+
+
+def test_load_run_observations(tmp_path):
+    hyperparameter_space = make_hyperparameter_space()
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    yaml_write(
+        to=run_dir / "args.yaml",
+        data={"model": "/weights/yolov8n.pt", "lr0": 0.01, "epochs": 2},
+    )
+    (run_dir / "results.csv").write_text(
+        "epoch, metrics/mAP50(B), metrics/mAP50-95(B)\n1, 0.5, 0.2\n2, 0.6, 0.3\n"
+    )
+    (tmp_path / "empty").mkdir()
+
+    observations = load_run_observations(hyperparameter_space, tmp_path)
+
+    assert len(observations) == 1
+    assert observations[0].value_indices == [0, 6]
+    assert np.isclose(observations[0].fitness, 0.1 * 0.6 + 0.9 * 0.3)
+
+
+def test_load_run_observations_of_the_search(tmp_path):
+    hyperparameter_space = HyperparameterSpace(
+        space={
+            "model_type": np.array(["yolov8n.pt"]),
+            "epochs": np.array([40, 50]),
+        }
+    )
+    data_yaml_path = tmp_path / "full" / "data.yaml"
+    for name, data, epochs in [
+        ("full", data_yaml_path, 50),
+        ("small", tmp_path / "small" / "data.yaml", 50),
+        ("screening", data_yaml_path, 13),
+    ]:
+        run_dir = tmp_path / "runs" / name
+        run_dir.mkdir(parents=True)
+        yaml_write(
+            to=run_dir / "args.yaml",
+            data={"model": "yolov8n.pt", "data": str(data), "epochs": epochs},
+        )
+        (run_dir / "results.csv").write_text(
+            "epoch, metrics/mAP50(B), metrics/mAP50-95(B)\n1, 0.5, 0.2\n"
+        )
+
+    observations = load_run_observations(
+        hyperparameter_space, tmp_path / "runs", data_yaml_path=data_yaml_path
+    )
+
+    assert [o.value_indices for o in observations] == [[0, 1]]
+
+
+def test_suggestions_concentrate_near_good_observations():
+    hyperparameter_space = HyperparameterSpace(
+        space={
+            "model_type": np.array(["yolov8n.pt", "yolov8s.pt"]),
+            "lr0": np.logspace(-5, -1, 17),
+        }
+    )
+    # Fitness peaks for the small model at the lr0 index 12
+    observations = [
+        Observation([m, i], fitness=1.0 - abs(i - 12) / 16 - 0.5 * (m == 0))
+        for m in range(2)
+        for i in range(0, 17, 2)
+    ]
+
+    suggestions = np.array(
+        [
+            suggest_value_indices(
+                hyperparameter_space, observations, rng=np.random.default_rng(seed)
+            )
+            for seed in range(20)
+        ]
+    )
+
+    assert np.mean(suggestions[:, 0] == 1) >= 0.8
+    assert np.mean(np.abs(suggestions[:, 1] - 12)) <= 2
+
+
+def test_suggest_configurations_excludes_tried_ones():
+    hyperparameter_space = make_hyperparameter_space()
+    observations = [Observation([1, i], fitness=i / 8) for i in range(9)]
+    tried = {tuple(o.value_indices) for o in observations}
+
+    configurations = suggest_configurations(
+        hyperparameter_space,
+        observations,
+        n=12,
+        rng=np.random.default_rng(0),
+        excluded=tried,
+    )
+
+    indices = {
+        tuple(value_indices_of_configuration(hyperparameter_space, c))
+        for c in configurations
+    }
+    # Only the 9 configurations of the nano model are left
+    assert len(configurations) == 9
+    assert indices == {(0, i) for i in range(9)}
@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import time
+from functools import partial
+from pathlib import Path
+
+from pyro_train.model.yolo.hyperparameters.scheduler import (
+    Trial,
+    TrialStatus,
+    WorkerSlot,
+)
+from pyro_train.model.yolo.hyperparameters.trial_queue import (
+    TrialQueue,
+    run_queued_trials,
+    run_worker,
+    trial_to_dict,
+)
+
+
+def _claim_all(queue_dir: Path) -> list[str]:
+    queue = TrialQueue(queue_dir)
+    claimed = []
+    while (claim := queue.claim()) is not None:
+        claimed.append(claim[0])
+    return claimed
+
+
+def _run_trial(trial: Trial, slot: WorkerSlot, suffix: str) -> None:
+    if trial.params["crash"]:
+        raise RuntimeError("invalid configuration")
+    output = Path(trial.project) / f"{trial.trial_id}.txt"
+    output.write_text(f"{slot.device}{suffix}")
+
+
+def _make_run_trial(options: dict):
+    return partial(_run_trial, suffix=options["suffix"])
+
+
+def _work(queue_dir: Path, device: str) -> None:
+    run_worker(
+        TrialQueue(queue_dir),
+        make_run_trial=_make_run_trial,
+        slots=[WorkerSlot(index=0, device=device, cpus=[0])],
+        poll_seconds=0.1,
+        heartbeat_seconds=0.5,
+        max_idle_seconds=2.0,
+    )
+
+
+def test_claims_are_exclusive(tmp_path):
+    queue = TrialQueue(tmp_path)
+    for i in range(40):
+        queue.put(str(i), {"i": i})
+
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        claims = pool.map(_claim_all, [tmp_path] * 4)
+
+    claimed = [trial_id for c in claims for trial_id in c]
+    assert sorted(claimed, key=int) == [str(i) for i in range(40)]
+    assert queue.count() == {"pending": 0, "claimed": 40, "done": 0}
+
+
+def test_stale_claims_are_requeued(tmp_path):
+    queue = TrialQueue(tmp_path)
+    queue.put("a", {"i": 0})
+    trial_id, spec = queue.claim()
+    stale = time.time() - 100
+    os.utime(tmp_path / "claimed" / "a.json", (stale, stale))
+
+    assert queue.requeue_stale(stale_after_seconds=200) == []
+    assert queue.requeue_stale(stale_after_seconds=50) == ["a"]
+    assert not queue.heartbeat("a")
+    assert not queue.complete("a", {"status": "completed"})
+    assert queue.claim() == ("a", {"i": 0})
+    assert queue.complete("a", {"status": "completed"})
+    assert queue.result("a") == {"status": "completed"}
+
+
+def test_complete_holds_the_claim(tmp_path):
+    queue = TrialQueue(tmp_path)
+    queue.put("a", {"i": 0})
+    queue.claim()
+    write = queue._write
+
+    def write_after_requeue(subdir, trial_id, data):
+        # The claim of a slow node can turn stale while it completes
+        assert queue.requeue_stale(stale_after_seconds=0) == []
+        write(subdir, trial_id, data)
+
+    queue._write = write_after_requeue
+    assert queue.complete("a", {"status": "completed"})
+    assert queue.count() == {"pending": 0, "claimed": 0, "done": 1}
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_trial_paths_are_absolute(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trial = Trial(
+        trial_id="a",
+        params={},
+        data_yaml_path=Path("data.yaml"),
+        project="runs",
+        experiment_name="trial_a",
+    )
+
+    data = trial_to_dict(trial)
+
+    assert data["data_yaml_path"] == str(tmp_path / "data.yaml")
+    assert data["project"] == str(tmp_path / "runs")
+
+
+def test_local_workers_run_queued_trials(tmp_path):
+    queue_dir = tmp_path / "queue"
+    trials = [
+        Trial(
+            trial_id=str(i),
+            params={"crash": i == 1},
+            data_yaml_path=tmp_path / "data.yaml",
+            project=str(tmp_path),
+            experiment_name=f"trial_{i}",
+        )
+        for i in range(4)
+    ]
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_work, args=(queue_dir, f"dev{i}")) for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+
+    results = run_queued_trials(
+        trials,
+        TrialQueue(queue_dir),
+        options={"suffix": "!"},
+        poll_seconds=0.1,
+    )
+    for worker in workers:
+        worker.join()
+
+    statuses = {r.trial.trial_id: r.status for r in results}
+    assert statuses == {
+        "0": TrialStatus.completed,
+        "1": TrialStatus.failed,
+        "2": TrialStatus.completed,
+        "3": TrialStatus.completed,
+    }
+    assert (tmp_path / "0.txt").read_text() in {"dev0!", "dev1!"}
+    assert TrialQueue(queue_dir).count() == {"pending": 0, "claimed": 0, "done": 4}
@@ -0,0 +1,58 @@
+import pytest
+from ultralytics.nn.tasks import yaml_model_load
+
+from pyro_train.model.yolo.batch_tuning import (
+    BatchProbe,
+    candidate_batch_sizes,
+    effective_batch_size,
+    extrapolate_memory_mb,
+    measure_batch,
+    scale_lr0,
+    select_batch_size,
+)
+from pyro_train.utils import peak_rss_mb
+
+
+def test_candidate_batch_sizes():
+    assert candidate_batch_sizes(2) == [2]
+    assert candidate_batch_sizes(128) == [2, 4, 8, 16, 32, 64, 128]
+
+
+def test_extrapolate_memory_mb():
+    probes = [BatchProbe(batch=2, images_per_second=10.0, peak_memory_mb=1000.0)]
+    assert extrapolate_memory_mb(probes, batch=4) is None
+
+    probes.append(BatchProbe(batch=4, images_per_second=12.0, peak_memory_mb=1200.0))
+    assert extrapolate_memory_mb(probes, batch=8) == 1600.0
+
+
+def test_select_batch_size_requires_a_min_gain():
+    probes = [
+        BatchProbe(batch=2, images_per_second=10.0, peak_memory_mb=1000.0),
+        BatchProbe(batch=4, images_per_second=15.0, peak_memory_mb=1100.0),
+        BatchProbe(batch=8, images_per_second=15.5, peak_memory_mb=1300.0),
+        BatchProbe(batch=16, images_per_second=14.0, peak_memory_mb=1700.0),
+    ]
+
+    assert select_batch_size(probes, min_gain=0.05) == 4
+    assert select_batch_size(probes, min_gain=0.0) == 8
+
+
+def test_scale_lr0_follows_the_effective_batch_size():
+    assert effective_batch_size(8) == 64
+    assert effective_batch_size(24) == 72
+    # Batches below the nominal batch size accumulate their gradients
+    assert scale_lr0(0.01, batch=32, reference_batch=16) == pytest.approx(0.01)
+    assert scale_lr0(0.01, batch=128, reference_batch=16) == pytest.approx(0.02)
+
+
+def test_measure_batch_excludes_the_baseline_rss_on_cpu():
+    model_cfg = yaml_model_load("yolo11n.yaml")
+    probe = measure_batch(
+        model_cfg, imgsz=64, batch=2, device="cpu", n_warmup=1, n_iterations=1
+    )
+
+    assert probe.batch == 2
+    assert probe.images_per_second > 0
+    # The interpreter and torch already use more than the probe adds
+    assert 0 < probe.peak_memory_mb < peak_rss_mb()
@@ -0,0 +1,53 @@
+import pyro_train.model.yolo.benchmark as benchmark
+from pyro_train.data.utils import yaml_write
+
+
+def write_run(train_dir, lr0: float, n_epochs: int) -> None:
+    train_dir.mkdir(exist_ok=True)
+    yaml_write(to=train_dir / "args.yaml", data={"lr0": lr0})
+    lines = ["epoch,fitness"] + [f"{i},{i / 10}" for i in range(1, n_epochs + 1)]
+    (train_dir / "results.csv").write_text("\n".join(lines) + "\n")
+
+
+def test_make_benchmark_reads_only_changed_runs(tmp_path, monkeypatch):
+    input_dir = tmp_path / "runs"
+    input_dir.mkdir()
+    filepath_cache = tmp_path / "cache.pkl"
+    write_run(input_dir / "a", lr0=0.01, n_epochs=2)
+    write_run(input_dir / "b", lr0=0.001, n_epochs=1)
+    (input_dir / "incomplete").mkdir()
+    read_dirs = []
+    read_run = benchmark.read_run
+    monkeypatch.setattr(
+        benchmark,
+        "read_run",
+        lambda train_dir: read_dirs.append(train_dir.name) or read_run(train_dir),
+    )
+
+    df_first = benchmark.make_benchmark(input_dir, filepath_cache=filepath_cache)
+    df_cached = benchmark.make_benchmark(input_dir, filepath_cache=filepath_cache)
+    write_run(input_dir / "b", lr0=0.001, n_epochs=3)
+    write_run(input_dir / "c", lr0=0.1, n_epochs=1)
+    df_updated = benchmark.make_benchmark(input_dir, filepath_cache=filepath_cache)
+    (input_dir / "a" / "weights").mkdir()
+    (input_dir / "a" / "weights" / "best.pt").write_bytes(b"weights")
+    benchmark.make_benchmark(input_dir, filepath_cache=filepath_cache)
+
+    assert sorted(read_dirs) == ["a", "a", "b", "b", "c"]
+    assert df_first.equals(df_cached)
+    assert df_first["lr0"].tolist() == ["0.01", "0.01", "0.001"]
+    assert df_updated["lr0"].tolist() == ["0.01", "0.01"] + ["0.001"] * 3 + ["0.1"]
+    assert df_updated.equals(benchmark.make_benchmark(input_dir))
+
+
+def test_read_run_adds_the_throughput_of_the_epochs(tmp_path):
+    write_run(tmp_path, lr0=0.01, n_epochs=3)
+    # The second epoch was trained again after a resume
+    (tmp_path / "throughput.csv").write_text(
+        "epoch,images_per_second\n1,10.0\n2,11.0\n2,12.0\n"
+    )
+
+    df_results, _, _ = benchmark.read_run(tmp_path)
+
+    assert df_results["throughput/images_per_second"].tolist()[:2] == [10.0, 12.0]
+    assert df_results["throughput/images_per_second"].isna().tolist()[2]
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from pyro_train.model.yolo.benchmark import CachedRun
+from pyro_train.model.yolo.benchmark_store import (
+    best_epochs,
+    load_benchmark_store,
+    pareto_runs,
+    top_k_runs,
+    write_benchmark_store,
+)
+
+
+def make_run(imgsz: int, weights_size: int, map50_95: list[float]) -> CachedRun:
+    return CachedRun(
+        signature=(),
+        df_results=pd.DataFrame(
+            {
+                "  epoch": range(1, len(map50_95) + 1),
+                "  metrics/mAP50(B)": [m + 0.2 for m in map50_95],
+                "  metrics/mAP50-95(B)": map50_95,
+            }
+        ),
+        args={"imgsz": imgsz, "single_cls": True, "device": None, "classes": [0]},
+        weights_size=weights_size,
+    )
+
+
+def test_benchmark_store(tmp_path):
+    runs = {
+        "a": make_run(640, 6_000_000, [0.1, 0.3, 0.2]),
+        "b": make_run(1024, 6_000_000, [0.2, 0.4]),
+        "c": make_run(1024, 20_000_000, [0.35]),
+        "d": make_run(320, 6_000_000, [0.05]),
+    }
+    filepath_store = tmp_path / "benchmark.sqlite"
+
+    write_benchmark_store(runs, filepath_store)
+    df_runs, df_epochs = load_benchmark_store(filepath_store)
+
+    assert df_runs["imgsz"].tolist() == [640, 1024, 1024, 320]
+    assert df_runs["classes"].tolist() == ["[0]"] * 4
+    assert df_runs["weights_size_mb"].tolist() == [6.0, 6.0, 20.0, 6.0]
+    assert len(df_epochs) == 7
+    assert df_epochs.loc[1, "fitness"] == 0.1 * 0.5 + 0.9 * 0.3
+
+    df_best = best_epochs(df_epochs, metric="metrics/mAP50-95(B)")
+    assert df_best[["run", "epoch"]].values.tolist() == [
+        ["a", 2],
+        ["b", 2],
+        ["c", 1],
+        ["d", 1],
+    ]
+    assert top_k_runs(df_runs, df_epochs, k=2)["run"].tolist() == ["b", "c"]
+    # c is dominated by b, larger for a lower fitness
+    assert pareto_runs(df_runs, df_epochs)["run"].tolist() == ["d", "a", "b"]
@@ -0,0 +1,53 @@
+from pyro_train.model.yolo.dataloader_tuning import (
+    DataloaderProbe,
+    DataloaderSettings,
+    candidate_workers,
+    keep_workers,
+    select_settings,
+    time_dataloader,
+)
+
+
+def test_candidate_workers():
+    assert candidate_workers(1) == [0, 1]
+    assert candidate_workers(8) == [0, 1, 2, 4, 8]
+    assert candidate_workers(6) == [0, 1, 2, 4]
+
+
+def test_select_settings_requires_a_min_gain():
+    probes = [
+        DataloaderProbe(DataloaderSettings(workers=0), images_per_second=100.0),
+        DataloaderProbe(DataloaderSettings(workers=2), images_per_second=105.0),
+        DataloaderProbe(DataloaderSettings(workers=4), images_per_second=150.0),
+        DataloaderProbe(
+            DataloaderSettings(workers=0, cache="ram"), images_per_second=160.0
+        ),
+    ]
+
+    assert select_settings(probes, min_gain=0.1) == DataloaderSettings(workers=4)
+    assert select_settings(probes, min_gain=0.0) == DataloaderSettings(
+        workers=0, cache="ram"
+    )
+    assert DataloaderSettings(workers=2).to_params() == {"workers": 2, "cache": False}
+
+
+def test_time_dataloader_cycles_over_the_epochs():
+    dataloader = [{"im_file": ["a", "b"]}, {"im_file": ["c"]}]
+
+    assert time_dataloader(dataloader, n_batches=5, n_warmup=1) > 0
+
+
+class FakeTrainer:
+    # Mirrors the ultralytics BaseTrainer discarding the workers on CPU
+    def __init__(self, overrides):
+        self.args = type("Args", (), {})()
+        self.check_resume(overrides)
+        self.args.workers = 0
+
+    def check_resume(self, overrides):
+        self.args.workers = overrides["workers"]
+
+
+def test_keep_workers():
+    assert FakeTrainer({"workers": 4}).args.workers == 0
+    assert keep_workers(FakeTrainer)({"workers": 4}).args.workers == 4
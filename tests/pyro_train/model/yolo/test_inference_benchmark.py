@@ -0,0 +1,67 @@
+import pytest
+
+from pyro_train.model.yolo.inference_benchmark import (
+    BenchmarkCase,
+    InferenceFormat,
+    inference_stats,
+    locate_model,
+    to_metrics,
+    to_records,
+)
+
+
+def test_inference_stats():
+    stats = inference_stats([10.0] * 98 + [20.0, 100.0], batch=4, peak_rss_mb=128.0)
+    assert stats.p50_ms == 10.0
+    assert stats.p99_ms == pytest.approx(20.8)
+    assert stats.mean_ms == pytest.approx(11.0)
+    assert stats.images_per_second == pytest.approx(4 * 1000 / 11.0)
+    assert stats.peak_rss_mb == 128.0
+
+
+def test_locate_model(tmp_path):
+    model_dir = tmp_path / "best"
+    export_dir = tmp_path / "export"
+    (model_dir / "weights").mkdir(parents=True)
+    (export_dir / "best_ncnn_model").mkdir(parents=True)
+    (model_dir / "weights" / "best.pt").touch()
+    (export_dir / "best_ncnn_model" / "model.ncnn.param").touch()
+
+    assert (
+        locate_model(InferenceFormat.pt, model_dir, export_dir)
+        == model_dir / "weights" / "best.pt"
+    )
+    assert locate_model(InferenceFormat.onnx, model_dir, export_dir) is None
+    assert (
+        locate_model(InferenceFormat.ncnn, model_dir, export_dir)
+        == export_dir / "best_ncnn_model" / "model.ncnn.param"
+    )
+
+
+def test_failed_cases_are_not_reported(tmp_path):
+    stats = inference_stats([10.0, 12.0], batch=1, peak_rss_mb=100.0)
+    cases = [
+        BenchmarkCase(
+            InferenceFormat.onnx,
+            tmp_path / "best.onnx",
+            batch=1,
+            imgsz=640,
+            n_threads=n,
+        )
+        for n in [1, 2]
+    ]
+    records = to_records([(cases[0], stats), (cases[1], None)])
+
+    assert [r["n_threads"] for r in records] == [1]
+    assert to_metrics(records) == {
+        "onnx": {
+            "batch1_imgsz640_threads1": {
+                "p50_ms": 11.0,
+                "p95_ms": pytest.approx(11.9),
+                "p99_ms": pytest.approx(11.98),
+                "mean_ms": 11.0,
+                "images_per_second": pytest.approx(1000 / 11),
+                "peak_rss_mb": 100.0,
+            }
+        }
+    }
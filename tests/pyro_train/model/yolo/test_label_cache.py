@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from PIL import Image
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.data.utils import load_dataset_cache_file
+
+from pyro_train.model.yolo.label_cache import build_label_caches
+
+
+def make_dataset(dataset_dir):
+    images_dir = dataset_dir / "train" / "images"
+    labels_dir = dataset_dir / "train" / "labels"
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        pixels = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(images_dir / f"{i}.jpg")
+        if i:
+            (labels_dir / f"{i}.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+
+
+def test_build_label_caches_hit(tmp_path, monkeypatch):
+    dataset_dir = tmp_path / "datasets"
+    make_dataset(dataset_dir)
+
+    reports = build_label_caches(dataset_dir, names=["smoke"])
+
+    report = reports["train"]
+    assert report.cache_path == (dataset_dir / "train" / "labels.cache").resolve()
+    assert report.n_images == 4
+    assert report.n_found == 3
+    assert report.n_missing == 1
+    assert report.n_corrupt == 0
+
+    def cache_labels(self, path):
+        pytest.fail("the label cache should be reused")
+
+    monkeypatch.setattr(YOLODataset, "cache_labels", cache_labels)
+    assert build_label_caches(dataset_dir, names=["smoke"])["train"] == report
+
+
+def test_build_label_caches_invalidation(tmp_path):
+    dataset_dir = tmp_path / "datasets"
+    make_dataset(dataset_dir)
+    report = build_label_caches(dataset_dir, names=["smoke"])["train"]
+
+    (dataset_dir / "train" / "labels" / "1.txt").write_text(
+        "0 0.5 0.5 0.2 0.2\n0 0.2 0.2 0.1 0.1\n"
+    )
+    build_label_caches(dataset_dir, names=["smoke"])
+
+    cache = load_dataset_cache_file(report.cache_path)
+    n_boxes = {
+        label["im_file"].rsplit("/", 1)[-1]: len(label["bboxes"])
+        for label in cache["labels"]
+    }
+    assert n_boxes == {"0.jpg": 0, "1.jpg": 2, "2.jpg": 1, "3.jpg": 1}
@@ -0,0 +1,20 @@
+import pytest
+
+from pyro_train.model.yolo.results import best_epoch_metrics, read_results_csv
+
+
+def test_read_results_csv(tmp_path):
+    filepath = tmp_path / "results.csv"
+    filepath.write_text(
+        "epoch,time,metrics/mAP50(B),metrics/mAP50-95(B)\n"
+        "1,2.5,0.5,0.2\n"
+        "2,5.0,0.4,0.3\n"
+    )
+
+    rows = read_results_csv(filepath)
+    best = best_epoch_metrics(rows)
+
+    assert len(rows) == 2
+    assert best["epoch"] == 2
+    assert best["fitness"] == pytest.approx(0.1 * 0.4 + 0.9 * 0.3)
+    assert read_results_csv(tmp_path / "missing.csv") == []
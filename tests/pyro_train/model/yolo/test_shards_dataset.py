@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+from ultralytics.data.dataset import YOLODataset
+
+from pyro_train.data.shards import write_dataset_shards
+from pyro_train.model.yolo.shards import ShardedYOLODataset
+
+
+def make_dataset(dataset_dir):
+    images_dir = dataset_dir / "train" / "images"
+    labels_dir = dataset_dir / "train" / "labels"
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        pixels = rng.integers(0, 255, (48 + 8 * i, 64, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(images_dir / f"img_{i}.jpg")
+        if i:
+            (labels_dir / f"img_{i}.txt").write_text("0 0.5 0.5 0.2 0.1\n" * i)
+
+
+@pytest.mark.parametrize("rect", [False, True])
+def test_sharded_yolo_dataset_matches_yolo_dataset(tmp_path, rect):
+    dataset_dir = tmp_path / "datasets"
+    make_dataset(dataset_dir)
+    write_dataset_shards(dataset_dir, tmp_path / "shards", splits=["train"])
+    kwargs = {
+        "imgsz": 64,
+        "augment": False,
+        "rect": rect,
+        "batch_size": 2,
+        "data": {"names": {0: "smoke"}, "nc": 1},
+        "task": "detect",
+    }
+
+    dataset = YOLODataset(img_path=str(dataset_dir / "train" / "images"), **kwargs)
+    sharded = ShardedYOLODataset(img_path=str(tmp_path / "shards" / "train"), **kwargs)
+
+    assert len(sharded) == len(dataset) == 4
+    if rect:
+        np.testing.assert_array_equal(sharded.batch_shapes, dataset.batch_shapes)
+    by_name = {Path(label["im_file"]).name: i for i, label in enumerate(dataset.labels)}
+    for i, label in enumerate(sharded.labels):
+        j = by_name[Path(label["im_file"]).name]
+        expected = dataset.labels[j]
+        # The shapes are popped from the labels in rect mode
+        assert label.get("shape") == expected.get("shape")
+        np.testing.assert_array_equal(label["cls"], expected["cls"])
+        np.testing.assert_allclose(label["bboxes"], expected["bboxes"])
+        im, hw0, hw = sharded.load_image(i)
+        expected_im, expected_hw0, expected_hw = dataset.load_image(j)
+        assert (hw0, hw) == (expected_hw0, expected_hw)
+        np.testing.assert_array_equal(im, expected_im)
@@ -0,0 +1,60 @@
+import csv
+from types import SimpleNamespace
+
+import pytest
+
+from pyro_train.model.yolo.throughput import ThroughputRecorder
+
+
+def test_recorder_splits_dataloader_and_compute_times(tmp_path):
+    ticks = iter(
+        [
+            # epoch start, 2 batches waiting 1s on the dataloader and computing 3s
+            0.0,
+            1.0,
+            4.0,
+            5.0,
+            8.0,
+            # train end, validation of 2s, fit epoch end
+            8.0,
+            9.0,
+            11.0,
+            12.0,
+        ]
+    )
+    recorder = ThroughputRecorder(clock=lambda: next(ticks))
+    trainer = SimpleNamespace(
+        epoch=0,
+        save_dir=tmp_path,
+        train_loader=SimpleNamespace(dataset=range(32)),
+    )
+    callbacks = recorder.callbacks()
+
+    def run(event, arg=trainer):
+        for callback in callbacks[event]:
+            callback(arg)
+
+    run("on_train_epoch_start")
+    for _ in range(2):
+        run("on_train_batch_start")
+        run("on_train_batch_end")
+    run("on_train_epoch_end")
+    run("on_val_start", SimpleNamespace())
+    run("on_val_end", SimpleNamespace())
+    run("on_fit_epoch_end")
+    # The final validation of best.pt does not record an epoch
+    run("on_fit_epoch_end")
+
+    with open(tmp_path / "throughput.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    row = {k: float(v) for k, v in rows[0].items()}
+    assert row["epoch"] == 1
+    assert row["epoch_s"] == 12.0
+    assert row["train_s"] == 8.0
+    assert row["dataloader_s"] == 2.0
+    assert row["compute_s"] == 6.0
+    assert row["validation_s"] == 2.0
+    assert row["images_per_second"] == 4.0
+    assert row["dataloader_fraction"] == pytest.approx(0.25)
+    assert row["peak_rss_mb"] > 0
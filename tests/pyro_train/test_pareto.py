@@ -0,0 +1,21 @@
+import numpy as np
+
+from pyro_train.utils import pareto_front_mask, pareto_ranks
+
+
+def test_pareto_front():
+    # (-fitness, latency) pairs
+    costs = np.array(
+        [
+            [-0.5, 10.0],
+            [-0.6, 20.0],
+            [-0.4, 15.0],
+            [-0.6, 25.0],
+            [-0.3, 5.0],
+            [-0.5, 10.0],
+        ]
+    )
+
+    assert pareto_front_mask(costs).tolist() == [True, True, False, False, True, True]
+    assert pareto_ranks(costs).tolist() == [0, 0, 1, 1, 0, 0]
+    assert pareto_front_mask(np.zeros((0, 2))).tolist() == []